@@ -0,0 +1,450 @@
+"""
+Backend audio playback for TTS.
+
+A single playback worker thread plays utterances one at a time from a queue.
+The pygame mixer is initialized once and kept alive. Besides complete MP3/WAV
+files, the player accepts streams of raw PCM chunks written into a growable
+ring buffer while the provider is still synthesizing, so speech starts before
+synthesis completes (and synthesis never waits for playback). Time to first audio is measured for every utterance.
+"""
+import io
+import os
+import time
+import queue
+import tempfile
+import threading
+from typing import Optional, Dict, Any
+
+
+# Raw PCM format of streamed audio (16-bit signed little-endian mono)
+STREAM_SAMPLE_RATE = 24000
+STREAM_SAMPLE_WIDTH = 2
+STREAM_CHANNELS = 1
+
+# Duration of each PCM block handed to the mixer
+STREAM_BLOCK_SECONDS = 0.1
+
+
+def detect_audio_format(audio_data: bytes, default: str = "mp3") -> str:
+    """Detect WAV or MP3 audio from its header."""
+    if audio_data[:4] == b"RIFF":
+        return "wav"
+    if audio_data[:3] == b"ID3" or (len(audio_data) > 1 and audio_data[0] == 0xFF and audio_data[1] & 0xE0 == 0xE0):
+        return "mp3"
+    return default
+
+
+class PCMRingBuffer:
+    """Growable byte ring buffer between a PCM producer and the playback worker"""
+
+    def __init__(self, capacity: int):
+        """
+        Initialize the ring buffer.
+
+        Args:
+            capacity: Initial buffer size in bytes; the buffer doubles when a write does not fit
+        """
+        self._buffer = bytearray(max(1, capacity))
+        self._capacity = len(self._buffer)
+        self._read_pos = 0
+        self._size = 0
+        self._closed = False
+        self._aborted = False
+        self._condition = threading.Condition()
+
+    def _grow(self, needed: int) -> None:
+        """Reallocate the buffer to hold at least needed bytes (contents are unwrapped)."""
+        capacity = self._capacity
+        while capacity < needed:
+            capacity *= 2
+        end = self._read_pos + self._size
+        if end <= self._capacity:
+            data = self._buffer[self._read_pos:end]
+        else:
+            data = self._buffer[self._read_pos:] + self._buffer[:end - self._capacity]
+        self._buffer = data + bytearray(capacity - self._size)
+        self._capacity = capacity
+        self._read_pos = 0
+
+    def write(self, data: bytes) -> bool:
+        """
+        Write data without waiting for the reader (synthesis never waits on playback).
+
+        Returns:
+            False if the stream was aborted by the reader
+        """
+        view = memoryview(data)
+        with self._condition:
+            if self._aborted:
+                return False
+            if self._size + len(view) > self._capacity:
+                self._grow(self._size + len(view))
+            while view:
+                write_pos = (self._read_pos + self._size) % self._capacity
+                count = min(len(view), self._capacity - write_pos)
+                self._buffer[write_pos:write_pos + count] = view[:count]
+                self._size += count
+                view = view[count:]
+            self._condition.notify_all()
+        return True
+
+    def read(self, max_bytes: int, timeout: Optional[float] = None) -> Optional[bytes]:
+        """
+        Read up to max_bytes, waiting until data is available.
+
+        Returns:
+            Data read, b"" once the stream is closed and drained, or None on timeout
+        """
+        with self._condition:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while self._size == 0 and not self._closed and not self._aborted:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+            if self._aborted:
+                return b""
+            count = min(max_bytes, self._size, self._capacity - self._read_pos)
+            data = bytes(self._buffer[self._read_pos:self._read_pos + count])
+            self._read_pos = (self._read_pos + count) % self._capacity
+            self._size -= count
+            self._condition.notify_all()
+            return data
+
+    def close(self) -> None:
+        """Mark the end of the stream."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def abort(self) -> None:
+        """Stop the stream; pending and future writes are dropped."""
+        with self._condition:
+            self._aborted = True
+            self._condition.notify_all()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed or self._aborted
+
+
+class AudioStream:
+    """Writer side of a streamed utterance"""
+
+    def __init__(self, buffer: PCMRingBuffer):
+        self._buffer = buffer
+        self._pending = b""
+
+    def write(self, chunk: bytes) -> bool:
+        """Append PCM data (chunks may split samples). Returns False if playback was aborted."""
+        data = self._pending + chunk
+        aligned = len(data) - len(data) % STREAM_SAMPLE_WIDTH
+        self._pending = data[aligned:]
+        return self._buffer.write(data[:aligned]) if aligned else not self._buffer.closed
+
+    def close(self) -> None:
+        """Mark the end of the utterance."""
+        self._buffer.close()
+
+    def abort(self) -> None:
+        """Abort the utterance."""
+        self._buffer.abort()
+
+
+class _PlaybackJob:
+    """An utterance waiting in the playback queue"""
+
+    def __init__(self, provider: str, requested_at: float, stt_service=None,
+                 audio_data: Optional[bytes] = None, audio_format: Optional[str] = None,
+                 stream: Optional[PCMRingBuffer] = None):
+        self.provider = provider
+        self.requested_at = requested_at
+        self.stt_service = stt_service
+        self.audio_data = audio_data
+        self.audio_format = audio_format
+        self.stream = stream
+
+
+class AudioPlayer:
+    """Plays TTS audio on a single worker thread with a persistent mixer"""
+
+    def __init__(self):
+        self._queue: "queue.Queue[Optional[_PlaybackJob]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        self._pygame = None
+        self._mixer_ready = False
+        self._stats_lock = threading.Lock()
+        self._ttfa_stats: Dict[str, Dict[str, Dict[str, float]]] = {}
+
+    def _ensure_worker(self) -> None:
+        """Start the playback worker on first use."""
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, name="tts-playback", daemon=True)
+                self._thread.start()
+
+    def _init_mixer(self) -> bool:
+        """Initialize the pygame mixer once (on the worker thread)."""
+        if self._mixer_ready:
+            return True
+        try:
+            import pygame
+            pygame.mixer.init(frequency=STREAM_SAMPLE_RATE, size=-8 * STREAM_SAMPLE_WIDTH, channels=STREAM_CHANNELS)
+            pygame.mixer.set_reserved(1)
+            self._pygame = pygame
+            self._mixer_ready = True
+            print("Audio player: pygame mixer initialized")
+        except ImportError:
+            pass
+        except Exception as e:
+            print(f"Audio player: Error initializing pygame mixer: {e}")
+        return self._mixer_ready
+
+    def supports_streaming(self) -> bool:
+        """Whether streamed PCM playback is available (requires pygame)."""
+        if self._mixer_ready:
+            return True
+        try:
+            import pygame  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    def play(self, audio_data: bytes, audio_format: Optional[str] = None, stt_service=None,
+             provider: str = "unknown", requested_at: Optional[float] = None) -> None:
+        """
+        Queue a complete MP3/WAV utterance for playback.
+
+        Args:
+            audio_data: Audio data as bytes
+            audio_format: "mp3" or "wav" (detected from the header if None)
+            stt_service: Optional SpeechToTextService to pause during playback
+            provider: TTS provider name, for time-to-first-audio statistics
+            requested_at: time.perf_counter() when speech was requested (defaults to now)
+        """
+        self._ensure_worker()
+        self._queue.put(_PlaybackJob(
+            provider, requested_at if requested_at is not None else time.perf_counter(), stt_service,
+            audio_data=audio_data, audio_format=audio_format or detect_audio_format(audio_data)
+        ))
+
+    def open_stream(self, stt_service=None, provider: str = "unknown", requested_at: Optional[float] = None,
+                    buffer_seconds: float = 5.0) -> AudioStream:
+        """
+        Queue a streamed utterance; PCM chunks written to the returned stream play as they arrive.
+
+        Args:
+            stt_service: Optional SpeechToTextService to pause during playback
+            provider: TTS provider name, for time-to-first-audio statistics
+            requested_at: time.perf_counter() when speech was requested (defaults to now)
+            buffer_seconds: Initial ring buffer size in seconds of audio (grows with a faster producer)
+
+        Returns:
+            AudioStream to write PCM chunks to
+        """
+        capacity = int(buffer_seconds * STREAM_SAMPLE_RATE * STREAM_SAMPLE_WIDTH * STREAM_CHANNELS)
+        buffer = PCMRingBuffer(capacity)
+        self._ensure_worker()
+        self._queue.put(_PlaybackJob(
+            provider, requested_at if requested_at is not None else time.perf_counter(), stt_service,
+            stream=buffer
+        ))
+        return AudioStream(buffer)
+
+    def _record_first_audio(self, job: _PlaybackJob, mode: str) -> None:
+        """Record the time to first audio of a job."""
+        elapsed_ms = (time.perf_counter() - job.requested_at) * 1000
+        with self._stats_lock:
+            stats = self._ttfa_stats.setdefault(job.provider, {}).setdefault(
+                mode, {"count": 0, "total_ms": 0.0, "min_ms": float("inf"), "max_ms": 0.0, "last_ms": 0.0}
+            )
+            stats["count"] += 1
+            stats["total_ms"] += elapsed_ms
+            stats["min_ms"] = min(stats["min_ms"], elapsed_ms)
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+            stats["last_ms"] = elapsed_ms
+        print(f"Audio player: Time to first audio {elapsed_ms:.0f} ms ({job.provider}, {mode})")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get time-to-first-audio statistics.
+
+        Returns:
+            {"queued": jobs waiting, "time_to_first_audio": {provider: {"streamed"|"buffered": {...}}}}
+        """
+        with self._stats_lock:
+            ttfa = {
+                provider: {
+                    mode: {
+                        "count": stats["count"],
+                        "avg_ms": stats["total_ms"] / stats["count"],
+                        "min_ms": stats["min_ms"],
+                        "max_ms": stats["max_ms"],
+                        "last_ms": stats["last_ms"],
+                    }
+                    for mode, stats in modes.items()
+                }
+                for provider, modes in self._ttfa_stats.items()
+            }
+        return {"queued": self._queue.qsize(), "time_to_first_audio": ttfa}
+
+    def _worker(self) -> None:
+        """Play queued utterances one at a time."""
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            stt_was_active = self._pause_stt(job.stt_service)
+            try:
+                if job.stream is not None:
+                    self._play_stream(job)
+                else:
+                    self._play_buffered(job)
+            except Exception as e:
+                print(f"Error playing audio: {e}")
+                import traceback
+                traceback.print_exc()
+                if job.stream is not None:
+                    job.stream.abort()
+            finally:
+                if stt_was_active:
+                    self._resume_stt(job.stt_service)
+
+    def _play_stream(self, job: _PlaybackJob) -> None:
+        """Play PCM blocks from the ring buffer as they arrive."""
+        if not self._init_mixer():
+            print("WARNING: Streaming playback requires pygame; dropping streamed audio")
+            job.stream.abort()
+            return
+
+        pygame = self._pygame
+        channel = pygame.mixer.Channel(0)
+        block_size = int(STREAM_BLOCK_SECONDS * STREAM_SAMPLE_RATE) * STREAM_SAMPLE_WIDTH * STREAM_CHANNELS
+        first = True
+        try:
+            while True:
+                block = job.stream.read(block_size, timeout=30.0)
+                if block is None:
+                    print("WARNING: No streamed audio received for 30 s; dropping the utterance")
+                    break
+                if not block:
+                    break
+                sound = pygame.mixer.Sound(buffer=block)
+                # Keep at most one block queued behind the one playing
+                while channel.get_busy() and channel.get_queue() is not None:
+                    pygame.time.wait(5)
+                if channel.get_busy():
+                    channel.queue(sound)
+                else:
+                    channel.play(sound)
+                if first:
+                    self._record_first_audio(job, "streamed")
+                    first = False
+        finally:
+            # Release the producer on a timeout or error (no-op once the stream is drained)
+            job.stream.abort()
+
+        while channel.get_busy():
+            pygame.time.wait(20)
+        print("Audio played successfully using pygame (streamed)")
+
+    def _play_buffered(self, job: _PlaybackJob) -> None:
+        """Play a complete MP3/WAV file."""
+        audio_data, audio_format = job.audio_data, job.audio_format
+
+        # Try pygame first (mixer stays initialized between utterances)
+        if self._init_mixer():
+            pygame = self._pygame
+            pygame.mixer.music.load(io.BytesIO(audio_data), audio_format)
+            pygame.mixer.music.play()
+            self._record_first_audio(job, "buffered")
+            while pygame.mixer.music.get_busy():
+                pygame.time.wait(20)
+            pygame.mixer.music.unload()
+            print(f"Audio played successfully using pygame (format: {audio_format})")
+            return
+
+        # Fallback to pydub with simpleaudio
+        try:
+            from pydub import AudioSegment
+            from pydub.playback import play
+
+            audio = AudioSegment.from_file(io.BytesIO(audio_data), format=audio_format)
+            self._record_first_audio(job, "buffered")
+            play(audio)
+            print(f"Audio played successfully using pydub (format: {audio_format})")
+            return
+        except ImportError:
+            pass
+
+        # Fallback to playsound (blocking but simple)
+        try:
+            import playsound
+
+            with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{audio_format}') as tmp_file:
+                tmp_path = tmp_file.name
+                tmp_file.write(audio_data)
+            try:
+                self._record_first_audio(job, "buffered")
+                playsound.playsound(tmp_path, block=True)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+            print(f"Audio played successfully using playsound (format: {audio_format})")
+            return
+        except ImportError:
+            pass
+
+        print("WARNING: No audio playback library available. Install pygame, pydub, or playsound.")
+
+    def _pause_stt(self, stt_service) -> bool:
+        """Pause STT audio frame transmission during playback to prevent a feedback loop."""
+        if not (stt_service and getattr(stt_service, 'is_active', False)):
+            return False
+        print("Pausing STT audio frame transmission during TTS playback")
+        try:
+            if hasattr(stt_service, 'pause_for_tts'):
+                stt_service.pause_for_tts()
+            else:
+                stt_service.stop()
+        except Exception as e:
+            print(f"Error pausing STT: {e}")
+        return True
+
+    def _resume_stt(self, stt_service) -> None:
+        """Resume STT audio frame transmission after playback."""
+        print("Resuming STT audio frame transmission after TTS playback")
+        try:
+            if hasattr(stt_service, 'resume_after_tts'):
+                stt_service.resume_after_tts()
+            else:
+                stt_service.start(language="fr", model="nova-2")
+        except Exception as e:
+            print(f"Error resuming STT: {e}")
+
+    def shutdown(self) -> None:
+        """Stop the playback worker and release the mixer."""
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        if self._mixer_ready:
+            try:
+                self._pygame.mixer.quit()
+            except Exception:
+                pass
+            self._mixer_ready = False
+
+
+# Global audio player instance
+_audio_player: Optional[AudioPlayer] = None
+_audio_player_lock = threading.Lock()
+
+
+def get_audio_player() -> AudioPlayer:
+    """Get or create the global audio player"""
+    global _audio_player
+    with _audio_player_lock:
+        if _audio_player is None:
+            _audio_player = AudioPlayer()
+        return _audio_player
@@ -0,0 +1,144 @@
+"""
+Benchmark the JSON and packed binary encodings of /api/calibration/process.
+
+Measures request parsing, validation and processing for a calibration with
+many samples per point, using an in-memory database.
+
+Usage (from the backend directory):
+    python benchmarks/bench_calibration_upload.py [--points 25] [--samples 4000] [--repeat 5]
+"""
+import argparse
+import base64
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from sqlmodel import SQLModel, Session, create_engine
+from sqlalchemy.pool import StaticPool
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from models import User
+from calibration import (
+    CalibrationRequest,
+    PackedCalibrationRequest,
+    PACKED_SAMPLE_COLUMNS,
+    process_calibration_data,
+    process_packed_calibration_data,
+)
+
+
+def build_samples(n_points: int, n_samples: int, seed: int = 0) -> list:
+    """Generate noisy gaze samples around a grid of targets"""
+    rng = np.random.default_rng(seed)
+    grid = int(np.ceil(np.sqrt(n_points)))
+    points = []
+    for i in range(n_points):
+        target_x = 100 + (i % grid) * 400
+        target_y = 100 + (i // grid) * 250
+        samples = np.empty((n_samples, len(PACKED_SAMPLE_COLUMNS)))
+        samples[:, 0] = rng.normal(target_x + 15, 25, n_samples)
+        samples[:, 1] = rng.normal(target_y - 10, 25, n_samples)
+        samples[:, 2] = samples[:, 0] * 1.25
+        samples[:, 3] = samples[:, 1] * 1.25 + 80
+        samples[:, 4] = 1.7e12 + np.arange(n_samples) * 50
+        points.append((target_x, target_y, samples))
+    return points
+
+
+def json_body(user_id: int, points: list) -> bytes:
+    """Encode samples as the JSON request (list of sample dicts)"""
+    return json.dumps({
+        "user_id": user_id,
+        "points": [
+            {
+                "position": {"x": tx, "y": ty, "label": str(i)},
+                "targetX": tx,
+                "targetY": ty,
+                "samples": [dict(zip(PACKED_SAMPLE_COLUMNS, row)) for row in samples.tolist()],
+            }
+            for i, (tx, ty, samples) in enumerate(points)
+        ],
+    }).encode("utf-8")
+
+
+def packed_body(user_id: int, points: list, dtype: str) -> bytes:
+    """Encode samples as the packed request (base64 binary arrays)"""
+    np_dtype = "<f4" if dtype == "float32" else "<f8"
+    return json.dumps({
+        "user_id": user_id,
+        "dtype": dtype,
+        "points": [
+            {
+                "position": {"x": tx, "y": ty, "label": str(i)},
+                "targetX": tx,
+                "targetY": ty,
+                "count": len(samples),
+                "data": base64.b64encode(samples.astype(np_dtype).tobytes()).decode("ascii"),
+            }
+            for i, (tx, ty, samples) in enumerate(points)
+        ],
+    }).encode("utf-8")
+
+
+def time_it(fn, repeat: int) -> float:
+    """Return the best wall time of `repeat` runs, in milliseconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=25)
+    parser.add_argument("--samples", type=int, default=4000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        user = User(name="benchmark")
+        session.add(user)
+        session.commit()
+        user_id = user.id
+
+    points = build_samples(args.points, args.samples)
+    bodies = {
+        "json": json_body(user_id, points),
+        "packed float32": packed_body(user_id, points, "float32"),
+        "packed float64": packed_body(user_id, points, "float64"),
+    }
+
+    def run(name: str, body: bytes):
+        with Session(engine) as session:
+            if name == "json":
+                request = CalibrationRequest.model_validate_json(body)
+                return process_calibration_data(request, session)
+            request = PackedCalibrationRequest.model_validate_json(body)
+            return process_packed_calibration_data(request, session)
+
+    print(f"{args.points} points x {args.samples} samples, best of {args.repeat}")
+    print(f"{'encoding':<16} {'body size':>12} {'time':>12}")
+    results = {}
+    for name, body in bodies.items():
+        results[name] = run(name, body)
+        elapsed = time_it(lambda: run(name, body), args.repeat)
+        print(f"{name:<16} {len(body) / 1024:>9.0f} KB {elapsed:>9.1f} ms")
+
+    # Sanity check: every encoding produces the same calibration
+    reference = results["json"].affine_coefficients.model_dump()
+    for name, response in results.items():
+        coefficients = response.affine_coefficients.model_dump()
+        assert all(abs(coefficients[k] - reference[k]) < 1e-2 for k in reference), name
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark the gaze frame encodings of the WebSocket relay.
+
+Compares, for several batch sizes:
+- tracker JSON: one JSON object per frame with pixelX/pixelY/screenWidth/screenHeight/timestamp
+- JSON-compat: {"type": "gaze", "frames": [[t, x, y], ...]} batches
+- binary: little-endian fixed-size records (gaze_protocol)
+
+Reports message bytes per frame and encode + decode throughput.
+
+Usage (from the backend directory):
+    python benchmarks/bench_gaze_protocol.py [--frames 120000] [--batches 1,4,16] [--repeat 3]
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from gaze_protocol import GazeFrameEncoder, decode_batch, decode_header
+
+
+def build_frames(n_frames: int, seed: int = 0):
+    """Generate a gaze stream at 120 Hz (fixations with jitter)"""
+    rng = np.random.default_rng(seed)
+    t = 1.7e12 + np.arange(n_frames) * (1000 / 120)
+    centers = rng.uniform([0, 0], [1920, 1080], (n_frames // 60 + 1, 2)).repeat(60, axis=0)[:n_frames]
+    points = centers + rng.normal(0, 12, (n_frames, 2))
+    return t, points[:, 0], points[:, 1]
+
+
+def tracker_json(t, x, y, batch: int):
+    """Encode and decode frames as tracker JSON messages (one per frame)"""
+    messages = [
+        json.dumps({"pixelX": px, "pixelY": py, "screenWidth": 1920, "screenHeight": 1080, "timestamp": ts})
+        for ts, px, py in zip(t.tolist(), x.tolist(), y.tolist())
+    ]
+    decoded = [json.loads(message) for message in messages]
+    return sum(len(message) for message in messages), len(decoded)
+
+
+def json_compat(t, x, y, batch: int):
+    """Encode and decode frames as JSON-compat batch messages"""
+    encoder = GazeFrameEncoder(binary=False)
+    size = count = 0
+    for i in range(0, len(t), batch):
+        for message in encoder.encode(t[i:i + batch], x[i:i + batch], y[i:i + batch]):
+            text = json.dumps(message)
+            size += len(text)
+            count += len(json.loads(text)["frames"])
+    return size, count
+
+
+def binary(t, x, y, batch: int):
+    """Encode and decode frames as binary header + batch messages"""
+    encoder = GazeFrameEncoder(binary=True)
+    header = encoder.header(float(t[0]), 1920, 1080)
+    decode_header(header)
+    size, count = len(header), 0
+    for i in range(0, len(t), batch):
+        for message in encoder.encode(t[i:i + batch], x[i:i + batch], y[i:i + batch]):
+            size += len(message)
+            count += len(decode_batch(message))
+    return size, count
+
+
+def time_it(fn, repeat: int):
+    """Return the result and best wall time of `repeat` runs, in seconds"""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=120000)
+    parser.add_argument("--batches", default="1,4,16")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    t, x, y = build_frames(args.frames)
+    encodings = {"tracker json": tracker_json, "json-compat": json_compat, "binary": binary}
+
+    print(f"{args.frames} frames, best of {args.repeat} (encode + decode)")
+    print(f"{'encoding':<14} {'batch':>6} {'bytes/frame':>12} {'frames/s':>12}")
+    for batch in [int(b) for b in args.batches.split(",")]:
+        for name, fn in encodings.items():
+            if name == "tracker json" and batch != 1:
+                continue  # The tracker sends one message per frame
+            (size, count), elapsed = time_it(lambda: fn(t, x, y, batch), args.repeat)
+            assert count == args.frames, name
+            print(f"{name:<14} {batch:>6} {size / count:>12.1f} {count / elapsed:>12.0f}")
+
+    # Sanity check: binary frames round-trip within float32 precision
+    encoder = GazeFrameEncoder(binary=True)
+    encoder.header(float(t[0]))
+    frames = decode_batch(encoder.encode(t[:1000], x[:1000], y[:1000])[0])
+    assert np.allclose(frames["x"], x[:1000], atol=1e-3) and np.allclose(frames["y"], y[:1000], atol=1e-3)
+    assert np.array_equal(frames["t"], (t[:1000] - t[0]).astype(np.uint32))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Benchmark GET /api/communication/sessions on a large history.
+
+Builds a database of communication sessions with steps (10k x 50 by default)
+and lists pages of sessions:
+- per-session: offset page, one steps query per session (the former N+1 loading)
+- batched: list_sessions, keyset page, steps loaded with one IN (...) query
+- summary: list_sessions(summary=True), keyset page, step counts with one aggregate query
+
+Reports SQL statements per page and latency.
+
+Usage (from the backend directory):
+    python benchmarks/bench_session_listing.py [--sessions 10000] [--steps 50] [--limit 100] [--repeat 5]
+"""
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import event, insert
+from sqlmodel import SQLModel, Session, create_engine, select
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from models import CommunicationSession, SessionStep
+from main import list_sessions, step_to_response, encode_session_cursor, CommunicationSessionResponse
+
+
+def build_database(engine, n_sessions: int, n_steps: int) -> None:
+    """Insert sessions with steps (caregiver message, choices and selection)"""
+    SQLModel.metadata.create_all(engine)
+    start = datetime(2020, 1, 1)
+    choices = [{"text": f"Choice {i}", "probability": 0.25} for i in range(4)]
+    with engine.begin() as connection:
+        connection.execute(insert(CommunicationSession), [
+            {"id": i + 1, "user_id": 1 + i % 3, "started_at": start + timedelta(hours=i),
+             "created_at": start + timedelta(hours=i), "updated_at": start + timedelta(hours=i)}
+            for i in range(n_sessions)
+        ])
+        for i in range(n_sessions):
+            connection.execute(insert(SessionStep), [
+                {"session_id": i + 1, "step_number": j + 1, "message_role": "caregiver",
+                 "message_content": f"Message {j} of session {i}", "choices_json": choices,
+                 "selected_choice_text": "Choice 0", "timestamp": start + timedelta(hours=i, seconds=j)}
+                for j in range(n_steps)
+            ])
+
+
+def page_cursor(db_session: Session, skip: int):
+    """Keyset cursor of the page starting at offset skip"""
+    if skip == 0:
+        return None
+    statement = select(CommunicationSession).order_by(
+        CommunicationSession.started_at.desc(), CommunicationSession.id.desc()
+    ).offset(skip - 1).limit(1)
+    return encode_session_cursor(db_session.exec(statement).one())
+
+
+def per_session(db_session: Session, skip: int, limit: int):
+    """Former listing: the steps of each session are loaded with their own query"""
+    statement = select(CommunicationSession).order_by(CommunicationSession.started_at.desc()).offset(skip).limit(limit)
+    responses = []
+    for session in db_session.exec(statement).all():
+        steps = db_session.exec(
+            select(SessionStep).where(SessionStep.session_id == session.id).order_by(SessionStep.step_number)
+        ).all()
+        responses.append(CommunicationSessionResponse(
+            id=session.id, user_id=session.user_id, caregiver_id=session.caregiver_id,
+            started_at=session.started_at, ended_at=session.ended_at, created_at=session.created_at,
+            updated_at=session.updated_at, steps=[step_to_response(step) for step in steps]
+        ))
+    return responses
+
+
+def time_it(fn, repeat: int):
+    """Return the result and best wall time of `repeat` runs, in seconds"""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--steps", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{directory}/bench.db")
+        start = time.perf_counter()
+        build_database(engine, args.sessions, args.steps)
+        print(f"{args.sessions} sessions x {args.steps} steps built in {time.perf_counter() - start:.1f} s")
+
+        statements = [0]
+        event.listen(engine, "before_cursor_execute", lambda *_: statements.__setitem__(0, statements[0] + 1))
+
+        loop = asyncio.new_event_loop()
+        listings = {
+            "per-session": lambda db, skip: per_session(db, skip, args.limit),
+            "batched": lambda db, cursor: loop.run_until_complete(
+                list_sessions(cursor=cursor, limit=args.limit, db_session=db)
+            ).sessions,
+            "summary": lambda db, cursor: loop.run_until_complete(
+                list_sessions(cursor=cursor, limit=args.limit, summary=True, db_session=db)
+            ).sessions,
+        }
+        middle = max(0, args.sessions // 2 - args.limit // 2)
+
+        print(f"page of {args.limit} sessions, best of {args.repeat}")
+        print(f"{'listing':<12} {'page':>7} {'queries':>8} {'ms':>9}")
+        results = {}
+        for name, listing in listings.items():
+            for label, skip in (("first", 0), ("middle", middle)):
+                with Session(engine) as db_session:
+                    page = skip if name == "per-session" else page_cursor(db_session, skip)
+                    statements[0] = 0
+                    listing(db_session, page)
+                    queries = statements[0]
+                    db_session.expunge_all()
+                    result, elapsed = time_it(lambda: listing(db_session, page), args.repeat)
+                results[name, label] = result
+                print(f"{name:<12} {label:>7} {queries:>8} {elapsed * 1000:>9.1f}")
+
+        # Sanity check: the batched listing matches the per-session one, summaries count the steps
+        for label in ("first", "middle"):
+            assert [r.model_dump() for r in results["batched", label]] == \
+                [r.model_dump() for r in results["per-session", label]]
+            assert all(r.step_count == args.steps and r.steps is None for r in results["summary", label])
+        loop.close()
+
+
+if __name__ == "__main__":
+    main()
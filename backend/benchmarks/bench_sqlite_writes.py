@@ -0,0 +1,145 @@
+"""
+Benchmark concurrent session step writes with the SQLite connection profiles.
+
+Writer threads replay the persistence pattern of /api/communication/choices
+and /api/communication/select (insert a step and commit, then update the
+session updated_at and commit), while reader threads load the steps of
+sessions. Compares the "default" profile (rollback journal, SQLite defaults)
+with the "performance" profile (WAL, synchronous=NORMAL, busy_timeout, ...),
+and the performance profile with the write-behind step queue (writers only
+enqueue; the time includes flushing the queue).
+
+Reports write and read throughput and the operations that failed
+(e.g. "database is locked").
+
+Usage (from the backend directory):
+    python benchmarks/bench_sqlite_writes.py [--writers 8] [--readers 2] [--operations 200] [--sessions 50]
+"""
+import argparse
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy.exc import OperationalError
+from sqlmodel import SQLModel, Session, select
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database import create_database_engine, sqlite_pragmas
+from models import CommunicationSession, SessionStep
+from step_writer import StepWriter
+
+
+def write_step(engine, session_id: int, step_number: int) -> None:
+    """Save a step, then touch the session (two commits, as the choice endpoints do)"""
+    with Session(engine) as db_session:
+        db_session.add(SessionStep(
+            session_id=session_id, step_number=step_number, message_role="caregiver",
+            message_content=f"Message {step_number}",
+            choices_json=[{"text": f"Choice {i}", "probability": 0.25} for i in range(4)],
+        ))
+        db_session.commit()
+        session = db_session.get(CommunicationSession, session_id)
+        session.updated_at = datetime.utcnow()
+        db_session.add(session)
+        db_session.commit()
+
+
+def read_steps(engine, session_id: int) -> int:
+    """Load the steps of a session"""
+    with Session(engine) as db_session:
+        statement = select(SessionStep).where(SessionStep.session_id == session_id).order_by(SessionStep.step_number)
+        return len(db_session.exec(statement).all())
+
+
+def run_profile(profile: str, directory: str, args, write_behind: bool = False) -> dict:
+    """Run writers and readers against a fresh database with a profile"""
+    engine = create_database_engine(f"sqlite:///{directory}/{profile}-{write_behind}.db", profile)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as db_session:
+        db_session.add_all([CommunicationSession(user_id=1) for _ in range(args.sessions)])
+        db_session.commit()
+    step_writer = StepWriter(engine) if write_behind else None
+
+    counts = Counter()
+    lock = threading.Lock()
+    writers_done = threading.Event()
+
+    def writer(index: int):
+        for i in range(args.operations):
+            session_id = 1 + (index * args.operations + i) % args.sessions
+            try:
+                if step_writer is not None:
+                    step_writer.add_step(
+                        session_id, index * args.operations + i, message_role="caregiver",
+                        message_content=f"Message {i}",
+                        choices_json=[{"text": f"Choice {c}", "probability": 0.25} for c in range(4)],
+                    )
+                else:
+                    write_step(engine, session_id, index * args.operations + i)
+                outcome = "writes"
+            except OperationalError as e:
+                outcome = f"write errors ({e.orig})"
+            with lock:
+                counts[outcome] += 1
+
+    def reader(index: int):
+        i = 0
+        while not writers_done.is_set():
+            try:
+                read_steps(engine, 1 + (index + i) % args.sessions)
+                outcome = "reads"
+            except OperationalError as e:
+                outcome = f"read errors ({e.orig})"
+            with lock:
+                counts[outcome] += 1
+            i += 1
+
+    writers = [threading.Thread(target=writer, args=(i,)) for i in range(args.writers)]
+    readers = [threading.Thread(target=reader, args=(i,)) for i in range(args.readers)]
+    start = time.perf_counter()
+    for thread in writers + readers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    if step_writer is not None:
+        step_writer.close()
+    writers_done.set()
+    for thread in readers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    with Session(engine) as db_session:
+        saved = len(db_session.exec(select(SessionStep.id)).all())
+    engine.dispose()
+    assert saved == counts["writes"], (saved, counts)
+    return {"elapsed": elapsed, "counts": counts}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--operations", type=int, default=200, help="Steps written per writer")
+    parser.add_argument("--sessions", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{args.writers} writers x {args.operations} steps, {args.readers} readers")
+    print(f"{'profile':<12} {'writes/s':>10} {'reads/s':>10} {'seconds':>8}  errors")
+    with tempfile.TemporaryDirectory() as directory:
+        for profile, write_behind in (("default", False), ("performance", False), ("performance", True)):
+            result = run_profile(profile, directory, args, write_behind)
+            counts, elapsed = result["counts"], result["elapsed"]
+            errors = {name: count for name, count in counts.items() if "errors" in name}
+            name = "write-behind" if write_behind else profile
+            print(f"{name:<12} {counts['writes'] / elapsed:>10.0f} {counts['reads'] / elapsed:>10.0f} "
+                  f"{elapsed:>8.2f}  {errors or '-'}")
+    print(f"performance pragmas: {sqlite_pragmas('performance')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,10 +8,12 @@ This module handles:
 """
 
 from pydantic import BaseModel
-from typing import Optional, List, Tuple
+from typing import Optional, List, Tuple, Literal
 from sqlmodel import Session
 from fastapi import HTTPException, status
 import numpy as np
+import base64
+import binascii
 import json
 from datetime import datetime
 
@@ -34,6 +36,34 @@ class CalibrationRequest(BaseModel):
     timestamp: Optional[int] = None
 
 
+# Column order of packed samples unless the request specifies its own
+PACKED_SAMPLE_COLUMNS = ["x", "y", "screenX", "screenY", "timestamp"]
+
+# Packed sample dtypes (always little-endian)
+PACKED_SAMPLE_DTYPES = {
+    "float32": np.dtype("<f4"),
+    "float64": np.dtype("<f8"),
+}
+
+
+class PackedCalibrationPointData(BaseModel):
+    """Data for a single calibration point with samples packed as a binary array"""
+    position: dict  # {x, y, label}
+    targetX: float
+    targetY: float
+    count: int  # Number of samples
+    data: str  # Base64 of a row-major (count, len(columns)) array, NaN for missing values
+
+
+class PackedCalibrationRequest(BaseModel):
+    """Request to process calibration data with columnar binary samples"""
+    user_id: int
+    points: List[PackedCalibrationPointData]
+    dtype: Literal["float32", "float64"] = "float32"  # Use float64 to keep full timestamp precision
+    columns: List[str] = PACKED_SAMPLE_COLUMNS
+    timestamp: Optional[int] = None
+
+
 class CalibrationPointResult(BaseModel):
     """Result for a processed calibration point"""
     position: dict
@@ -67,61 +97,125 @@ class CalibrationResponse(BaseModel):
     calibration_data: str  # JSON string for storage
 
 
-def calculate_geometric_median(samples: List[dict]) -> Tuple[float, float]:
+# Weiszfeld iteration defaults (gaze coordinates are in pixels)
+GEOMETRIC_MEDIAN_MAX_ITER = 100
+GEOMETRIC_MEDIAN_TOL = 1e-3  # Stop once every center moves less than this (px)
+GEOMETRIC_MEDIAN_EPS = 1e-9  # Samples closer than this (px) coincide with the current center
+
+
+def pack_samples(samples_per_point: List[List[dict]]) -> Tuple[np.ndarray, np.ndarray]:
     """
-    Calculate geometric median (L1 center) for robustness to outliers.
+    Pack the samples of every calibration point into one padded array.
     
     Args:
-        samples: List of sample dictionaries with 'x' and 'y' keys
+        samples_per_point: One list of sample dictionaries (with 'x' and 'y' keys) per calibration point
         
     Returns:
-        Tuple of (average_x, average_y) coordinates
+        Tuple of (coords, mask) where coords has shape (n_points, max_samples, 2)
+        and mask is True where a valid sample is present
     """
-    valid_samples = [s for s in samples if s.get('x') is not None and s.get('y') is not None]
+    n_points = len(samples_per_point)
+    max_samples = max((len(samples) for samples in samples_per_point), default=0)
+    coords = np.zeros((n_points, max_samples, 2), dtype=np.float64)
+    mask = np.zeros((n_points, max_samples), dtype=bool)
     
-    if len(valid_samples) == 0:
-        return 0.0, 0.0
+    for i, samples in enumerate(samples_per_point):
+        valid = [(s['x'], s['y']) for s in samples if s.get('x') is not None and s.get('y') is not None]
+        if valid:
+            coords[i, :len(valid)] = valid
+            mask[i, :len(valid)] = True
     
-    try:
-        # Try to use scipy's geometric median if available
-        from scipy.optimize import minimize
+    return coords, mask
+
+
+def calculate_geometric_medians(
+    coords: np.ndarray,
+    mask: np.ndarray,
+    max_iter: int = GEOMETRIC_MEDIAN_MAX_ITER,
+    tol: float = GEOMETRIC_MEDIAN_TOL,
+) -> np.ndarray:
+    """
+    Calculate the geometric median (L1 center) of every calibration point at once.
+    
+    Runs vectorized Weiszfeld iterations over all points simultaneously, starting
+    from the coordinate-wise median. Gaze samples are integer pixels, so the center
+    often lands exactly on samples: these are left out of the weights and handled
+    with the Vardi-Zhang modification (the center stays on them only if it is
+    optimal there). Points stop updating once their center moves less than `tol`.
+    
+    Args:
+        coords: Array of shape (n_points, max_samples, 2) with padded sample coordinates
+        mask: Boolean array of shape (n_points, max_samples), True for valid samples
+        max_iter: Maximum number of Weiszfeld iterations
+        tol: Convergence tolerance on the center displacement
         
-        points = np.array([[s['x'], s['y']] for s in valid_samples])
+    Returns:
+        Array of shape (n_points, 2) with the medians (NaN for points without samples)
+    """
+    n_points = coords.shape[0]
+    medians = np.full((n_points, 2), np.nan)
+    counts = mask.sum(axis=1)
+    has_samples = counts > 0
+    if not has_samples.any():
+        return medians
+    
+    coords = coords[has_samples]
+    mask = mask[has_samples]
+    weights_mask = mask.astype(np.float64)
+    
+    # Initial guess: coordinate-wise median
+    padded = np.where(mask[..., None], coords, np.nan)
+    center = np.nanmedian(padded, axis=1)
+    coords = np.where(mask[..., None], coords, 0.0)
+    
+    active = np.ones(center.shape[0], dtype=bool)
+    for _ in range(max_iter):
+        diff = coords[active] - center[active, None, :]
+        distances = np.hypot(diff[..., 0], diff[..., 1])
+        coincident = distances < GEOMETRIC_MEDIAN_EPS
+        weights = np.where(coincident, 0.0, weights_mask[active] / np.maximum(distances, GEOMETRIC_MEDIAN_EPS))
+        weight_sums = weights.sum(axis=1)
+        # Weiszfeld step over the samples distinct from the center
+        weiszfeld = (weights[..., None] * coords[active]).sum(axis=1) / \
+            np.maximum(weight_sums, GEOMETRIC_MEDIAN_EPS)[:, None]
         
-        # Initial guess: coordinate-wise median
-        initial_guess = np.array([
-            np.median([s['x'] for s in valid_samples]),
-            np.median([s['y'] for s in valid_samples])
-        ])
+        # Vardi-Zhang: samples on the center (multiplicity eta) pull the step back towards it;
+        # the center is optimal when the resultant of the unit vectors to the others is <= eta
+        eta = (coincident & mask[active]).sum(axis=1)
+        resultant = np.hypot(*(weights[..., None] * diff).sum(axis=1).T)
+        ratio = np.where(eta > 0, eta / np.maximum(resultant, GEOMETRIC_MEDIAN_EPS), 0.0)
+        new_center = (np.maximum(0.0, 1.0 - ratio)[:, None] * weiszfeld
+                      + np.minimum(1.0, ratio)[:, None] * center[active])
+        new_center[weight_sums == 0] = center[active][weight_sums == 0]  # All samples on the center
         
-        # Objective function: sum of distances (L1 norm)
-        def objective(center):
-            return np.sum(np.linalg.norm(points - center, axis=1))
+        shift = np.hypot(*(new_center - center[active]).T)
+        center[active] = new_center
         
-        # Minimize sum of distances
-        result = minimize(objective, initial_guess, method='BFGS')
+        still_moving = shift >= tol
+        active_indices = np.flatnonzero(active)
+        active[active_indices[~still_moving]] = False
+        if not active.any():
+            break
+    
+    medians[has_samples] = center
+    return medians
+
+
+def calculate_geometric_median(samples: List[dict]) -> Tuple[float, float]:
+    """
+    Calculate geometric median (L1 center) for robustness to outliers.
+    
+    Args:
+        samples: List of sample dictionaries with 'x' and 'y' keys
         
-        if result.success:
-            return float(result.x[0]), float(result.x[1])
-        else:
-            # Fallback to coordinate-wise median
-            return (
-                float(np.median([s['x'] for s in valid_samples])),
-                float(np.median([s['y'] for s in valid_samples]))
-            )
-    except ImportError:
-        # Fallback to coordinate-wise median if scipy not available
-        return (
-            float(np.median([s['x'] for s in valid_samples])),
-            float(np.median([s['y'] for s in valid_samples]))
-        )
-    except Exception as e:
-        # Fallback to coordinate-wise median on any error
-        print(f"Error calculating geometric median, using coordinate-wise median: {e}")
-        return (
-            float(np.median([s['x'] for s in valid_samples])),
-            float(np.median([s['y'] for s in valid_samples]))
-        )
+    Returns:
+        Tuple of (average_x, average_y) coordinates
+    """
+    coords, mask = pack_samples([samples])
+    median = calculate_geometric_medians(coords, mask)[0]
+    if np.isnan(median).any():
+        return 0.0, 0.0
+    return float(median[0]), float(median[1])
 
 
 def calculate_affine_coefficients(processed_points: List[CalibrationPointResult]) -> Optional[AffineCoefficients]:
@@ -208,6 +302,103 @@ def calculate_affine_coefficients(processed_points: List[CalibrationPointResult]
         return None
 
 
+def decode_packed_samples(point: PackedCalibrationPointData, dtype: str, n_columns: int) -> np.ndarray:
+    """
+    Decode the packed samples of a calibration point into a NumPy array.
+    
+    Args:
+        point: PackedCalibrationPointData with base64-encoded samples
+        dtype: "float32" or "float64"
+        n_columns: Number of values per sample
+        
+    Returns:
+        Array of shape (count, n_columns)
+        
+    Raises:
+        HTTPException: If the data cannot be decoded or does not match the declared shape
+    """
+    try:
+        raw = base64.b64decode(point.data, validate=True)
+    except (binascii.Error, ValueError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid base64 sample data: {e}"
+        )
+    
+    item_dtype = PACKED_SAMPLE_DTYPES[dtype]
+    expected_size = point.count * n_columns * item_dtype.itemsize
+    if point.count < 0 or len(raw) != expected_size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Sample data has {len(raw)} bytes, expected {expected_size} for {point.count} samples"
+        )
+    
+    return np.frombuffer(raw, dtype=item_dtype).reshape(point.count, n_columns).astype(np.float64)
+
+
+def _get_user_or_404(user_id: int, session: Session) -> User:
+    """Load a user or raise a 404 error"""
+    user = session.get(User, user_id)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"User with id {user_id} not found"
+        )
+    return user
+
+
+def _save_calibration(
+    user: User,
+    timestamp: Optional[int],
+    processed_points: List[CalibrationPointResult],
+    session: Session,
+) -> CalibrationResponse:
+    """
+    Calculate affine coefficients and store the calibration on the user.
+    
+    Args:
+        user: User to update
+        timestamp: Calibration timestamp in milliseconds (defaults to now)
+        processed_points: Processed calibration points
+        session: Database session
+        
+    Returns:
+        CalibrationResponse with processed data
+    """
+    # Calculate affine transformation coefficients using weighted least squares
+    affine_coefficients = calculate_affine_coefficients(processed_points)
+    
+    # Create calibration data JSON
+    timestamp = timestamp or int(datetime.utcnow().timestamp() * 1000)
+    
+    calibration_dict = {
+        "timestamp": timestamp,
+        "points": [p.model_dump() for p in processed_points],
+        "version": "1.0",
+    }
+    
+    # Add affine coefficients if available
+    if affine_coefficients:
+        calibration_dict["affine_coefficients"] = affine_coefficients.model_dump()
+    
+    calibration_json = json.dumps(calibration_dict, indent=2)
+    
+    # Update user's calibration field
+    user.calibration = calibration_json
+    user.updated_at = datetime.utcnow()
+    session.add(user)
+    session.commit()
+    session.refresh(user)
+    
+    return CalibrationResponse(
+        user_id=user.id,
+        timestamp=timestamp,
+        points=processed_points,
+        affine_coefficients=affine_coefficients,
+        calibration_data=calibration_json,
+    )
+
+
 def process_calibration_data(request: CalibrationRequest, session: Session) -> CalibrationResponse:
     """
     Process calibration data and calculate averages and affine coefficients.
@@ -223,27 +414,25 @@ def process_calibration_data(request: CalibrationRequest, session: Session) -> C
         HTTPException: If user not found
     """
     # Verify user exists
-    user = session.get(User, request.user_id)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"User with id {request.user_id} not found"
-        )
+    user = _get_user_or_404(request.user_id, session)
+    
+    # Keep only valid samples for each calibration point
+    valid_samples_per_point = [
+        [s for s in (point_data.samples or []) if s.get('x') is not None and s.get('y') is not None]
+        for point_data in request.points
+    ]
+    
+    # Calculate geometric medians (robust to outliers) for all points in one pass
+    coords, mask = pack_samples(valid_samples_per_point)
+    medians = calculate_geometric_medians(coords, mask)
     
     # Process each calibration point
     processed_points = []
-    for point_data in request.points:
-        if not point_data.samples or len(point_data.samples) == 0:
-            continue
-        
-        # Calculate averages using geometric median
-        valid_samples = [s for s in point_data.samples if s.get('x') is not None and s.get('y') is not None]
-        
+    for point_data, valid_samples, median in zip(request.points, valid_samples_per_point, medians):
         if len(valid_samples) == 0:
             continue
         
-        # Calculate geometric median (robust to outliers)
-        avg_gaze_x, avg_gaze_y = calculate_geometric_median(valid_samples)
+        avg_gaze_x, avg_gaze_y = float(median[0]), float(median[1])
         
         # Calculate screen averages if available
         screen_samples = [s for s in valid_samples if s.get('screenX') is not None and s.get('screenY') is not None]
@@ -267,36 +456,86 @@ def process_calibration_data(request: CalibrationRequest, session: Session) -> C
             offsetY=offset_y,
         ))
     
-    # Calculate affine transformation coefficients using weighted least squares
-    affine_coefficients = calculate_affine_coefficients(processed_points)
+    return _save_calibration(user, request.timestamp, processed_points, session)
+
+
+def process_packed_calibration_data(request: PackedCalibrationRequest, session: Session) -> CalibrationResponse:
+    """
+    Process calibration data sent as packed binary samples.
     
-    # Create calibration data JSON
-    timestamp = request.timestamp or int(datetime.utcnow().timestamp() * 1000)
+    Samples are decoded straight into NumPy arrays without building
+    per-sample dictionaries. Results are identical to process_calibration_data.
     
-    calibration_dict = {
-        "timestamp": timestamp,
-        "points": [p.model_dump() for p in processed_points],
-        "version": "1.0",
-    }
+    Args:
+        request: PackedCalibrationRequest with base64-encoded sample arrays
+        session: Database session
+        
+    Returns:
+        CalibrationResponse with processed data
+        
+    Raises:
+        HTTPException: If user not found or the sample data is malformed
+    """
+    if 'x' not in request.columns or 'y' not in request.columns:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Packed sample columns must include 'x' and 'y'"
+        )
     
-    # Add affine coefficients if available
-    if affine_coefficients:
-        calibration_dict["affine_coefficients"] = affine_coefficients.model_dump()
+    # Verify user exists
+    user = _get_user_or_404(request.user_id, session)
     
-    calibration_json = json.dumps(calibration_dict, indent=2)
+    n_columns = len(request.columns)
+    x_col, y_col = request.columns.index('x'), request.columns.index('y')
+    has_screen = 'screenX' in request.columns and 'screenY' in request.columns
+    if has_screen:
+        screen_x_col, screen_y_col = request.columns.index('screenX'), request.columns.index('screenY')
     
-    # Update user's calibration field
-    user.calibration = calibration_json
-    user.updated_at = datetime.utcnow()
-    session.add(user)
-    session.commit()
-    session.refresh(user)
+    # Decode every point and keep only samples with valid gaze coordinates
+    samples_per_point = []
+    for point_data in request.points:
+        samples = decode_packed_samples(point_data, request.dtype, n_columns)
+        valid = ~np.isnan(samples[:, x_col]) & ~np.isnan(samples[:, y_col])
+        samples_per_point.append(samples[valid])
     
-    return CalibrationResponse(
-        user_id=request.user_id,
-        timestamp=timestamp,
-        points=processed_points,
-        affine_coefficients=affine_coefficients,
-        calibration_data=calibration_json,
-    )
-
+    # Build the padded array for the batched geometric median
+    counts = np.array([len(samples) for samples in samples_per_point], dtype=np.int64)
+    max_samples = int(counts.max()) if len(counts) else 0
+    coords = np.zeros((len(samples_per_point), max_samples, 2), dtype=np.float64)
+    mask = np.arange(max_samples)[None, :] < counts[:, None]
+    for i, samples in enumerate(samples_per_point):
+        coords[i, :len(samples), 0] = samples[:, x_col]
+        coords[i, :len(samples), 1] = samples[:, y_col]
+    
+    medians = calculate_geometric_medians(coords, mask)
+    
+    # Process each calibration point
+    processed_points = []
+    for point_data, samples, median in zip(request.points, samples_per_point, medians):
+        if len(samples) == 0:
+            continue
+        
+        avg_gaze_x, avg_gaze_y = float(median[0]), float(median[1])
+        
+        # Calculate screen averages if available
+        avg_screen_x, avg_screen_y = 0.0, 0.0
+        if has_screen:
+            screen = samples[:, [screen_x_col, screen_y_col]]
+            screen = screen[~np.isnan(screen).any(axis=1)]
+            if len(screen) > 0:
+                avg_screen_x, avg_screen_y = (float(v) for v in screen.mean(axis=0))
+        
+        processed_points.append(CalibrationPointResult(
+            position=point_data.position,
+            targetX=point_data.targetX,
+            targetY=point_data.targetY,
+            averageGazeX=avg_gaze_x,
+            averageGazeY=avg_gaze_y,
+            averageScreenX=avg_screen_x,
+            averageScreenY=avg_screen_y,
+            sampleCount=len(samples),
+            offsetX=point_data.targetX - avg_gaze_x,
+            offsetY=point_data.targetY - avg_gaze_y,
+        ))
+    
+    return _save_calibration(user, request.timestamp, processed_points, session)
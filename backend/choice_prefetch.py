@@ -0,0 +1,212 @@
+"""
+Speculative generation of next-turn choices.
+
+Once choices are offered, the next /api/communication/choices request is
+predictable: the conversation history with one of the offered choices
+appended (and that choice appended to the current text). While the user
+dwells on the grid, follow-up choice sets are generated in the background for
+the most probable candidates. The next request is served from the matching
+speculative result (awaiting it if still running) and the other speculative
+generations are cancelled.
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+from collections import deque
+from typing import Optional, List, Dict, Any, Hashable, Callable, Awaitable
+
+
+def next_current_text(current_text: Optional[str], choice_text: str) -> str:
+    """Current text after selecting a choice (the grid appends the choice)."""
+    return f"{current_text or ''} {choice_text}".strip()
+
+
+def request_key(config_key: str, conversation_history: List[Dict[str, str]], current_text: Optional[str],
+                user_id: Optional[int], caregiver_id: Optional[int]) -> str:
+    """Key identifying the inputs of a choices request."""
+    payload = json.dumps(
+        [
+            config_key,
+            [[m.get("role", "").lower(), " ".join(m.get("content", "").split())] for m in conversation_history],
+            " ".join((current_text or "").split()),
+            user_id,
+            caregiver_id,
+        ],
+        ensure_ascii=False, separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _retrieve_exception(task: asyncio.Task) -> None:
+    """Mark the exception of an unclaimed task as retrieved (it is already logged)."""
+    if not task.cancelled():
+        task.exception()
+
+
+class ChoicePrefetcher:
+    """Generates follow-up choice sets for the most probable choices"""
+
+    def __init__(self, max_candidates: int = 2, min_probability: float = 0.15, max_concurrency: int = 2,
+                 max_requests_per_hour: int = 120):
+        """
+        Initialize the prefetcher.
+
+        Args:
+            max_candidates: Number of offered choices whose follow-up set is generated
+            min_probability: Choices less probable than this are never followed up
+            max_concurrency: Maximum number of speculative LLM calls running at the same time
+            max_requests_per_hour: Rolling hourly budget of speculative LLM calls (provider cost cap)
+        """
+        self.max_candidates = max_candidates
+        self.min_probability = min_probability
+        self.max_requests_per_hour = max_requests_per_hour
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # set key -> {request key: task}
+        self._sets: Dict[Hashable, Dict[str, asyncio.Task]] = {}
+        self._spent: deque = deque()  # timestamps of speculative calls in the last hour
+        self.stats = {
+            "scheduled": 0,
+            "served_ready": 0,
+            "served_in_flight": 0,
+            "misses": 0,
+            "cancelled": 0,
+            "failed": 0,
+            "skipped_budget": 0,
+        }
+
+    def _requests_last_hour(self) -> int:
+        """Speculative calls started within the last hour."""
+        cutoff = time.monotonic() - 3600
+        while self._spent and self._spent[0] < cutoff:
+            self._spent.popleft()
+        return len(self._spent)
+
+    def schedule(self, set_key: Hashable, config_key: str, conversation_history: List[Dict[str, str]],
+                 current_text: Optional[str], user_id: Optional[int], caregiver_id: Optional[int],
+                 choices: List[Dict[str, Any]],
+                 generate: Callable[[List[Dict[str, str]], str], Awaitable[List[Dict[str, Any]]]]) -> None:
+        """
+        Start generating the follow-up choice sets of offered choices, replacing the previous ones.
+
+        Args:
+            set_key: Identifies the conversation (e.g. the session id)
+            config_key: LLM configuration and prompt the choices depend on
+            conversation_history: History of the request that produced the choices
+            current_text: Current text of that request
+            user_id: User of the conversation
+            caregiver_id: Caregiver of the conversation
+            choices: Offered choices with "text" and "probability"
+            generate: Coroutine function generating choices for (conversation_history, current_text)
+        """
+        self.cancel(set_key)
+
+        ranked = sorted(
+            (c for c in choices if c.get("text") and (c.get("probability") or 0.0) >= self.min_probability),
+            key=lambda c: c.get("probability") or 0.0,
+            reverse=True
+        )[:self.max_candidates]
+
+        tasks = {}
+        for choice in ranked:
+            if self._requests_last_hour() + len(tasks) >= self.max_requests_per_hour:
+                self.stats["skipped_budget"] += 1
+                break
+            history = list(conversation_history) + [{"role": "assistant", "content": choice["text"]}]
+            text = next_current_text(current_text, choice["text"])
+            key = request_key(config_key, history, text, user_id, caregiver_id)
+            task = asyncio.create_task(self._run(generate, history, text))
+            task.add_done_callback(_retrieve_exception)
+            tasks[key] = task
+            self.stats["scheduled"] += 1
+
+        if tasks:
+            self._sets[set_key] = tasks
+
+    async def _run(self, generate: Callable[[List[Dict[str, str]], str], Awaitable[List[Dict[str, Any]]]],
+                   history: List[Dict[str, str]], current_text: str) -> List[Dict[str, Any]]:
+        """Generate one follow-up choice set."""
+        try:
+            async with self._semaphore:
+                self._spent.append(time.monotonic())
+                return await generate(history, current_text)
+        except asyncio.CancelledError:
+            self.stats["cancelled"] += 1
+            raise
+        except Exception as e:
+            self.stats["failed"] += 1
+            print(f"Choice Prefetch: Error generating follow-up choices: {e}")
+            raise
+
+    def take(self, set_key: Hashable, config_key: str, conversation_history: List[Dict[str, str]],
+             current_text: Optional[str], user_id: Optional[int],
+             caregiver_id: Optional[int]) -> Optional[asyncio.Task]:
+        """
+        Claim the speculative result matching a request, cancelling the other ones.
+
+        Returns:
+            The task generating the matching choices (possibly done), or None on a miss
+        """
+        tasks = self._sets.pop(set_key, None)
+        if not tasks:
+            return None
+
+        key = request_key(config_key, conversation_history, current_text, user_id, caregiver_id)
+        task = tasks.pop(key, None)
+        for other in tasks.values():
+            other.cancel()
+
+        if task is None or task.cancelled() or (task.done() and task.exception() is not None):
+            self.stats["misses"] += 1
+            return None
+        if task.done():
+            self.stats["served_ready"] += 1
+        else:
+            self.stats["served_in_flight"] += 1
+        print("Choice Prefetch: Serving speculative choices")
+        return task
+
+    def cancel(self, set_key: Hashable) -> None:
+        """Cancel the speculative generations of a conversation."""
+        for task in self._sets.pop(set_key, {}).values():
+            task.cancel()
+
+    def cancel_all(self) -> None:
+        """Cancel every speculative generation."""
+        for set_key in list(self._sets):
+            self.cancel(set_key)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get prefetch statistics."""
+        served = self.stats["served_ready"] + self.stats["served_in_flight"]
+        lookups = served + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": served / lookups if lookups else 0.0,
+            "pending": sum(len(tasks) for tasks in self._sets.values()),
+            "requests_last_hour": self._requests_last_hour(),
+            "max_requests_per_hour": self.max_requests_per_hour,
+        }
+
+
+# Global prefetcher instance
+_choice_prefetcher: Optional[ChoicePrefetcher] = None
+
+
+def get_choice_prefetcher() -> Optional[ChoicePrefetcher]:
+    """Get or create the global prefetcher (None if disabled with LLM_PREFETCH_ENABLED=false)"""
+    global _choice_prefetcher
+
+    if os.getenv("LLM_PREFETCH_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return None
+
+    if _choice_prefetcher is None:
+        _choice_prefetcher = ChoicePrefetcher(
+            max_candidates=int(os.getenv("LLM_PREFETCH_MAX_CANDIDATES", "2")),
+            min_probability=float(os.getenv("LLM_PREFETCH_MIN_PROBABILITY", "0.15")),
+            max_concurrency=int(os.getenv("LLM_PREFETCH_MAX_CONCURRENCY", "2")),
+            max_requests_per_hour=int(os.getenv("LLM_PREFETCH_REQUESTS_PER_HOUR", "120")),
+        )
+
+    return _choice_prefetcher
@@ -1,11 +1,134 @@
 from sqlmodel import SQLModel, create_engine, Session
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Dict, Any
 import os
 
 # Database file path
-DATABASE_URL = "sqlite:///./eyetracker.db"
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./eyetracker.db")
 
-# Create engine
-engine = create_engine(DATABASE_URL, echo=False, connect_args={"check_same_thread": False})
+# SQLite connection profiles: "performance" (WAL journal, applied on connect) or "default"
+# (rollback journal and SQLite defaults, as before the profile existed)
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "performance")
+
+
+def sqlite_pragmas(profile: str = SQLITE_PROFILE) -> Dict[str, Any]:
+    """
+    PRAGMA statements applied to every new SQLite connection of a profile.
+
+    With WAL, readers never block the writer and a commit appends to the log instead of
+    rewriting pages; synchronous=NORMAL only syncs at checkpoints, so a power loss can drop
+    the last commits but never corrupts the database. busy_timeout makes concurrent writers
+    wait for the write lock instead of failing with "database is locked".
+    """
+    if profile == "default":
+        return {}
+    return {
+        "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+        "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+        "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "10000")),
+        # Negative cache_size is in KiB (per connection)
+        "cache_size": -int(os.getenv("SQLITE_CACHE_SIZE_KB", "32768")),
+        "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE_MB", "256")) * 1024 * 1024,
+        "temp_store": "MEMORY",
+    }
+
+
+# Worker threads running the sync handlers and dependencies (anyio's default limit is 40);
+# applied to the threadpool on startup
+THREADPOOL_WORKERS = int(os.getenv("THREADPOOL_WORKERS", "40"))
+
+# Background threads holding a connection of their own: step writer, user model store,
+# gaze recorder and keyboard predictor training
+BACKGROUND_DB_THREADS = 4
+
+
+def default_pool_size() -> int:
+    """Connections used at once by the threadpool workers and the background threads."""
+    return THREADPOOL_WORKERS + BACKGROUND_DB_THREADS
+
+
+def default_max_overflow() -> int:
+    """Extra connections for asyncio.to_thread calls (workers of the default executor)."""
+    return min(32, (os.cpu_count() or 1) + 4)
+
+
+def sqlite_pool_options(url: str, profile: str = SQLITE_PROFILE) -> Dict[str, Any]:
+    """
+    Connection pool options of a SQLite engine (SQLAlchemy defaults for the "default" profile).
+
+    The pool is sized from the threads that can hold a connection at once, so requests never wait
+    for a connection while a worker is free; DB_POOL_SIZE and DB_MAX_OVERFLOW override the sizes.
+    """
+    if profile == "default" or ":memory:" in url:
+        return {}
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE") or default_pool_size()),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW") or default_max_overflow()),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    }
+
+
+def apply_sqlite_pragmas(sync_engine, profile: str = SQLITE_PROFILE) -> None:
+    """Run the PRAGMA statements of a profile on every new connection of an engine."""
+    pragmas = sqlite_pragmas(profile)
+    if not pragmas:
+        return
+
+    @event.listens_for(sync_engine, "connect")
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def create_database_engine(url: str = DATABASE_URL, profile: str = SQLITE_PROFILE):
+    """
+    Create the engine of a database URL with a connection profile.
+
+    Args:
+        url: SQLAlchemy database URL
+        profile: SQLite profile ("performance" or "default")
+
+    Returns:
+        SQLAlchemy engine
+    """
+    if not url.startswith("sqlite"):
+        return create_engine(url, echo=False)
+
+    new_engine = create_engine(
+        url, echo=False, connect_args={"check_same_thread": False}, **sqlite_pool_options(url, profile)
+    )
+    apply_sqlite_pragmas(new_engine, profile)
+    return new_engine
+
+
+def create_async_database_engine(url: str = DATABASE_URL, profile: str = SQLITE_PROFILE) -> AsyncEngine:
+    """
+    Create the asyncio engine of a database URL (SQLite through aiosqlite) with a connection profile.
+
+    Args:
+        url: SQLAlchemy database URL (sqlite:/// URLs use the aiosqlite driver)
+        profile: SQLite profile ("performance" or "default")
+
+    Returns:
+        SQLAlchemy async engine
+    """
+    if url.startswith("sqlite:"):
+        url = "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    if not url.startswith("sqlite"):
+        return create_async_engine(url, echo=False)
+
+    new_engine = create_async_engine(url, echo=False, **sqlite_pool_options(url, profile))
+    apply_sqlite_pragmas(new_engine.sync_engine, profile)
+    return new_engine
+
+
+# Create engines: the async engine serves the latency-critical handlers (no event loop blocking)
+engine = create_database_engine()
+async_engine = create_async_database_engine()
 
 
 def create_db_and_tables():
@@ -42,6 +165,28 @@ def migrate_database():
                     print("Added 'voice' column to users table")
     except Exception as e:
         print(f"Migration error (this is OK if columns already exist): {e}")
+    
+    migrate_indexes()
+
+
+def migrate_indexes():
+    """Create the indexes declared on the models that are missing from an existing database"""
+    from sqlalchemy import inspect
+    
+    try:
+        inspector = inspect(engine)
+        table_names = inspector.get_table_names()
+        with engine.begin() as conn:
+            for table in SQLModel.metadata.sorted_tables:
+                if table.name not in table_names:
+                    continue
+                existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+                for index in table.indexes:
+                    if index.name not in existing_indexes:
+                        index.create(conn)
+                        print(f"Created index '{index.name}' on {table.name} table")
+    except Exception as e:
+        print(f"Index migration error: {e}")
 
 
 def get_session():
@@ -49,3 +194,18 @@ def get_session():
     with Session(engine) as session:
         yield session
 
+
+async def get_async_session():
+    """
+    Get async database session.
+
+    A connection is only checked out from the pool while a transaction is open: commit, rollback
+    or close the session before awaiting a provider call (LLM, TTS) so no connection is held by it.
+    """
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
+
+async def close_async_engine():
+    """Close the connections of the async engine."""
+    await async_engine.dispose()
@@ -0,0 +1,267 @@
+"""
+Server-side fixation and dwell detection.
+
+Processed gaze frames (window coordinates) are classified into fixations with
+I-VT (velocity threshold) or I-DT (dispersion threshold). The centroid of the
+current fixation is hit-tested against the registered layout of target
+rectangles through a uniform grid index: a lookup only checks the targets
+overlapping one grid cell, so the cost per frame does not depend on the number
+of targets. Gaze resting on a target for the dwell time emits dwell_select;
+dwell_progress events report the progress in between.
+"""
+from collections import deque
+from typing import Optional, List, Dict, Any, Tuple, Literal
+
+import numpy as np
+from pydantic import BaseModel
+
+
+class DwellTarget(BaseModel):
+    """A selectable rectangle in window coordinates"""
+    id: str
+    x: float
+    y: float
+    width: float
+    height: float
+
+    def contains(self, x: float, y: float) -> bool:
+        return self.x <= x <= self.x + self.width and self.y <= y <= self.y + self.height
+
+
+class GridIndex:
+    """Uniform grid of buckets listing the targets overlapping each cell"""
+
+    def __init__(self, targets: List[DwellTarget], cell_size: float = 100.0):
+        """
+        Args:
+            targets: Target rectangles (later targets are on top of earlier ones)
+            cell_size: Bucket size in pixels
+        """
+        self.cell_size = cell_size
+        self.targets = targets
+        self._buckets: Dict[Tuple[int, int], List[int]] = {}
+        for index, target in enumerate(targets):
+            if target.width <= 0 or target.height <= 0:
+                continue
+            for cell_x in range(int(target.x // cell_size), int((target.x + target.width) // cell_size) + 1):
+                for cell_y in range(int(target.y // cell_size), int((target.y + target.height) // cell_size) + 1):
+                    self._buckets.setdefault((cell_x, cell_y), []).append(index)
+
+    def query(self, x: float, y: float) -> Optional[DwellTarget]:
+        """Topmost target containing a point (None if none)."""
+        for index in reversed(self._buckets.get((int(x // self.cell_size), int(y // self.cell_size)), ())):
+            if self.targets[index].contains(x, y):
+                return self.targets[index]
+        return None
+
+
+class Fixation:
+    """The fixation in progress"""
+    __slots__ = ("start", "x", "y")
+
+    def __init__(self, start: float, x: float, y: float):
+        self.start = start  # Timestamp (ms) of its first sample
+        self.x = x  # Centroid
+        self.y = y
+
+
+class FixationClassifier:
+    """Streaming I-VT or I-DT fixation classification"""
+
+    def __init__(self, method: Literal["ivt", "idt"] = "ivt", velocity_threshold: float = 1000.0,
+                 dispersion_threshold: float = 60.0, min_duration_ms: float = 80.0, velocity_window_ms: float = 24.0):
+        """
+        Args:
+            method: "ivt" (velocity threshold) or "idt" (dispersion threshold)
+            velocity_threshold: I-VT: maximum gaze speed (px/s) of a fixation sample
+            dispersion_threshold: I-DT: maximum (max x - min x) + (max y - min y) (px) of a fixation
+            min_duration_ms: Minimum duration before a fixation is reported
+            velocity_window_ms: I-VT: speed is measured over this interval (per-sample speed is mostly jitter)
+        """
+        self.method = method
+        self.velocity_threshold = velocity_threshold
+        self.dispersion_threshold = dispersion_threshold
+        self.min_duration_ms = min_duration_ms
+        self.velocity_window_ms = velocity_window_ms
+        self._recent: deque = deque()  # I-VT: samples of the last velocity window
+        # Current fixation candidate: start time, sample count and coordinate sums
+        self._start: Optional[float] = None
+        self._count = 0
+        self._sum_x = 0.0
+        self._sum_y = 0.0
+        # I-DT window with monotonic deques of (sequence, value) for min/max
+        self._window: deque = deque()
+        self._seq = 0
+        self._extrema = {name: deque() for name in ("min_x", "max_x", "min_y", "max_y")}
+
+    def update(self, t: float, x: float, y: float) -> Optional[Fixation]:
+        """Classify a sample, returning the fixation in progress (None during saccades)."""
+        if self.method == "idt":
+            return self._update_idt(t, x, y)
+        return self._update_ivt(t, x, y)
+
+    def reset(self) -> None:
+        """Forget the fixation in progress (e.g. after a tracking gap)."""
+        self._recent.clear()
+        self._start = None
+        self._count = 0
+        self._sum_x = self._sum_y = 0.0
+        self._window.clear()
+        for extremum in self._extrema.values():
+            extremum.clear()
+
+    def _fixation(self, t: float) -> Optional[Fixation]:
+        if self._start is None or self._count == 0 or t - self._start < self.min_duration_ms:
+            return None
+        return Fixation(self._start, self._sum_x / self._count, self._sum_y / self._count)
+
+    def _update_ivt(self, t: float, x: float, y: float) -> Optional[Fixation]:
+        # Oldest sample still within the velocity window (kept at least one sample behind)
+        while len(self._recent) > 1 and t - self._recent[1][0] >= self.velocity_window_ms:
+            self._recent.popleft()
+        previous = self._recent[0] if self._recent else None
+        self._recent.append((t, x, y))
+        if previous is not None and t > previous[0]:
+            speed = np.hypot(x - previous[1], y - previous[2]) / ((t - previous[0]) / 1000.0)
+            if speed > self.velocity_threshold:
+                # Saccade: the next slow sample starts a new fixation
+                self._start = None
+                return None
+        if self._start is None:
+            self._start, self._count, self._sum_x, self._sum_y = t, 0, 0.0, 0.0
+        self._count += 1
+        self._sum_x += x
+        self._sum_y += y
+        return self._fixation(t)
+
+    def _push_extremum(self, name: str, value: float, keep_smaller: bool) -> None:
+        extremum = self._extrema[name]
+        while extremum and (extremum[-1][1] >= value if keep_smaller else extremum[-1][1] <= value):
+            extremum.pop()
+        extremum.append((self._seq, value))
+
+    def _dispersion(self) -> float:
+        e = self._extrema
+        return (e["max_x"][0][1] - e["min_x"][0][1]) + (e["max_y"][0][1] - e["min_y"][0][1])
+
+    def _pop_oldest(self) -> None:
+        seq, _, x, y = self._window.popleft()
+        self._count -= 1
+        self._sum_x -= x
+        self._sum_y -= y
+        for extremum in self._extrema.values():
+            if extremum and extremum[0][0] == seq:
+                extremum.popleft()
+
+    def _update_idt(self, t: float, x: float, y: float) -> Optional[Fixation]:
+        self._seq += 1
+        self._window.append((self._seq, t, x, y))
+        self._count += 1
+        self._sum_x += x
+        self._sum_y += y
+        self._push_extremum("min_x", x, True)
+        self._push_extremum("max_x", x, False)
+        self._push_extremum("min_y", y, True)
+        self._push_extremum("max_y", y, False)
+        # Too dispersed: the fixation (if any) ended, keep the samples compatible with the new one
+        if self._dispersion() > self.dispersion_threshold:
+            while len(self._window) > 1 and self._dispersion() > self.dispersion_threshold:
+                self._pop_oldest()
+            self._start = self._window[0][1]
+        elif self._start is None:
+            self._start = t
+        return self._fixation(t)
+
+
+class DwellDetector:
+    """Dwell selection on a layout of targets from processed gaze frames"""
+
+    def __init__(self, targets: List[DwellTarget], dwell_time: float = 2.0, method: Literal["ivt", "idt"] = "ivt",
+                 cell_size: float = 100.0, max_gap_ms: float = 150.0, progress_interval_ms: float = 50.0,
+                 **classifier_params):
+        """
+        Args:
+            targets: Target rectangles in window coordinates
+            dwell_time: Dwell time in seconds
+            method: Fixation classification ("ivt" or "idt")
+            cell_size: Grid index bucket size in pixels
+            max_gap_ms: Saccades or invalid frames shorter than this keep the dwell going
+            progress_interval_ms: Minimum interval between dwell_progress events
+            classifier_params: velocity_threshold, dispersion_threshold, min_duration_ms
+        """
+        self.index = GridIndex(targets, cell_size)
+        self.dwell_ms = dwell_time * 1000
+        self.max_gap_ms = max_gap_ms
+        self.progress_interval_ms = progress_interval_ms
+        self.classifier = FixationClassifier(method, **classifier_params)
+        self.target: Optional[DwellTarget] = None
+        self._dwell_start = 0.0
+        self._fixation_start: Optional[float] = None
+        self._last_on_target = 0.0
+        self._last_progress = float("-inf")
+        self.stats = {"frames": 0, "fixation_frames": 0, "selections": 0}
+
+    def _leave(self, events: List[Dict[str, Any]], t: float) -> None:
+        if self.target is not None:
+            events.append({"type": "dwell_progress", "target_id": None, "progress": 0.0, "t": t})
+        self.target = None
+
+    def process(self, frames: np.ndarray, valid: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """
+        Update the dwell state with processed frames.
+
+        Args:
+            frames: (n, 3) array of timestamp (ms), x, y in window coordinates
+            valid: Optional boolean mask of frames with a valid gaze
+
+        Returns:
+            dwell_progress / dwell_select events
+        """
+        events: List[Dict[str, Any]] = []
+        for i, (t, x, y) in enumerate(frames.tolist()):
+            self.stats["frames"] += 1
+            if valid is not None and not valid[i]:
+                self.classifier.reset()
+                fixation = None
+            else:
+                fixation = self.classifier.update(t, x, y)
+
+            if fixation is None:
+                # Saccade, blink or fixation not yet established: small saccades within the target
+                # keep the dwell going, leaving it for longer than max_gap_ms ends it
+                if self.target is not None:
+                    if (valid is None or valid[i]) and self.target.contains(x, y):
+                        self._last_on_target = t
+                    elif t - self._last_on_target > self.max_gap_ms:
+                        self._leave(events, t)
+                continue
+
+            self.stats["fixation_frames"] += 1
+            target = self.index.query(fixation.x, fixation.y)
+            if target is None:
+                self._leave(events, t)
+                self._fixation_start = fixation.start
+                continue
+
+            if self.target is None or target.id != self.target.id:
+                self._leave(events, t)
+                self.target = target
+                # A new fixation counts from its start; a fixation drifting onto the target from now
+                self._dwell_start = fixation.start if fixation.start != self._fixation_start else t
+                self._last_progress = float("-inf")
+            self._fixation_start = fixation.start
+            self._last_on_target = t
+
+            progress = (t - self._dwell_start) / self.dwell_ms if self.dwell_ms > 0 else 1.0
+            if progress >= 1.0:
+                events.append({"type": "dwell_select", "target_id": target.id, "t": t})
+                self.stats["selections"] += 1
+                # Keeping the gaze on the target selects it again after another dwell time
+                self._dwell_start = t
+                self._last_progress = t
+                events.append({"type": "dwell_progress", "target_id": target.id, "progress": 0.0, "t": t})
+            elif t - self._last_progress >= self.progress_interval_ms:
+                events.append({"type": "dwell_progress", "target_id": target.id, "progress": round(progress, 3),
+                               "t": t})
+                self._last_progress = t
+        return events
@@ -0,0 +1,478 @@
+"""
+Server-side gaze processing pipeline.
+
+The backend connects to the eye tracker WebSocket (the C# tracker app) and
+processes the raw gaze stream for each /ws/gaze client:
+
+- screen to window coordinates (display scaling, window offset, header) from
+  the viewport the browser reports,
+- the user's affine calibration (User.calibration JSON),
+- a smoothing filter (One Euro or constant-velocity Kalman).
+
+Processed frames are sent in the binary gaze protocol (gaze_protocol) or, in
+JSON-compat mode, as JSON messages. Clients that register a layout of targets
+also get dwell_progress/dwell_select events from a dwell detector
+(dwell_detector) running on their processed frames.
+
+Frames received since the last send are processed together as NumPy arrays,
+so the browser only receives compact processed frames and draws them. A slow
+client drops its oldest frames instead of delaying the stream.
+"""
+import os
+import json
+import time
+import asyncio
+from collections import deque
+from typing import Optional, List, Dict, Any, Tuple, Callable, Awaitable, Literal
+
+import numpy as np
+from pydantic import BaseModel
+from sqlmodel import Session
+
+from models import User
+from gaze_protocol import GazeFrameEncoder, tracker_validity, FLAG_VALID
+from dwell_detector import DwellDetector
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+
+# Columns of a raw sample
+SAMPLE_T, SAMPLE_X, SAMPLE_Y, SAMPLE_SCREEN_WIDTH, SAMPLE_SCREEN_HEIGHT, SAMPLE_FLAGS, SAMPLE_EYE = range(7)
+
+
+def parse_tracker_message(data: Dict[str, Any]) -> Optional[Tuple[float, ...]]:
+    """
+    Extract a gaze sample from a tracker message.
+
+    Returns:
+        (timestamp ms, screen x px, screen y px, screen width px, screen height px, validity flags, eye),
+        or None if the message has no gaze
+    """
+    screen_width = data.get("screenWidth") or 0.0
+    screen_height = data.get("screenHeight") or 0.0
+    if data.get("pixelX") is not None and data.get("pixelY") is not None:
+        x, y = data["pixelX"], data["pixelY"]
+    elif data.get("x") is not None and data.get("y") is not None and data.get("screenWidth") and screen_height:
+        x, y = data["x"] * data["screenWidth"], data["y"] * screen_height
+    else:
+        return None
+    timestamp = data.get("timestamp")
+    if not isinstance(timestamp, (int, float)):
+        timestamp = time.time() * 1000
+    flags, eye = tracker_validity(data)
+    return float(timestamp), float(x), float(y), float(screen_width), float(screen_height), flags, eye
+
+
+class Viewport(BaseModel):
+    """Browser window geometry used to convert screen coordinates to window coordinates"""
+    scale_factor: float = 1.0
+    scale_mode: Literal["divide", "multiply", "none"] = "divide"
+    offset_x: float = 0.0  # Window position plus manual offset (ignored in fullscreen)
+    offset_y: float = 0.0
+    header_correction: float = 0.0  # Header height subtracted from y (ignored in fullscreen)
+    header_height: float = 0.0  # Header height excluded from the clamped area (ignored in fullscreen)
+    invert_y: bool = False
+    fullscreen: bool = False
+    width: float = 1920.0  # Window inner size
+    height: float = 1080.0
+
+    def apply(self, x: np.ndarray, y: np.ndarray, screen_height: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Convert screen coordinates to clamped window coordinates (same steps as the browser)."""
+        scale = self.scale_factor if self.scale_factor > 0 else 1.0
+        if self.scale_mode == "divide":
+            x, y, screen_height = x / scale, y / scale, screen_height / scale
+        elif self.scale_mode == "multiply":
+            x, y = x * scale, y * scale
+
+        if self.invert_y:
+            y = np.where(screen_height > 0, screen_height - y, y)
+
+        if self.fullscreen:
+            return np.clip(x, 0, self.width), np.clip(y, 0, self.height)
+
+        x = x - self.offset_x
+        y = y - self.offset_y - self.header_correction
+        return np.clip(x, 0, self.width), np.clip(y, 0, self.height - self.header_height)
+
+
+def affine_matrix(calibration: Optional[str]) -> Optional[np.ndarray]:
+    """
+    Affine calibration of a user as a 2x3 matrix [[a0, a1, a2], [b0, b1, b2]].
+
+    Args:
+        calibration: User.calibration JSON string
+
+    Returns:
+        The matrix, or None if the user has no affine calibration
+    """
+    if not calibration:
+        return None
+    try:
+        coefficients = json.loads(calibration).get("affine_coefficients")
+        if not coefficients:
+            return None
+        return np.array([
+            [coefficients["a0"], coefficients["a1"], coefficients["a2"]],
+            [coefficients["b0"], coefficients["b1"], coefficients["b2"]],
+        ], dtype=np.float64)
+    except Exception as e:
+        print(f"Gaze Pipeline: Invalid calibration data: {e}")
+        return None
+
+
+def apply_affine(matrix: np.ndarray, x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Apply X = a0 + a1*x + a2*y, Y = b0 + b1*x + b2*y to arrays of points."""
+    calibrated = np.column_stack([np.ones_like(x), x, y]) @ matrix.T
+    return calibrated[:, 0], calibrated[:, 1]
+
+
+def load_user_calibration(engine, user_id: Optional[int]) -> Optional[np.ndarray]:
+    """Affine calibration matrix stored on a user (None if none)."""
+    if user_id is None:
+        return None
+    with Session(engine) as session:
+        user = session.get(User, user_id)
+        return affine_matrix(user.calibration) if user is not None else None
+
+
+class OneEuroFilter:
+    """One Euro filter (speed-adaptive low-pass) on both axes"""
+
+    def __init__(self, min_cutoff: float = 1.0, beta: float = 0.007, d_cutoff: float = 1.0):
+        """
+        Args:
+            min_cutoff: Cutoff frequency (Hz) at rest: lower removes more jitter during fixations
+            beta: Cutoff increase per unit of speed: higher reduces lag during saccades
+            d_cutoff: Cutoff frequency (Hz) of the speed estimate
+        """
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self._point: Optional[np.ndarray] = None
+        self._speed = np.zeros(2)
+        self._t: Optional[float] = None
+
+    @staticmethod
+    def _alpha(cutoff: np.ndarray, dt: float) -> np.ndarray:
+        tau = 1.0 / (2 * np.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def filter(self, t_ms: np.ndarray, points: np.ndarray) -> np.ndarray:
+        """Filter (n, 2) points sampled at t_ms."""
+        out = np.empty_like(points)
+        for i in range(len(points)):
+            point, t = points[i], t_ms[i] / 1000.0
+            if self._point is None or t <= self._t:
+                # First sample (or out-of-order timestamp): no history to filter with
+                if self._point is None:
+                    self._point = point.copy()
+                out[i] = self._point
+                self._t = t if self._t is None else max(self._t, t)
+                continue
+            dt = t - self._t
+            speed = (point - self._point) / dt
+            self._speed += self._alpha(np.full(2, self.d_cutoff), dt) * (speed - self._speed)
+            cutoff = self.min_cutoff + self.beta * np.abs(self._speed)
+            self._point = self._point + self._alpha(cutoff, dt) * (point - self._point)
+            self._t = t
+            out[i] = self._point
+        return out
+
+
+class KalmanFilter:
+    """Constant-velocity Kalman filter on both axes (same noise model, so one shared covariance)"""
+
+    def __init__(self, process_noise: float = 1e7, measurement_noise: float = 400.0):
+        """
+        Args:
+            process_noise: Acceleration variance (px²/s⁴): higher follows saccades faster, lower smooths more
+            measurement_noise: Gaze measurement variance (px²): higher smooths more
+        """
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self._state: Optional[np.ndarray] = None  # Rows: x, y; columns: position, velocity
+        self._covariance = np.eye(2) * measurement_noise
+        self._t: Optional[float] = None
+
+    def filter(self, t_ms: np.ndarray, points: np.ndarray) -> np.ndarray:
+        """Filter (n, 2) points sampled at t_ms."""
+        out = np.empty_like(points)
+        for i in range(len(points)):
+            point, t = points[i], t_ms[i] / 1000.0
+            if self._state is None:
+                self._state = np.column_stack([point, np.zeros(2)])
+                self._t = t
+                out[i] = point
+                continue
+            dt = max(t - self._t, 1e-3)
+            self._t = max(self._t, t)
+            # Predict
+            transition = np.array([[1.0, dt], [0.0, 1.0]])
+            noise = self.process_noise * np.array([[dt ** 4 / 4, dt ** 3 / 2], [dt ** 3 / 2, dt ** 2]])
+            self._state = self._state @ transition.T
+            self._covariance = transition @ self._covariance @ transition.T + noise
+            # Update (the position is measured)
+            gain = self._covariance[:, 0] / (self._covariance[0, 0] + self.measurement_noise)
+            self._state = self._state + np.outer(point - self._state[:, 0], gain)
+            self._covariance = self._covariance - np.outer(gain, self._covariance[0, :])
+            out[i] = self._state[:, 0]
+        return out
+
+
+GAZE_FILTERS = ("one_euro", "kalman", "none")
+
+
+def create_filter(name: str, params: Optional[Dict[str, float]] = None):
+    """Create a gaze filter by name (None for "none")."""
+    params = params or {}
+    if name == "one_euro":
+        return OneEuroFilter(**params)
+    if name == "kalman":
+        return KalmanFilter(**params)
+    if name == "none":
+        return None
+    raise ValueError(f"Unsupported gaze filter: {name}. Supported: {', '.join(GAZE_FILTERS)}")
+
+
+class GazeSubscriber:
+    """A /ws/gaze client: its viewport, calibration and filter, and the frames waiting to be sent"""
+
+    def __init__(self, send_json: Callable[[Dict[str, Any]], Awaitable[None]],
+                 send_bytes: Callable[[bytes], Awaitable[None]], filter_name: str = "one_euro",
+                 binary: bool = False, max_pending: int = 256):
+        """
+        Args:
+            send_json: Coroutine function sending a JSON message to the client
+            send_bytes: Coroutine function sending a binary message to the client
+            filter_name: Initial smoothing filter
+            binary: Send the binary gaze protocol (otherwise JSON-compat messages)
+            max_pending: Raw frames kept while the client is busy (oldest dropped first)
+        """
+        self.send_json = send_json
+        self.send_bytes = send_bytes
+        self.encoder = GazeFrameEncoder(binary=binary)
+        self.viewport = Viewport()
+        self.calibration: Optional[np.ndarray] = None
+        self.filter_name = filter_name
+        self.filter = create_filter(filter_name)
+        self.dwell: Optional[DwellDetector] = None
+        self._pending: deque = deque(maxlen=max_pending)
+        self._ready = asyncio.Event()
+        self.stats = {"received": 0, "sent": 0, "messages": 0, "bytes": 0, "dropped": 0, "dwell_events": 0}
+
+    def configure(self, viewport: Optional[Viewport] = None, calibration: Optional[np.ndarray] = None,
+                  filter_name: Optional[str] = None, filter_params: Optional[Dict[str, float]] = None,
+                  binary: Optional[bool] = None) -> None:
+        """Update the processing settings of the client (the filter restarts when changed)."""
+        if binary is not None and binary != self.encoder.binary:
+            # A new binary stream starts with a header
+            self.encoder = GazeFrameEncoder(binary=binary)
+        if viewport is not None:
+            self.viewport = viewport
+        self.calibration = calibration
+        if filter_name is not None and (filter_name != self.filter_name or filter_params):
+            self.filter = create_filter(filter_name, filter_params)
+            self.filter_name = filter_name
+
+    def set_layout(self, dwell: Optional[DwellDetector]) -> None:
+        """Replace the dwell detector of the client (None to stop dwell detection)."""
+        self.dwell = dwell
+
+    def push(self, sample: Tuple[float, ...]) -> None:
+        """Queue a raw tracker sample."""
+        if len(self._pending) == self._pending.maxlen:
+            self.stats["dropped"] += 1
+        self._pending.append(sample)
+        self.stats["received"] += 1
+        self._ready.set()
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """
+        Process raw samples.
+
+        Args:
+            samples: (n, 7) array of raw samples (SAMPLE_* columns)
+
+        Returns:
+            (n, 3) array of timestamp, window x, window y
+        """
+        x, y = self.viewport.apply(samples[:, SAMPLE_X], samples[:, SAMPLE_Y], samples[:, SAMPLE_SCREEN_HEIGHT])
+        if self.calibration is not None:
+            x, y = apply_affine(self.calibration, x, y)
+        points = np.column_stack([x, y])
+        if self.filter is not None:
+            points = self.filter.filter(samples[:, SAMPLE_T], points)
+        return np.column_stack([samples[:, SAMPLE_T], points])
+
+    async def run(self) -> None:
+        """Send the processed frames as they arrive (batched if the client lags behind)."""
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            if not self._pending:
+                continue
+            samples = np.array(self._pending, dtype=np.float64)
+            self._pending.clear()
+            frames = self.process(samples)
+            await self.send_frames(samples, frames)
+            if self.dwell is not None:
+                valid = (samples[:, SAMPLE_FLAGS].astype(np.uint8) & FLAG_VALID) != 0
+                for event in self.dwell.process(frames, valid):
+                    await self.send_json(event)
+                    self.stats["dwell_events"] += 1
+
+    async def send_frames(self, samples: np.ndarray, frames: np.ndarray) -> None:
+        """Encode processed frames (with a header first when the stream starts or the screen changes)."""
+        screen = (
+            float(samples[-1, SAMPLE_SCREEN_WIDTH]), float(samples[-1, SAMPLE_SCREEN_HEIGHT]),
+            self.viewport.scale_factor,
+        )
+        if self.encoder.needs_header(*screen):
+            header = self.encoder.header(float(frames[0, 0]), *screen)
+            await self.send_bytes(header)
+            self.stats["bytes"] += len(header)
+        for message in self.encoder.encode(
+            frames[:, 0], frames[:, 1], frames[:, 2],
+            samples[:, SAMPLE_FLAGS].astype(np.uint8), samples[:, SAMPLE_EYE].astype(np.uint8)
+        ):
+            if isinstance(message, bytes):
+                await self.send_bytes(message)
+                self.stats["bytes"] += len(message)
+            else:
+                await self.send_json(message)
+            self.stats["messages"] += 1
+        self.stats["sent"] += len(frames)
+
+
+class GazePipeline:
+    """Reads the tracker WebSocket while clients or listeners are subscribed and fans samples out to them"""
+
+    def __init__(self, tracker_url: str = "ws://127.0.0.1:8765", reconnect_delay: float = 1.0):
+        """
+        Args:
+            tracker_url: WebSocket URL of the eye tracker app
+            reconnect_delay: Initial delay before reconnecting (doubles up to 10 s)
+        """
+        self.tracker_url = tracker_url
+        self.reconnect_delay = reconnect_delay
+        self.subscribers: List[GazeSubscriber] = []
+        self.listeners: List[Any] = []  # Raw sample consumers with a push(sample) method (e.g. the recorder)
+        self.tracker_connected = False
+        self._reader: Optional[asyncio.Task] = None
+        self.stats = {"messages": 0, "samples": 0, "invalid": 0, "connections": 0, "connection_errors": 0}
+
+    def subscribe(self, subscriber: GazeSubscriber) -> None:
+        """Add a client, connecting to the tracker if needed."""
+        self.subscribers.append(subscriber)
+        self._ensure_reading()
+
+    def unsubscribe(self, subscriber: GazeSubscriber) -> None:
+        """Remove a client (the tracker connection closes with the last one)."""
+        if subscriber in self.subscribers:
+            self.subscribers.remove(subscriber)
+
+    def add_listener(self, listener: Any) -> None:
+        """Add a raw sample consumer, connecting to the tracker if needed."""
+        if listener not in self.listeners:
+            self.listeners.append(listener)
+        self._ensure_reading()
+
+    def remove_listener(self, listener: Any) -> None:
+        """Remove a raw sample consumer."""
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    @property
+    def active(self) -> bool:
+        """Whether anyone consumes the tracker samples."""
+        return bool(self.subscribers or self.listeners)
+
+    def _ensure_reading(self) -> None:
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(self._read_tracker())
+
+    def dispatch(self, message: Any) -> None:
+        """Parse a tracker message and queue its sample for every client."""
+        self.stats["messages"] += 1
+        try:
+            sample = parse_tracker_message(json.loads(message))
+        except (ValueError, TypeError, AttributeError):
+            sample = None
+        if sample is None:
+            self.stats["invalid"] += 1
+            return
+        self.stats["samples"] += 1
+        for subscriber in self.subscribers:
+            subscriber.push(sample)
+        for listener in self.listeners:
+            listener.push(sample)
+
+    async def _read_tracker(self) -> None:
+        """Read the tracker while there are clients, reconnecting after errors."""
+        delay = self.reconnect_delay
+        while self.active:
+            try:
+                async with websockets.connect(self.tracker_url) as tracker:
+                    self.tracker_connected = True
+                    self.stats["connections"] += 1
+                    delay = self.reconnect_delay
+                    print(f"Gaze Pipeline: Connected to tracker at {self.tracker_url}")
+                    async for message in tracker:
+                        self.dispatch(message)
+                        if not self.active:
+                            break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["connection_errors"] += 1
+                print(f"Gaze Pipeline: Tracker connection error: {e}")
+            finally:
+                self.tracker_connected = False
+            if self.active:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 10.0)
+        print("Gaze Pipeline: No more clients or listeners, tracker connection closed")
+
+    def stop(self) -> None:
+        """Close the tracker connection."""
+        if self._reader is not None:
+            self._reader.cancel()
+            self._reader = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get tracker and client statistics."""
+        return {
+            **self.stats,
+            "tracker_url": self.tracker_url,
+            "tracker_connected": self.tracker_connected,
+            "clients": [
+                {**subscriber.stats, "filter": subscriber.filter_name,
+                 "format": "binary" if subscriber.encoder.binary else "json",
+                 "dwell": subscriber.dwell.stats if subscriber.dwell is not None else None,
+                 "calibrated": subscriber.calibration is not None}
+                for subscriber in self.subscribers
+            ],
+        }
+
+
+# Global gaze pipeline
+_gaze_pipeline: Optional[GazePipeline] = None
+
+
+def get_gaze_pipeline() -> Optional[GazePipeline]:
+    """Get or create the global gaze pipeline (None if disabled with GAZE_PIPELINE_ENABLED=false
+    or if the websockets package is missing)"""
+    global _gaze_pipeline
+
+    if os.getenv("GAZE_PIPELINE_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return None
+    if websockets is None:
+        return None
+
+    if _gaze_pipeline is None:
+        _gaze_pipeline = GazePipeline(tracker_url=os.getenv("GAZE_TRACKER_URL", "ws://127.0.0.1:8765"))
+
+    return _gaze_pipeline
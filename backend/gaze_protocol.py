@@ -0,0 +1,228 @@
+"""
+Compact binary frame protocol for gaze WebSocket traffic.
+
+All values are little-endian. A stream starts with one header message, then
+carries batches of fixed-size frame records:
+
+Header message (32 bytes):
+    magic        4s   b"GZH1"
+    version      u8   PROTOCOL_VERSION
+    flags        u8   HEADER_WINDOW_COORDINATES if x/y are window pixels (else screen pixels)
+    record_size  u16  FRAME_DTYPE.itemsize
+    screen_width f32  Screen size in pixels (0 if unknown)
+    screen_height f32
+    scale_factor f32  Display scale factor the coordinates were computed with
+    base_time    f64  Epoch time (ms) that frame timestamps are relative to
+    reserved     4x
+
+Batch message (8 + 16 * count bytes):
+    magic        4s   b"GZB1"
+    count        u16  Number of records
+    reserved     2x
+    records      count x FRAME_DTYPE
+
+Frame record (16 bytes):
+    t      u32  Milliseconds since the header base_time
+    x      f32  Gaze x (pixels)
+    y      f32  Gaze y (pixels)
+    flags  u8   FLAG_VALID, FLAG_LEFT_VALID, FLAG_RIGHT_VALID
+    eye    u8   EYE_BOTH, EYE_LEFT or EYE_RIGHT
+    seq    u16  Frame sequence number (wraps), to detect dropped frames
+
+The JSON-compat mode encodes the same frames as the JSON messages of the
+/ws/gaze endpoint ({"type": "gaze", "frames": [[t, x, y], ...]}) for clients
+that do not decode binary messages.
+"""
+import json
+import struct
+from typing import Optional, List, Dict, Any, Tuple, Union
+
+import numpy as np
+
+
+PROTOCOL_VERSION = 1
+
+HEADER_MAGIC = b"GZH1"
+BATCH_MAGIC = b"GZB1"
+
+HEADER_STRUCT = struct.Struct("<4sBBHfffd4x")
+BATCH_STRUCT = struct.Struct("<4sH2x")
+
+FRAME_DTYPE = np.dtype([
+    ("t", "<u4"),
+    ("x", "<f4"),
+    ("y", "<f4"),
+    ("flags", "u1"),
+    ("eye", "u1"),
+    ("seq", "<u2"),
+])
+
+# Header flags
+HEADER_WINDOW_COORDINATES = 0x01
+
+# Frame flags
+FLAG_VALID = 0x01
+FLAG_LEFT_VALID = 0x02
+FLAG_RIGHT_VALID = 0x04
+
+# Eye of a frame
+EYE_BOTH = 0
+EYE_LEFT = 1
+EYE_RIGHT = 2
+
+# Batches are capped so a count always fits the u16 field
+MAX_BATCH_FRAMES = 0xFFFF
+
+
+class GazeProtocolError(ValueError):
+    """A message does not follow the binary gaze protocol"""
+
+
+def tracker_validity(data: Dict[str, Any]) -> Tuple[int, int]:
+    """
+    Validity flags and eye of a tracker JSON message.
+
+    Per-eye validity is read from leftValid/rightValid (or leftEyeValid/rightEyeValid)
+    when the tracker reports it; otherwise a message with gaze is valid for both eyes.
+
+    Returns:
+        (flags, eye)
+    """
+    left = data.get("leftValid", data.get("leftEyeValid"))
+    right = data.get("rightValid", data.get("rightEyeValid"))
+    if left is None and right is None:
+        return FLAG_VALID | FLAG_LEFT_VALID | FLAG_RIGHT_VALID, EYE_BOTH
+
+    flags = (FLAG_LEFT_VALID if left else 0) | (FLAG_RIGHT_VALID if right else 0)
+    if flags:
+        flags |= FLAG_VALID
+    if left and not right:
+        return flags, EYE_LEFT
+    if right and not left:
+        return flags, EYE_RIGHT
+    return flags, EYE_BOTH
+
+
+def encode_header(base_time: float, screen_width: float = 0.0, screen_height: float = 0.0,
+                  scale_factor: float = 1.0, window_coordinates: bool = False) -> bytes:
+    """Encode the header message of a stream."""
+    return HEADER_STRUCT.pack(
+        HEADER_MAGIC, PROTOCOL_VERSION, HEADER_WINDOW_COORDINATES if window_coordinates else 0,
+        FRAME_DTYPE.itemsize, screen_width, screen_height, scale_factor, base_time
+    )
+
+
+def decode_header(message: bytes) -> Dict[str, Any]:
+    """Decode a header message."""
+    if len(message) != HEADER_STRUCT.size or message[:4] != HEADER_MAGIC:
+        raise GazeProtocolError("Not a gaze header message")
+    _, version, flags, record_size, screen_width, screen_height, scale_factor, base_time = \
+        HEADER_STRUCT.unpack(message)
+    if version != PROTOCOL_VERSION or record_size != FRAME_DTYPE.itemsize:
+        raise GazeProtocolError(f"Unsupported gaze protocol version {version} (record size {record_size})")
+    return {
+        "version": version,
+        "window_coordinates": bool(flags & HEADER_WINDOW_COORDINATES),
+        "screen_width": screen_width,
+        "screen_height": screen_height,
+        "scale_factor": scale_factor,
+        "base_time": base_time,
+    }
+
+
+def encode_batch(frames: np.ndarray) -> bytes:
+    """
+    Encode frame records as a batch message.
+
+    Args:
+        frames: Array of FRAME_DTYPE records (at most MAX_BATCH_FRAMES)
+    """
+    if len(frames) > MAX_BATCH_FRAMES:
+        raise GazeProtocolError(f"Batch of {len(frames)} frames exceeds {MAX_BATCH_FRAMES}")
+    return BATCH_STRUCT.pack(BATCH_MAGIC, len(frames)) + frames.astype(FRAME_DTYPE, copy=False).tobytes()
+
+
+def decode_batch(message: bytes) -> np.ndarray:
+    """Decode a batch message into FRAME_DTYPE records (a read-only view of the message)."""
+    if len(message) < BATCH_STRUCT.size or message[:4] != BATCH_MAGIC:
+        raise GazeProtocolError("Not a gaze batch message")
+    _, count = BATCH_STRUCT.unpack_from(message)
+    if len(message) != BATCH_STRUCT.size + count * FRAME_DTYPE.itemsize:
+        raise GazeProtocolError(f"Batch of {count} frames has {len(message)} bytes")
+    return np.frombuffer(message, dtype=FRAME_DTYPE, count=count, offset=BATCH_STRUCT.size)
+
+
+def decode_message(message: bytes) -> Union[Dict[str, Any], np.ndarray]:
+    """Decode a header (dict) or batch (records) message."""
+    if message[:4] == HEADER_MAGIC:
+        return decode_header(message)
+    return decode_batch(message)
+
+
+class GazeFrameEncoder:
+    """Encodes a stream of frames as binary messages or JSON-compat messages"""
+
+    def __init__(self, binary: bool = True, window_coordinates: bool = True):
+        """
+        Args:
+            binary: Encode binary header and batch messages (otherwise JSON-compat dicts)
+            window_coordinates: Frames are window pixels (processed) rather than screen pixels
+        """
+        self.binary = binary
+        self.window_coordinates = window_coordinates
+        self.base_time: Optional[float] = None
+        self.screen = (0.0, 0.0, 1.0)
+        self._seq = 0
+
+    def needs_header(self, screen_width: float = 0.0, screen_height: float = 0.0,
+                     scale_factor: float = 1.0) -> bool:
+        """Whether a header must be sent first (stream start or screen metadata change)."""
+        return self.binary and (self.base_time is None or self.screen != (screen_width, screen_height, scale_factor))
+
+    def header(self, base_time: float, screen_width: float = 0.0, screen_height: float = 0.0,
+               scale_factor: float = 1.0) -> bytes:
+        """Start a stream: encode its header message."""
+        self.base_time = base_time
+        self.screen = (screen_width, screen_height, scale_factor)
+        return encode_header(base_time, screen_width, screen_height, scale_factor, self.window_coordinates)
+
+    def records(self, t_ms: np.ndarray, x: np.ndarray, y: np.ndarray, flags: Optional[np.ndarray] = None,
+                eye: Optional[np.ndarray] = None) -> np.ndarray:
+        """Build the FRAME_DTYPE records of frames (timestamps relative to the header base_time)."""
+        count = len(t_ms)
+        frames = np.empty(count, dtype=FRAME_DTYPE)
+        frames["t"] = np.clip(np.asarray(t_ms) - (self.base_time or 0.0), 0, 0xFFFFFFFF)
+        frames["x"] = x
+        frames["y"] = y
+        frames["flags"] = FLAG_VALID if flags is None else flags
+        frames["eye"] = EYE_BOTH if eye is None else eye
+        frames["seq"] = (self._seq + np.arange(count)) & 0xFFFF
+        self._seq = (self._seq + count) & 0xFFFF
+        return frames
+
+    def encode(self, t_ms: np.ndarray, x: np.ndarray, y: np.ndarray, flags: Optional[np.ndarray] = None,
+               eye: Optional[np.ndarray] = None) -> List[Union[bytes, Dict[str, Any]]]:
+        """
+        Encode frames.
+
+        Returns:
+            Binary batch messages (split every MAX_BATCH_FRAMES frames), or one JSON-compat message
+        """
+        if not self.binary:
+            return [{
+                "type": "gaze",
+                "frames": [[int(t), round(float(px), 1), round(float(py), 1)] for t, px, py in zip(t_ms, x, y)],
+            }]
+        frames = self.records(t_ms, x, y, flags, eye)
+        return [encode_batch(frames[i:i + MAX_BATCH_FRAMES]) for i in range(0, len(frames), MAX_BATCH_FRAMES)]
+
+
+def frames_to_json(frames: np.ndarray, base_time: float) -> str:
+    """JSON-compat encoding of decoded records (absolute timestamps)."""
+    return json.dumps({
+        "type": "gaze",
+        "frames": [
+            [int(base_time + t), round(float(x), 1), round(float(y), 1)]
+            for t, x, y in zip(frames["t"].tolist(), frames["x"].tolist(), frames["y"].tolist())
+        ],
+    })
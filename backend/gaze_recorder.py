@@ -0,0 +1,459 @@
+"""
+Gaze recording to memory-mapped ring segment files, and replay.
+
+While a communication session is recorded, every raw sample read from the
+tracker socket is appended to a segment file of fixed-size records
+(RECORD_DTYPE, a NumPy structured dtype) through a memory map, so a sample
+costs a single record copy. A segment holds a fixed number of records: when it
+is full, the recorder rotates to a new one, and the oldest segments are deleted
+beyond max_segments (a ring of files bounding disk usage).
+
+The gaze_recording_spans table indexes which record range of which segment
+belongs to which CommunicationSession. A recording can be exported as a NumPy
+array or replayed over a WebSocket at real-time or accelerated speed, either in
+the tracker's JSON protocol (point GAZE_TRACKER_URL at the replay endpoint to
+load-test the gaze pipeline) or in the binary gaze protocol.
+
+Segment file layout: a 64-byte header (magic b"GZRS", version u16, record size
+u16, capacity u64, record count u64, little-endian), then capacity records.
+"""
+import io
+import os
+import re
+import json
+import mmap
+import time
+import struct
+import asyncio
+import threading
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Tuple, Callable, Awaitable
+
+import numpy as np
+from sqlmodel import Session, select, delete
+
+from models import GazeRecordingSpan
+from gaze_protocol import GazeFrameEncoder, FLAG_LEFT_VALID, FLAG_RIGHT_VALID
+
+
+RECORD_DTYPE = np.dtype({
+    "names": ["t", "x", "y", "screen_width", "screen_height", "session_id", "flags", "eye"],
+    "formats": ["<f8", "<f4", "<f4", "<f4", "<f4", "<u4", "u1", "u1"],
+    "offsets": [0, 8, 12, 16, 20, 24, 28, 29],
+    "itemsize": 32,
+})
+
+SEGMENT_MAGIC = b"GZRS"
+SEGMENT_VERSION = 1
+SEGMENT_HEADER = struct.Struct("<4sHHQQ")
+SEGMENT_HEADER_SIZE = 64
+SEGMENT_NAME = re.compile(r"^gaze_(\d{8})\.seg$")
+
+
+def segment_path(directory: Path, segment: int) -> Path:
+    """Path of a segment file."""
+    return directory / f"gaze_{segment:08d}.seg"
+
+
+class GazeSegment:
+    """A memory-mapped segment file of gaze records"""
+
+    def __init__(self, path: Path, capacity: int = 0, create: bool = False):
+        """
+        Open a segment file.
+
+        Args:
+            path: Segment file path
+            capacity: Number of records (when creating)
+            create: Create the file (otherwise open an existing one read-only)
+        """
+        self.path = path
+        self.writable = create
+        self._sync_lock = threading.Lock()  # Serializes msync with unmapping
+        if create:
+            with open(path, "wb") as f:
+                f.truncate(SEGMENT_HEADER_SIZE + capacity * RECORD_DTYPE.itemsize)
+            self._file = open(path, "r+b")
+            self._map = mmap.mmap(self._file.fileno(), 0)
+            self.capacity = capacity
+            self.count = 0
+            self._write_header()
+        else:
+            self._file = open(path, "rb")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, record_size, self.capacity, self.count = SEGMENT_HEADER.unpack_from(self._map)
+            if magic != SEGMENT_MAGIC or version != SEGMENT_VERSION or record_size != RECORD_DTYPE.itemsize:
+                self.close()
+                raise ValueError(f"Not a gaze segment file: {path}")
+        self.records = np.ndarray(
+            (self.capacity,), dtype=RECORD_DTYPE, buffer=self._map, offset=SEGMENT_HEADER_SIZE
+        )
+
+    def _write_header(self) -> None:
+        SEGMENT_HEADER.pack_into(
+            self._map, 0, SEGMENT_MAGIC, SEGMENT_VERSION, RECORD_DTYPE.itemsize, self.capacity, self.count
+        )
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+    def append(self, record: Tuple) -> int:
+        """Write a record, returning its index."""
+        index = self.count
+        self.records[index] = record
+        self.count += 1
+        return index
+
+    def flush(self, sync: bool = True) -> None:
+        """Write the record count to the header and (if sync) flush the map to disk."""
+        if self.writable:
+            self._write_header()
+            if sync:
+                self.sync()
+
+    def sync(self) -> None:
+        """Flush the map to disk (no-op once closed); safe without the recorder lock."""
+        with self._sync_lock:
+            if self.writable and self._map is not None:
+                self._map.flush()
+
+    def close(self) -> None:
+        """Flush and unmap the file."""
+        with self._sync_lock:
+            if self._map is not None:
+                if self.writable:
+                    self._write_header()
+                    self._map.flush()
+                self.records = None
+                self._map.close()
+                self._file.close()
+                self._map = None
+
+
+class GazeRecorder:
+    """Appends raw tracker samples of the recorded session to ring segment files"""
+
+    def __init__(self, engine, directory: str = "./gaze_recordings", segment_records: int = 262144,
+                 max_segments: int = 16, flush_interval: float = 1.0):
+        """
+        Args:
+            engine: SQLAlchemy engine of the application database (span index)
+            directory: Directory of the segment files
+            segment_records: Records per segment file (32 bytes each; 262144 is about 36 min at 120 Hz)
+            max_segments: Segment files kept (the oldest are deleted with their spans)
+            flush_interval: Interval (seconds) between header flushes and span index writes
+        """
+        self.engine = engine
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_records = segment_records
+        self.max_segments = max_segments
+        self.flush_interval = flush_interval
+
+        existing = self.list_segments()
+        self._next_segment = existing[-1] + 1 if existing else 1
+        self._segment: Optional[GazeSegment] = None
+        self._segment_number = 0
+        self.session_id: Optional[int] = None
+        self._span: Optional[Dict[str, Any]] = None
+        self._closed_spans: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self.stats = {"recorded": 0, "segments_created": 0, "segments_deleted": 0, "spans": 0}
+
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._flush_loop, name="gaze-recorder", daemon=True)
+        self._thread.start()
+
+    def list_segments(self) -> List[int]:
+        """Sequence numbers of the segment files on disk, oldest first."""
+        numbers = []
+        for path in self.directory.iterdir():
+            match = SEGMENT_NAME.match(path.name)
+            if match:
+                numbers.append(int(match.group(1)))
+        return sorted(numbers)
+
+    @property
+    def recording(self) -> bool:
+        return self.session_id is not None
+
+    def start(self, session_id: int) -> None:
+        """Start recording the samples of a session (ends the current recording)."""
+        with self._lock:
+            self._close_span()
+            self.session_id = session_id
+        print(f"Gaze Recorder: Recording session {session_id}")
+
+    def stop(self) -> Optional[int]:
+        """Stop recording, returning the recorded session id."""
+        with self._lock:
+            session_id = self.session_id
+            self._close_span()
+            self.session_id = None
+            segment = self._segment
+            if segment is not None:
+                segment.flush(sync=False)
+        if segment is not None:
+            segment.sync()
+        self._persist_spans()
+        if session_id is not None:
+            print(f"Gaze Recorder: Stopped recording session {session_id}")
+        return session_id
+
+    def push(self, sample: Tuple[float, ...]) -> None:
+        """Record a raw tracker sample (gaze pipeline listener interface)."""
+        t, x, y, screen_width, screen_height, flags, eye = sample
+        with self._lock:
+            if self.session_id is None:
+                return
+            if self._segment is None or self._segment.full:
+                self._rotate()
+            index = self._segment.append(
+                (t, x, y, screen_width, screen_height, self.session_id, flags, eye)
+            )
+            if self._span is None:
+                self._span = {
+                    "session_id": self.session_id, "segment": self._segment_number,
+                    "start_index": index, "start_time": t,
+                }
+            self._span["end_index"] = index + 1
+            self._span["end_time"] = t
+            self.stats["recorded"] += 1
+
+    def _rotate(self) -> None:
+        """Close the full segment and start a new one (caller holds the lock)."""
+        self._close_span()
+        if self._segment is not None:
+            self._segment.close()
+        self._segment_number = self._next_segment
+        self._next_segment += 1
+        self._segment = GazeSegment(
+            segment_path(self.directory, self._segment_number), self.segment_records, create=True
+        )
+        self.stats["segments_created"] += 1
+
+    def _close_span(self) -> None:
+        """Queue the open span for the index (caller holds the lock)."""
+        if self._span is not None:
+            self._closed_spans.append(self._span)
+            self._span = None
+
+    def _persist_spans(self) -> None:
+        """Write the closed spans to the index."""
+        with self._lock:
+            spans, self._closed_spans = self._closed_spans, []
+        if not spans:
+            return
+        try:
+            with Session(self.engine) as session:
+                for span in spans:
+                    session.add(GazeRecordingSpan(**span))
+                session.commit()
+            self.stats["spans"] += len(spans)
+        except Exception as e:
+            print(f"Gaze Recorder: Error writing recording index: {e}")
+            with self._lock:
+                self._closed_spans = spans + self._closed_spans
+
+    def _trim(self) -> None:
+        """Delete the oldest segments beyond max_segments, with their spans."""
+        segments = self.list_segments()
+        for segment in segments[:max(len(segments) - self.max_segments, 0)]:
+            if segment == self._segment_number:
+                continue
+            try:
+                segment_path(self.directory, segment).unlink()
+                with Session(self.engine) as session:
+                    session.exec(delete(GazeRecordingSpan).where(GazeRecordingSpan.segment == segment))
+                    session.commit()
+                self.stats["segments_deleted"] += 1
+                print(f"Gaze Recorder: Deleted oldest segment {segment}")
+            except Exception as e:
+                print(f"Gaze Recorder: Error deleting segment {segment}: {e}")
+
+    def flush(self) -> None:
+        """Flush the active segment, write closed spans and trim the ring."""
+        with self._lock:
+            segment = self._segment
+            if segment is not None:
+                segment.flush(sync=False)
+        # msync outside the lock so push() is not held up by the disk
+        if segment is not None:
+            segment.sync()
+        self._persist_spans()
+        self._trim()
+
+    def _flush_loop(self) -> None:
+        """Periodically flush (runs in a background thread)."""
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
+
+    def read_session(self, session_id: int) -> np.ndarray:
+        """
+        Read the recorded samples of a session.
+
+        Returns:
+            RECORD_DTYPE array in recording order (empty if nothing was recorded)
+        """
+        with Session(self.engine) as session:
+            spans = [
+                (span.segment, span.start_index, span.end_index)
+                for span in session.exec(
+                    select(GazeRecordingSpan)
+                    .where(GazeRecordingSpan.session_id == session_id)
+                    .order_by(GazeRecordingSpan.segment, GazeRecordingSpan.start_index)
+                )
+            ]
+        with self._lock:
+            # Spans not written to the index yet
+            pending = self._closed_spans + ([self._span] if self._span is not None else [])
+            spans += [
+                (span["segment"], span["start_index"], span["end_index"])
+                for span in pending if span["session_id"] == session_id
+            ]
+            if self._segment is not None:
+                # The header count is enough for readers (they share the page cache)
+                self._segment.flush(sync=False)
+
+        parts = []
+        for segment, start, end in sorted(set(spans)):
+            try:
+                reader = GazeSegment(segment_path(self.directory, segment))
+            except (FileNotFoundError, ValueError):
+                continue  # Deleted (or being deleted) by the ring
+            try:
+                parts.append(np.array(reader.records[start:min(end, reader.count)]))
+            finally:
+                reader.close()
+        return np.concatenate(parts) if parts else np.empty(0, dtype=RECORD_DTYPE)
+
+    def export_session(self, session_id: int) -> bytes:
+        """Recorded samples of a session as a NumPy .npy file (structured RECORD_DTYPE array)."""
+        buffer = io.BytesIO()
+        np.save(buffer, self.read_session(session_id))
+        return buffer.getvalue()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get recording statistics."""
+        with self._lock:
+            segment_count = self._segment.count if self._segment is not None else 0
+        return {
+            **self.stats,
+            "recording_session_id": self.session_id,
+            "directory": str(self.directory),
+            "segment": self._segment_number or None,
+            "segment_records": segment_count,
+            "segment_capacity": self.segment_records,
+            "segments_on_disk": len(self.list_segments()),
+            "max_segments": self.max_segments,
+        }
+
+    def close(self) -> None:
+        """Stop recording, flush and close the active segment."""
+        self.stop()
+        self._stopped.set()
+        self._thread.join(timeout=5)
+        with self._lock:
+            if self._segment is not None:
+                self._segment.close()
+                self._segment = None
+        self._persist_spans()
+
+
+def tracker_message(record) -> str:
+    """Tracker JSON message of a recorded sample (same fields as the tracker app)."""
+    flags = int(record["flags"])
+    return json.dumps({
+        "pixelX": float(record["x"]),
+        "pixelY": float(record["y"]),
+        "screenWidth": float(record["screen_width"]),
+        "screenHeight": float(record["screen_height"]),
+        "timestamp": float(record["t"]),
+        "leftValid": bool(flags & FLAG_LEFT_VALID),
+        "rightValid": bool(flags & FLAG_RIGHT_VALID),
+    })
+
+
+async def replay(records: np.ndarray, send_text: Callable[[str], Awaitable[None]],
+                 send_bytes: Callable[[bytes], Awaitable[None]], speed: float = 1.0,
+                 message_format: str = "tracker", max_batch: int = 1000) -> int:
+    """
+    Stream recorded samples with their original timing.
+
+    Args:
+        records: RECORD_DTYPE samples
+        send_text: Coroutine function sending a text message
+        send_bytes: Coroutine function sending a binary message
+        speed: Playback speed (1.0 real time, 10.0 ten times faster, 0 as fast as possible)
+        message_format: "tracker" (one tracker JSON message per sample), "json" (JSON-compat batches)
+            or "binary" (binary gaze protocol)
+        max_batch: Maximum samples per batch message (samples due at the same time are batched)
+
+    Returns:
+        Number of samples sent
+    """
+    if len(records) == 0:
+        return 0
+    t = records["t"]
+    encoder = None
+    if message_format != "tracker":
+        encoder = GazeFrameEncoder(binary=message_format == "binary", window_coordinates=False)
+        if encoder.binary:
+            await send_bytes(encoder.header(
+                float(t[0]), float(records["screen_width"][0]), float(records["screen_height"][0])
+            ))
+
+    start = time.perf_counter()
+    index = 0
+    while index < len(records):
+        if speed > 0:
+            due = t[0] + (time.perf_counter() - start) * 1000 * speed
+            end = max(int(np.searchsorted(t, due, side="right")), index + 1)
+        else:
+            end = index + max_batch
+        end = min(end, index + max_batch, len(records))
+        batch = records[index:end]
+        if encoder is None:
+            for record in batch:
+                await send_text(tracker_message(record))
+        else:
+            for message in encoder.encode(batch["t"], batch["x"], batch["y"], batch["flags"], batch["eye"]):
+                if isinstance(message, bytes):
+                    await send_bytes(message)
+                else:
+                    await send_text(json.dumps(message))
+        index = end
+
+        if index < len(records):
+            wait = (t[index] - t[0]) / 1000 / speed - (time.perf_counter() - start) if speed > 0 else 0
+            await asyncio.sleep(max(wait, 0))
+    return len(records)
+
+
+# Global gaze recorder
+_gaze_recorder: Optional[GazeRecorder] = None
+_gaze_recorder_lock = threading.Lock()
+
+
+def get_gaze_recorder(engine) -> GazeRecorder:
+    """Get or create the global gaze recorder"""
+    global _gaze_recorder
+    with _gaze_recorder_lock:
+        if _gaze_recorder is None:
+            _gaze_recorder = GazeRecorder(
+                engine,
+                directory=os.getenv("GAZE_RECORDING_DIR", "./gaze_recordings"),
+                segment_records=int(os.getenv("GAZE_RECORDING_SEGMENT_RECORDS", "262144")),
+                max_segments=int(os.getenv("GAZE_RECORDING_MAX_SEGMENTS", "16")),
+            )
+        return _gaze_recorder
+
+
+def close_gaze_recorder() -> None:
+    """Stop recording and close the global gaze recorder"""
+    global _gaze_recorder
+    with _gaze_recorder_lock:
+        if _gaze_recorder is not None:
+            _gaze_recorder.close()
+            _gaze_recorder = None
@@ -0,0 +1,436 @@
+"""
+Local word predictor for the keyboard page.
+
+A prefix trie (each node keeps its most frequent completions) combined with
+a trigram model (stupid backoff to bigrams and unigrams) predicts the next
+word or completes the current one without calling the LLM. The model is
+trained from the communication history (session_steps.message_content and
+selected_choice_text) and a bundled lexicon per TTS language
+(lexicons/<language>.txt, most frequent words first).
+"""
+import re
+import time
+import heapq
+import threading
+from itertools import islice
+from pathlib import Path
+from collections import Counter, defaultdict
+from typing import Optional, List, Dict, Tuple, Iterable, Callable
+
+from sqlmodel import Session, select
+
+
+LEXICON_DIR = Path(__file__).parent / "lexicons"
+
+# Words, including French elisions and hyphenated words (c'est, aujourd'hui, peut-être)
+_WORD = re.compile(r"\w+(?:['’-]\w+)*")
+
+# Stupid backoff factor applied when falling back to a shorter context
+BACKOFF = 0.4
+
+# Weight of the user's own selections relative to the global model when ranking
+PERSONAL_WEIGHT = 2.0
+
+# Most frequent candidates of a letter index scanned per lookup in the multiple-letters mode
+# (bounds the latency; rarer words matching only rare letter sequences are not offered)
+LETTER_SCAN_LIMIT = 128
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase words."""
+    return [word.replace("’", "'") for word in _WORD.findall(text.lower())]
+
+
+def is_subsequence(letters: List[str], word: str) -> bool:
+    """Whether the letters appear in the word in order (not necessarily adjacent)."""
+    position = 0
+    for letter in letters:
+        position = word.find(letter, position)
+        if position < 0:
+            return False
+        position += len(letter)
+    return True
+
+
+class _TrieNode:
+    """Trie node with the most frequent words below it"""
+    __slots__ = ("children", "word", "top")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.word: Optional[str] = None  # Set if a word ends here
+        self.top: List[Tuple[float, str]] = []  # (count, word), most frequent first
+
+
+class PrefixTrie:
+    """Prefix trie answering top-k completions in O(len(prefix))"""
+
+    def __init__(self, top_k: int = 32):
+        """
+        Args:
+            top_k: Number of completions kept at each node
+        """
+        self.top_k = top_k
+        self.root = _TrieNode()
+
+    def build(self, counts: Dict[str, float]) -> None:
+        """Rebuild the trie from word counts."""
+        root = _TrieNode()
+        for word in counts:
+            node = root
+            for char in word:
+                node = node.children.setdefault(char, _TrieNode())
+            node.word = word
+        self._fill_top(root, counts)
+        self.root = root
+
+    def _fill_top(self, node: _TrieNode, counts: Dict[str, float]) -> List[Tuple[float, str]]:
+        """Compute the top completions of a subtree (post-order)."""
+        candidates = [(counts[node.word], node.word)] if node.word is not None else []
+        for child in node.children.values():
+            candidates.extend(self._fill_top(child, counts))
+        node.top = heapq.nlargest(self.top_k, candidates)
+        return node.top
+
+    def find(self, prefix: str) -> Optional[_TrieNode]:
+        """Node of a prefix, or None if no word starts with it."""
+        node = self.root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+
+    def complete(self, prefix: str) -> List[str]:
+        """Most frequent words starting with a prefix."""
+        node = self.find(prefix)
+        return [word for _, word in node.top] if node is not None else []
+
+    def iter_words(self, node: Optional[_TrieNode] = None) -> Iterable[str]:
+        """All words below a node."""
+        stack = [node or self.root]
+        while stack:
+            node = stack.pop()
+            if node.word is not None:
+                yield node.word
+            stack.extend(node.children.values())
+
+
+class KeyboardPredictor:
+    """Trigram + prefix trie word predictor"""
+
+    def __init__(self, language: str, top_k: int = 32):
+        """
+        Args:
+            language: Language of the lexicon (tts_language)
+            top_k: Number of completions kept at each trie node
+        """
+        self.language = language
+        self.unigrams: Counter = Counter()
+        self.bigrams: Dict[str, Counter] = defaultdict(Counter)
+        self.trigrams: Dict[Tuple[str, str], Counter] = defaultdict(Counter)
+        # Number of words seen after each context
+        self.bigram_totals: Counter = Counter()
+        self.trigram_totals: Counter = Counter()
+        self.total = 0.0
+        self.trie = PrefixTrie(top_k)
+        # Letter indexes of the multiple-letters mode (words most frequent first)
+        self.words_starting: Dict[str, List[str]] = {}  # first letter -> words
+        self.words_containing: Dict[str, List[str]] = {}  # letter -> words containing it
+        self.words_ordered: Dict[str, List[str]] = {}  # letter pair "ab" -> words with an a before a b
+        self.trained_at: Optional[float] = None
+        self.stats = {"predictions": 0, "total_us": 0.0, "max_us": 0.0}
+        self._stats_lock = threading.Lock()
+
+    def add_lexicon(self, path: Path, weight: float = 100.0) -> int:
+        """
+        Add a frequency-ordered lexicon (one word per line, '#' comments).
+
+        The word of rank r gets a pseudo-count of weight / r.
+
+        Returns:
+            Number of words added
+        """
+        rank = 0
+        for line in path.read_text(encoding="utf-8").splitlines():
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            rank += 1
+            for word in tokenize(line):
+                count = weight / rank
+                if count > self.unigrams[word]:
+                    self.total += count - self.unigrams[word]
+                    self.unigrams[word] = count
+        return rank
+
+    def add_text(self, text: str, weight: float = 1.0) -> None:
+        """Count the words and word sequences of a text."""
+        words = tokenize(text)
+        for i, word in enumerate(words):
+            self.unigrams[word] += weight
+            self.total += weight
+            if i >= 1:
+                self.bigrams[words[i - 1]][word] += weight
+                self.bigram_totals[words[i - 1]] += weight
+            if i >= 2:
+                self.trigrams[(words[i - 2], words[i - 1])][word] += weight
+                self.trigram_totals[(words[i - 2], words[i - 1])] += weight
+
+    def finalize(self) -> None:
+        """Build the prefix trie and the letter indexes once all texts are added."""
+        self.trie.build(self.unigrams)
+        words_starting = defaultdict(list)
+        words_containing = defaultdict(list)
+        words_ordered = defaultdict(list)
+        for word in sorted(self.unigrams, key=self.unigrams.__getitem__, reverse=True):
+            words_starting[word[0]].append(word)
+            for letter in set(word):
+                words_containing[letter].append(word)
+            for pair in {a + b for i, a in enumerate(word) for b in word[i + 1:]}:
+                words_ordered[pair].append(word)
+        self.words_starting = dict(words_starting)
+        self.words_containing = dict(words_containing)
+        self.words_ordered = dict(words_ordered)
+        self.trained_at = time.time()
+
+    def score(self, word: str, context: List[str]) -> float:
+        """Stupid backoff score of a word after a context."""
+        if len(context) >= 2:
+            key = (context[-2], context[-1])
+            following = self.trigrams.get(key)
+            if following and following[word]:
+                return following[word] / self.trigram_totals[key]
+        if context:
+            following = self.bigrams.get(context[-1])
+            if following and following[word]:
+                return BACKOFF * following[word] / self.bigram_totals[context[-1]]
+        return BACKOFF * BACKOFF * self.unigrams[word] / self.total if self.total else 0.0
+
+    def _next_words(self, context: List[str]) -> Counter:
+        """Words seen after the context (trigram, then bigram)."""
+        following = Counter()
+        if len(context) >= 2:
+            following.update(self.trigrams.get((context[-2], context[-1]), {}))
+        if context:
+            following.update(self.bigrams.get(context[-1], {}))
+        return following
+
+    def predict(self, text: str, limit: int = 5, multiple_letters: bool = False, user_model=None) -> List[str]:
+        """
+        Predict words for the current keyboard text.
+
+        - Text ending with a space (or empty): the next word, from the n-gram context.
+        - Text ending with a partial word: completions of that prefix ranked by
+          context, and words following it if it is already a complete word.
+        - Multiple single letters ("b o n"): words containing the letters in order,
+          words starting with the first letter first.
+
+        Args:
+            text: Current keyboard text
+            limit: Maximum number of words
+            multiple_letters: Text is a set of single letters (is_multiple_letters)
+            user_model: PersonalLanguageModel of the user, to personalize the ranking (optional)
+
+        Returns:
+            Predicted words, most probable first
+        """
+        start = time.perf_counter()
+        words = tokenize(text)
+
+        if multiple_letters:
+            predictions = self._predict_from_letters(words, limit, user_model)
+        else:
+            ends_word = bool(text) and not text[-1].isspace() and bool(words)
+            prefix = words[-1] if ends_word else ""
+            context = words[:-1] if ends_word else words
+            predictions = self._predict_completion(prefix, context, limit, user_model)
+
+        elapsed_us = (time.perf_counter() - start) * 1e6
+        with self._stats_lock:
+            self.stats["predictions"] += 1
+            self.stats["total_us"] += elapsed_us
+            self.stats["max_us"] = max(self.stats["max_us"], elapsed_us)
+        return predictions
+
+    def _predict_completion(self, prefix: str, context: List[str], limit: int, user_model=None) -> List[str]:
+        """Complete a prefix (or predict the next word if empty) given the preceding words."""
+        candidates = set(self.trie.complete(prefix))
+        candidates.update(word for word in self._next_words(context) if word.startswith(prefix))
+        if user_model is not None:
+            candidates.update(user_model.complete(prefix))
+            candidates.update(word for word in user_model.next_words(context) if word.startswith(prefix))
+        candidates.discard(prefix)
+
+        ranked = sorted(candidates, key=lambda word: self._rank_score(word, context, user_model), reverse=True)
+
+        # The prefix is a complete word: also offer the words that usually follow it
+        if prefix and (prefix in self.unigrams or (user_model is not None and prefix in user_model.unigrams)):
+            following = self._next_words(context + [prefix])
+            if user_model is not None:
+                following.update(user_model.next_words([prefix]))
+            ranked = sorted(following, key=lambda word: self._rank_score(word, context + [prefix], user_model),
+                            reverse=True)[:limit] + ranked
+
+        # Few completions (the keyboard has no key for some letters): match the letters in order
+        if len(ranked) < limit and len(prefix) > 1:
+            ranked += self._predict_from_letters(list(prefix), limit, user_model)
+
+        return _unique(ranked, exclude=prefix)[:limit]
+
+    def _rank_score(self, word: str, context: List[str], user_model=None) -> float:
+        """Global score, plus the user's own score when personalized."""
+        score = self.score(word, context)
+        if user_model is not None:
+            score += PERSONAL_WEIGHT * user_model.score(word, context)
+        return score
+
+    def _letter_candidates(self, letters: List[str], *indexes: List[str]) -> List[str]:
+        """Smallest index list holding every word that contains the letters in order (most frequent first)."""
+        if len(letters) == 1:
+            indexes += (self.words_containing.get(letters[0][:1], []),)
+        for previous, letter in zip(letters, letters[1:]):
+            indexes += (self.words_ordered.get(previous[:1] + letter[:1], []),)
+        return min(indexes, key=len)
+
+    def _predict_from_letters(self, letters: List[str], limit: int, user_model=None) -> List[str]:
+        """
+        Words containing the letters in order, words starting with the first letter first.
+
+        Candidates are scanned most frequent first from the smallest letter index that
+        holds every match, stopping after `limit` matches (or LETTER_SCAN_LIMIT candidates)
+        instead of scanning the whole vocabulary. The user's words are always candidates (their personal score can
+        outrank more frequent words).
+        """
+        if not letters:
+            return []
+
+        def frequency(word: str) -> float:
+            return self._rank_score(word, [], user_model)
+
+        def first_matches(candidates: List[str], count: int, accept: Callable[[str], bool]) -> List[str]:
+            scanned = (word for word in islice(candidates, LETTER_SCAN_LIMIT) if accept(word))
+            return list(islice((word for word in scanned if is_subsequence(letters, word)), count))
+
+        # Words starting with all the letters (contiguous) rank above the others
+        first = letters[0]
+        joined = "".join(letters)
+        candidates = self._letter_candidates(letters, self.words_starting.get(first[:1], []))
+        if limit <= self.trie.top_k:
+            starting = set(self.trie.complete(joined))
+        else:
+            starting = set(first_matches(candidates, limit, lambda word: word.startswith(joined)))
+        starting.update(first_matches(
+            candidates, limit, lambda word: word.startswith(first) and not word.startswith(joined)
+        ))
+        if user_model is not None:
+            starting.update(word for word in user_model.complete(first, limit=len(user_model.unigrams))
+                            if is_subsequence(letters, word))
+        ranked = heapq.nlargest(limit, starting, key=lambda word: (word.startswith(joined), frequency(word)))
+
+        if len(ranked) < limit:
+            candidates = self._letter_candidates(letters)
+            others = set(first_matches(candidates, limit - len(ranked), lambda word: not word.startswith(first)))
+            if user_model is not None:
+                others.update(word for word in user_model.unigrams
+                              if word in self.unigrams and not word.startswith(first) and is_subsequence(letters, word))
+            ranked += heapq.nlargest(limit - len(ranked), others, key=frequency)
+        return ranked
+
+    def get_stats(self) -> Dict[str, object]:
+        """Get model size and prediction latency statistics."""
+        with self._stats_lock:
+            predictions = self.stats["predictions"]
+            return {
+                "language": self.language,
+                "words": len(self.unigrams),
+                "bigram_contexts": len(self.bigrams),
+                "trigram_contexts": len(self.trigrams),
+                "trained_at": self.trained_at,
+                "predictions": predictions,
+                "avg_us": self.stats["total_us"] / predictions if predictions else 0.0,
+                "max_us": self.stats["max_us"],
+            }
+
+
+def _unique(words: List[str], exclude: str = "") -> List[str]:
+    """Remove duplicates (keeping the first occurrence) and the excluded word."""
+    seen = {exclude}
+    return [word for word in words if not (word in seen or seen.add(word))]
+
+
+def train_keyboard_predictor(language: str, engine, history_weight: float = 5.0) -> KeyboardPredictor:
+    """
+    Train a predictor from the lexicon of a language and the communication history.
+
+    Args:
+        language: TTS language code (selects lexicons/<language>.txt if present)
+        engine: SQLAlchemy engine of the application database
+        history_weight: Count of a word occurrence in the history, relative to the lexicon
+
+    Returns:
+        The trained predictor
+    """
+    from models import SessionStep
+
+    start = time.perf_counter()
+    predictor = KeyboardPredictor(language)
+
+    lexicon_path = LEXICON_DIR / f"{language}.txt"
+    lexicon_words = predictor.add_lexicon(lexicon_path) if lexicon_path.exists() else 0
+
+    texts = 0
+    with Session(engine) as session:
+        rows = session.exec(select(SessionStep.message_content, SessionStep.selected_choice_text))
+        for message_content, selected_choice_text in rows:
+            for text in (message_content, selected_choice_text):
+                if text:
+                    predictor.add_text(text, history_weight)
+                    texts += 1
+
+    predictor.finalize()
+    print(f"Keyboard predictor ({language}): {lexicon_words} lexicon words, {texts} history texts, "
+          f"{len(predictor.unigrams)} words in {(time.perf_counter() - start) * 1000:.0f} ms")
+    return predictor
+
+
+# Trained predictors per language
+_keyboard_predictors: Dict[str, KeyboardPredictor] = {}
+_training: set = set()
+_keyboard_predictors_lock = threading.Lock()
+
+
+def get_keyboard_predictor(language: str, engine) -> Optional[KeyboardPredictor]:
+    """
+    Get the predictor of a language, or None while it is being trained.
+
+    The first call for a language starts training in a background thread.
+    """
+    with _keyboard_predictors_lock:
+        predictor = _keyboard_predictors.get(language)
+        if predictor is None and language not in _training:
+            _training.add(language)
+            threading.Thread(
+                target=_train_in_background, args=(language, engine),
+                name=f"keyboard-predictor-{language}", daemon=True
+            ).start()
+        return predictor
+
+
+def retrain_keyboard_predictor(language: str, engine) -> KeyboardPredictor:
+    """Retrain the predictor of a language and replace the current one."""
+    predictor = train_keyboard_predictor(language, engine)
+    with _keyboard_predictors_lock:
+        _keyboard_predictors[language] = predictor
+    return predictor
+
+
+def _train_in_background(language: str, engine) -> None:
+    """Train a predictor for a language (background thread)."""
+    try:
+        retrain_keyboard_predictor(language, engine)
+    except Exception as e:
+        print(f"Error training keyboard predictor ({language}): {e}")
+    finally:
+        with _keyboard_predictors_lock:
+            _training.discard(language)
@@ -3,7 +3,10 @@ LLM module for generating communication choices using LangChain.
 Supports OpenAI and Anthropic providers with structured output.
 """
 import os
-from typing import List, Optional, Dict, Any
+import time
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Dict, Any, AsyncIterator, Tuple
 from pydantic import BaseModel, Field
 from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
@@ -11,6 +14,9 @@ from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from dotenv import load_dotenv
 
+from llm_cache import get_llm_cache
+from llm_hedge import get_hedge_policy, HedgePolicy, timed_call, get_latency_stats
+
 load_dotenv()
 
 
@@ -33,6 +39,20 @@ class ChoicesOutput(BaseModel):
     )
 
 
+# Choices offered when the LLM fails
+FALLBACK_CHOICES = [
+    {"text": "Yes", "probability": 0.5},
+    {"text": "No", "probability": 0.5},
+    {"text": "More", "probability": 0.3},
+    {"text": "Done", "probability": 0.2}
+]
+
+
+def rank_choices(choices: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Sort choices by probability (highest first)"""
+    return sorted(choices, key=lambda x: x["probability"], reverse=True)
+
+
 class LLMService:
     """Service for generating communication choices using LLM"""
     
@@ -48,7 +68,30 @@ class LLMService:
         self.provider = provider.lower()
         self.model = model
         self.temperature = temperature
+        self.llm_builds = 0
+        self.runnable_builds = 0
+        self.requests = 0
+        self._build()
+    
+    def _build(self):
+        """Create the LLM client and its structured-output runnables"""
         self.llm = self._create_llm()
+        self.llm_builds += 1
+        # Built once and reused by every request
+        self.structured_llm = self.llm.with_structured_output(ChoicesOutput)
+        # A dict schema streams partial JSON (a Pydantic schema only yields once fully validated)
+        self.streaming_llm = self.llm.with_structured_output(ChoicesOutput.model_json_schema())
+        self.runnable_builds += 2
+    
+    @property
+    def cache_namespace(self) -> str:
+        """Part of the response cache key identifying this configuration"""
+        return f"{self.provider}:{self.model}:{self.temperature}"
+    
+    @property
+    def latency_key(self) -> str:
+        """Latency histogram key of this provider and model"""
+        return f"{self.provider}:{self.model or 'default'}"
     
     def _create_llm(self):
         """Create the appropriate LLM instance based on provider"""
@@ -79,27 +122,15 @@ class LLMService:
         else:
             raise ValueError(f"Unsupported provider: {self.provider}. Supported: 'openai', 'anthropic'")
     
-    async def generate_choices(
+    def _build_messages(
         self,
         system_prompt: str,
         conversation_history: List[Dict[str, str]],
         user_notes: Optional[str] = None,
         caregiver_description: Optional[str] = None,
         current_text: Optional[str] = None
-    ) -> List[Dict[str, Any]]:
-        """
-        Generate communication choices based on context.
-        
-        Args:
-            system_prompt: System prompt from config
-            conversation_history: List of messages in format [{"role": "user"/"assistant", "content": "..."}]
-            user_notes: Notes about the user from user profile
-            caregiver_description: Description of the caregiver
-            current_text: Current text being composed by the user
-        
-        Returns:
-            List of choices with text and probability, sorted by probability (highest first)
-        """
+    ) -> list:
+        """Build the LLM messages (system prompt with context, then conversation history)"""
         # Build context string
         context_parts = []
         
@@ -139,12 +170,80 @@ class LLMService:
             elif role == "assistant" or role == "ai":
                 messages.append(AIMessage(content=content))
         
-        # Use structured output
-        structured_llm = self.llm.with_structured_output(ChoicesOutput)
+        return messages
+    
+    async def _ainvoke_choices(self, messages: list) -> ChoicesOutput:
+        """Invoke the structured-output runnable, recording the provider latency (raises if invalid)"""
+        async def call() -> ChoicesOutput:
+            result = await self.structured_llm.ainvoke(messages)
+            if not isinstance(result, ChoicesOutput):
+                raise ValueError(f"Invalid structured output from {self.provider}: {result!r}")
+            return result
         
+        return await timed_call(self.latency_key, call)
+    
+    def _hedge_partner(self, policy: HedgePolicy) -> Optional["LLMService"]:
+        """Service of the secondary provider (None if it is this one or cannot be created)"""
+        provider = policy.partner_provider(self.provider)
+        if provider == self.provider and policy.secondary_model == self.model:
+            return None
         try:
-            # Generate choices (use async invoke)
-            result = await structured_llm.ainvoke(messages)
+            return get_llm_service(provider=provider, model=policy.secondary_model, temperature=self.temperature)
+        except Exception as e:
+            print(f"LLM Hedge: Secondary provider {provider} unavailable: {e}")
+            return None
+    
+    async def _invoke_choices(self, messages: list) -> ChoicesOutput:
+        """Invoke the LLM, hedged with the secondary provider when LLM_HEDGE_ENABLED is set"""
+        policy = get_hedge_policy()
+        secondary = self._hedge_partner(policy) if policy is not None else None
+        if secondary is None:
+            return await self._ainvoke_choices(messages)
+        return await policy.race(
+            self.latency_key, lambda: self._ainvoke_choices(messages),
+            secondary.latency_key, lambda: secondary._ainvoke_choices(messages)
+        )
+    
+    async def generate_choices(
+        self,
+        system_prompt: str,
+        conversation_history: List[Dict[str, str]],
+        user_notes: Optional[str] = None,
+        caregiver_description: Optional[str] = None,
+        current_text: Optional[str] = None,
+        use_fallback: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Generate communication choices based on context.
+        
+        Args:
+            system_prompt: System prompt from config
+            conversation_history: List of messages in format [{"role": "user"/"assistant", "content": "..."}]
+            user_notes: Notes about the user from user profile
+            caregiver_description: Description of the caregiver
+            current_text: Current text being composed by the user
+            use_fallback: Return default choices if the LLM fails (otherwise raise)
+        
+        Returns:
+            List of choices with text and probability, sorted by probability (highest first)
+        """
+        messages = self._build_messages(
+            system_prompt, conversation_history, user_notes, caregiver_description, current_text
+        )
+        
+        cache = get_llm_cache()
+        if cache is not None:
+            cached = cache.get(self.cache_namespace, messages)
+            if cached is not None:
+                print(f"--> Cached Choices: {cached}")
+                return cached
+        
+        self.requests += 1
+        start = time.perf_counter()
+        
+        try:
+            # Generate choices (use async invoke, hedged across providers if enabled)
+            result = await self._invoke_choices(messages)
             
             # Convert to list of dicts with text and probability
             choices = [
@@ -156,44 +255,183 @@ class LLMService:
             ]
             
             # Sort by probability (highest first)
-            choices.sort(key=lambda x: x["probability"], reverse=True)
+            choices = rank_choices(choices)
             print(f"--> Generated Choices: {choices}")
+            if cache is not None:
+                cache.put(self.cache_namespace, messages, choices, (time.perf_counter() - start) * 1000)
             return choices
         
         except Exception as e:
             # Fallback to default choices if LLM fails
             print(f"Error generating choices with LLM: {e}")
-            return [
-                {"text": "Yes", "probability": 0.5},
-                {"text": "No", "probability": 0.5},
-                {"text": "More", "probability": 0.3},
-                {"text": "Done", "probability": 0.2}
-            ]
+            if not use_fallback:
+                raise
+            return [dict(choice) for choice in FALLBACK_CHOICES]
     
-    def update_config(self, provider: str, model: str, temperature: float):
-        """Update LLM configuration"""
-        self.provider = provider.lower()
-        self.model = model
-        self.temperature = temperature
-        self.llm = self._create_llm()
+    async def stream_choices(
+        self,
+        system_prompt: str,
+        conversation_history: List[Dict[str, str]],
+        user_notes: Optional[str] = None,
+        caregiver_description: Optional[str] = None,
+        current_text: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Generate communication choices, yielding each choice as soon as the LLM has finished writing it.
+        
+        The structured output is requested as a JSON schema so that partial
+        results can be parsed while streaming. A choice is complete once the
+        next one has started (or the stream has ended).
+        
+        Args:
+            Same as generate_choices
+        
+        Yields:
+            {"type": "choice", "index": i, "choice": {"text", "probability"}} in generation order,
+            then {"type": "choices", "choices": [...]} with the final set sorted by probability
+        """
+        messages = self._build_messages(
+            system_prompt, conversation_history, user_notes, caregiver_description, current_text
+        )
+        
+        cache = get_llm_cache()
+        if cache is not None:
+            cached = cache.get(self.cache_namespace, messages)
+            if cached is not None:
+                print(f"--> Cached Choices: {cached}")
+                for index, choice in enumerate(cached):
+                    yield {"type": "choice", "index": index, "choice": choice}
+                yield {"type": "choices", "choices": cached}
+                return
+        
+        self.requests += 1
+        start = time.perf_counter()
+        
+        emitted: List[Dict[str, Any]] = []
+        partial_choices: List[Any] = []
+        
+        def complete_choice(raw: Any) -> Optional[Dict[str, Any]]:
+            """Validate a finished partial choice"""
+            try:
+                choice = ChoiceWithProbability.model_validate(raw)
+            except Exception:
+                return None
+            return {"text": choice.text, "probability": choice.probability}
+        
+        try:
+            async for partial in self.streaming_llm.astream(messages):
+                if not isinstance(partial, dict):
+                    continue
+                partial_choices = partial.get("choices") or []
+                # Every choice but the last one being written is complete
+                while len(emitted) < len(partial_choices) - 1:
+                    choice = complete_choice(partial_choices[len(emitted)])
+                    if choice is None:
+                        break
+                    yield {"type": "choice", "index": len(emitted), "choice": choice}
+                    emitted.append(choice)
+            
+            # The stream has ended: the remaining choices are complete
+            for raw in partial_choices[len(emitted):]:
+                choice = complete_choice(raw)
+                if choice is not None:
+                    yield {"type": "choice", "index": len(emitted), "choice": choice}
+                    emitted.append(choice)
+            
+            if len(emitted) < 2:
+                raise ValueError(f"Expected at least 2 choices, got {len(emitted)}")
+            
+            choices = rank_choices(emitted[:8])
+            print(f"--> Streamed Choices: {choices}")
+            if cache is not None:
+                cache.put(self.cache_namespace, messages, choices, (time.perf_counter() - start) * 1000)
+        
+        except Exception as e:
+            # Fallback to default choices if LLM fails
+            print(f"Error streaming choices with LLM: {e}")
+            choices = emitted if len(emitted) >= 2 else [dict(choice) for choice in FALLBACK_CHOICES]
+            choices = rank_choices(choices)
+        
+        yield {"type": "choices", "choices": choices}
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get build and request counts"""
+        return {
+            "provider": self.provider,
+            "model": self.model,
+            "temperature": self.temperature,
+            "llm_builds": self.llm_builds,
+            "runnable_builds": self.runnable_builds,
+            "requests": self.requests,
+        }
 
 
-# Global LLM service instance
-_llm_service: Optional[LLMService] = None
+# LLM services keyed by (provider, model, temperature), least recently used first
+LLMServiceKey = Tuple[str, str, float]
+_llm_services: "OrderedDict[LLMServiceKey, LLMService]" = OrderedDict()
+_llm_services_lock = threading.Lock()
+# Number of services built per key (a key is rebuilt after eviction)
+_llm_service_builds: Dict[LLMServiceKey, int] = {}
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "8"))
 
 
 def get_llm_service(provider: str = "openai", model: str = "", temperature: float = 0.7) -> LLMService:
-    """Get or create the global LLM service instance"""
-    global _llm_service
+    """
+    Get the LLM service for a configuration, creating it on first use.
     
-    if _llm_service is None:
-        _llm_service = LLMService(provider=provider, model=model, temperature=temperature)
-    else:
-        # Update if config changed
-        if (_llm_service.provider != provider.lower() or 
-            _llm_service.model != model or 
-            _llm_service.temperature != temperature):
-            _llm_service.update_config(provider, model, temperature)
+    Services are pooled per (provider, model, temperature), so endpoints using
+    different settings each keep their own client and structured-output runnables.
+    """
+    key = (provider.lower(), model, float(temperature))
+    with _llm_services_lock:
+        service = _llm_services.get(key)
+        if service is not None:
+            _llm_services.move_to_end(key)
+            return service
     
-    return _llm_service
+    # Build outside the lock (client creation can be slow); keep the first one built
+    service = LLMService(provider=provider, model=model, temperature=temperature)
+    with _llm_services_lock:
+        if key in _llm_services:
+            _llm_services.move_to_end(key)
+            return _llm_services[key]
+        _llm_services[key] = service
+        _llm_service_builds[key] = _llm_service_builds.get(key, 0) + 1
+        print(f"LLM: Created service for {key[0]} model={key[1] or 'default'} temperature={key[2]}")
+        while len(_llm_services) > LLM_POOL_SIZE:
+            evicted_key, _ = _llm_services.popitem(last=False)
+            print(f"LLM: Evicted service for {evicted_key[0]} model={evicted_key[1] or 'default'}")
+    return service
+
+
+def warm_up_llm_service(provider: str = "openai", model: str = "", temperature: float = 0.7) -> Optional[LLMService]:
+    """
+    Build the LLM service for a configuration ahead of the first request (startup hook).
+    
+    Returns:
+        The service, or None if it cannot be created (e.g. missing API key)
+    """
+    try:
+        return get_llm_service(provider=provider, model=model, temperature=temperature)
+    except Exception as e:
+        print(f"LLM: Warm-up failed for {provider}: {e}")
+        return None
+
 
+def get_llm_pool_stats() -> Dict[str, Any]:
+    """Get LLM service pool statistics"""
+    with _llm_services_lock:
+        services = [
+            {**service.get_stats(), "service_builds": _llm_service_builds.get(key, 0)}
+            for key, service in _llm_services.items()
+        ]
+        evicted = sum(_llm_service_builds.values()) - len(_llm_services)
+    policy = get_hedge_policy()
+    return {
+        "size": len(services),
+        "max_size": LLM_POOL_SIZE,
+        "evictions": evicted,
+        "services": services,
+        "latency": get_latency_stats(),
+        "hedging": policy.get_stats() if policy is not None else None,
+    }
@@ -0,0 +1,330 @@
+"""
+Response cache for LLM choice generation.
+
+Choices are cached under a hash of the normalized message list (system prompt
+with context, then conversation history) and the LLM configuration. Entries
+expire after a TTL and the cache is bounded with an LRU policy. Entries can be
+persisted to SQLite so they survive restarts; SQLite writes are made by a
+background thread so lookups and inserts never block the event loop.
+
+An optional near-duplicate lookup serves a cached response when the system
+message is identical and the last N turns are similar enough (word-set
+Jaccard similarity), e.g. "Do you want water?" vs "Do you want some water".
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import queue
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any, Tuple, FrozenSet, Sequence
+
+from langchain_core.messages import BaseMessage
+
+
+_WHITESPACE = re.compile(r"\s+")
+_WORD = re.compile(r"\w+")
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and collapse whitespace."""
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+
+def _normalize_messages(messages: Sequence[BaseMessage]) -> List[Tuple[str, str]]:
+    """(type, normalized content) of each message."""
+    return [(message.type, normalize_text(str(message.content))) for message in messages]
+
+
+def _hash(namespace: str, items: Any) -> str:
+    """Stable hash of a namespace and JSON-serializable items."""
+    payload = json.dumps([namespace, items], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _CacheEntry:
+    """A cached choice list"""
+    __slots__ = ("cache_key", "choices", "created_at", "latency_ms", "context_key", "window_words")
+
+    def __init__(self, cache_key: str, choices: List[Dict[str, Any]], created_at: float, latency_ms: float,
+                 context_key: str, window_words: FrozenSet[str]):
+        self.cache_key = cache_key
+        self.choices = choices
+        self.created_at = created_at
+        self.latency_ms = latency_ms
+        self.context_key = context_key
+        self.window_words = window_words
+
+
+class LLMResponseCache:
+    """TTL + LRU cache of generated choices with optional SQLite persistence"""
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 6 * 3600, db_path: Optional[str] = None,
+                 near_duplicate: bool = False, similarity_threshold: float = 0.85, window_turns: int = 2):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of cached responses (least recently used evicted first)
+            ttl_seconds: Time after which a cached response expires
+            db_path: SQLite file to persist entries to (None for memory only)
+            near_duplicate: Serve near-duplicate requests (same system message, similar last turns)
+            similarity_threshold: Minimum word-set Jaccard similarity of the last turns for a near-duplicate hit
+            window_turns: Number of last conversation turns compared by the near-duplicate lookup
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.near_duplicate = near_duplicate
+        self.similarity_threshold = similarity_threshold
+        self.window_turns = window_turns
+
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {
+            "hits": 0,
+            "near_duplicate_hits": 0,
+            "misses": 0,
+            "expirations": 0,
+            "evictions": 0,
+            "latency_saved_ms": 0.0,
+        }
+
+        self._conn: Optional[sqlite3.Connection] = None
+        # Batches of SQLite statements for the writer thread (None stops it)
+        self._writes: "queue.Queue[Optional[List[Tuple[str, Tuple]]]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        if db_path:
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "cache_key TEXT PRIMARY KEY, "
+                "context_key TEXT NOT NULL, "
+                "window_words TEXT NOT NULL, "
+                "choices_json TEXT NOT NULL, "
+                "created_at REAL NOT NULL, "
+                "latency_ms REAL NOT NULL)"
+            )
+            self._conn.commit()
+            self._load()
+            self._writer = threading.Thread(target=self._write_loop, name="llm-cache-writer", daemon=True)
+            self._writer.start()
+
+    def _load(self) -> None:
+        """Load the most recent unexpired persisted entries."""
+        cutoff = time.time() - self.ttl_seconds
+        self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (cutoff,))
+        self._conn.commit()
+        rows = self._conn.execute(
+            "SELECT cache_key, context_key, window_words, choices_json, created_at, latency_ms "
+            "FROM llm_cache ORDER BY created_at DESC LIMIT ?", (self.max_entries,)
+        ).fetchall()
+        for cache_key, context_key, window_words, choices_json, created_at, latency_ms in reversed(rows):
+            self._entries[cache_key] = _CacheEntry(
+                cache_key, json.loads(choices_json), created_at, latency_ms,
+                context_key, frozenset(json.loads(window_words))
+            )
+        if rows:
+            print(f"LLM Cache: Loaded {len(rows)} cached responses")
+
+    def make_keys(self, namespace: str, messages: Sequence[BaseMessage]) -> Tuple[str, str, FrozenSet[str]]:
+        """
+        Compute the lookup keys of a request.
+
+        Args:
+            namespace: LLM configuration (provider, model, temperature) the response depends on
+            messages: Messages sent to the LLM
+
+        Returns:
+            (exact cache key, context key of the system message(s), words of the last turns)
+        """
+        normalized = _normalize_messages(messages)
+        system = [m for m in normalized if m[0] == "system"]
+        turns = [m for m in normalized if m[0] != "system"]
+        window = turns[-self.window_turns:] if self.window_turns > 0 else []
+        window_words = frozenset(
+            f"{role}:{word}" for role, content in window for word in _WORD.findall(content)
+        )
+        # Near-duplicates must match the system message and the number of turns in the window
+        context_key = _hash(namespace, [system, [role for role, _ in window]])
+        return _hash(namespace, normalized), context_key, window_words
+
+    def get(self, namespace: str, messages: Sequence[BaseMessage]) -> Optional[List[Dict[str, Any]]]:
+        """
+        Look up cached choices for a request.
+
+        Returns:
+            A copy of the cached choices, or None on a miss
+        """
+        cache_key, context_key, window_words = self.make_keys(namespace, messages)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None and now - entry.created_at > self.ttl_seconds:
+                self._discard(cache_key)
+                self.stats["expirations"] += 1
+                entry = None
+
+            if entry is not None:
+                self.stats["hits"] += 1
+            elif self.near_duplicate and window_words:
+                entry = self._find_near_duplicate(context_key, window_words, now)
+                if entry is not None:
+                    self.stats["near_duplicate_hits"] += 1
+
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+
+            self._entries.move_to_end(entry.cache_key)
+            self.stats["latency_saved_ms"] += entry.latency_ms
+            return [dict(choice) for choice in entry.choices]
+
+    def _find_near_duplicate(self, context_key: str, window_words: FrozenSet[str], now: float) -> Optional[_CacheEntry]:
+        """Most similar unexpired entry with the same context (caller holds the lock)."""
+        best = None
+        best_similarity = self.similarity_threshold
+        for entry in self._entries.values():
+            if entry.context_key != context_key or now - entry.created_at > self.ttl_seconds:
+                continue
+            union = len(window_words | entry.window_words)
+            similarity = len(window_words & entry.window_words) / union if union else 0.0
+            if similarity >= best_similarity:
+                best = entry
+                best_similarity = similarity
+        return best
+
+    def put(self, namespace: str, messages: Sequence[BaseMessage], choices: List[Dict[str, Any]],
+            latency_ms: float) -> None:
+        """
+        Cache the choices generated for a request.
+
+        Args:
+            namespace: LLM configuration the response depends on
+            messages: Messages sent to the LLM
+            choices: Generated choices
+            latency_ms: Generation latency (reported as saved on each hit)
+        """
+        cache_key, context_key, window_words = self.make_keys(namespace, messages)
+        entry = _CacheEntry(
+            cache_key, [dict(choice) for choice in choices], time.time(), latency_ms, context_key, window_words
+        )
+        with self._lock:
+            self._entries[cache_key] = entry
+            self._entries.move_to_end(cache_key)
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[0])
+            self.stats["evictions"] += len(evicted)
+
+            self._persist([(
+                "INSERT OR REPLACE INTO llm_cache "
+                "(cache_key, context_key, window_words, choices_json, created_at, latency_ms) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (cache_key, context_key, json.dumps(sorted(window_words)), json.dumps(entry.choices),
+                 entry.created_at, latency_ms)
+            )] + [("DELETE FROM llm_cache WHERE cache_key = ?", (key,)) for key in evicted])
+
+    def _discard(self, cache_key: str) -> None:
+        """Remove an entry (caller holds the lock)."""
+        self._entries.pop(cache_key, None)
+        self._persist([("DELETE FROM llm_cache WHERE cache_key = ?", (cache_key,))])
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+            self._persist([("DELETE FROM llm_cache", ())])
+
+    def _persist(self, statements: List[Tuple[str, Tuple]]) -> None:
+        """Queue SQLite statements for the writer thread (no-op without persistence)."""
+        if self._writer is not None:
+            self._writes.put(statements)
+
+    def _write_loop(self) -> None:
+        """Execute queued statements, committing everything queued at once in one transaction."""
+        stopped = False
+        while not stopped:
+            batch = [self._writes.get()]
+            while batch[-1] is not None:
+                try:
+                    batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                stopped = True
+                batch.pop()
+            if not batch:
+                continue
+            try:
+                for statements in batch:
+                    for sql, params in statements:
+                        self._conn.execute(sql, params)
+                self._conn.commit()
+            except Exception as e:
+                print(f"LLM Cache: Error writing {len(batch)} changes to SQLite: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit rate, latency saved and size statistics."""
+        with self._lock:
+            hits = self.stats["hits"] + self.stats["near_duplicate_hits"]
+            lookups = hits + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "near_duplicate": self.near_duplicate,
+                "persistent": self._conn is not None,
+            }
+
+    def close(self) -> None:
+        """Write the queued changes and close the SQLite connection."""
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._writes.put(None)
+            writer.join(timeout=5)
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# Global response cache shared by all LLM services
+_llm_cache: Optional[LLMResponseCache] = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """Get or create the global response cache (None if disabled with LLM_CACHE_ENABLED=false)"""
+    global _llm_cache
+
+    if os.getenv("LLM_CACHE_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return None
+
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            _llm_cache = LLMResponseCache(
+                max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512")),
+                ttl_seconds=float(os.getenv("LLM_CACHE_TTL_SECONDS", str(6 * 3600))),
+                db_path=os.getenv("LLM_CACHE_DB") or None,
+                near_duplicate=os.getenv("LLM_CACHE_NEAR_DUPLICATE", "false").lower() in ("1", "true", "yes"),
+                similarity_threshold=float(os.getenv("LLM_CACHE_SIMILARITY", "0.85")),
+                window_turns=int(os.getenv("LLM_CACHE_WINDOW_TURNS", "2")),
+            )
+        return _llm_cache
+
+
+def close_llm_cache() -> None:
+    """Close the global response cache"""
+    global _llm_cache
+    with _llm_cache_lock:
+        if _llm_cache is not None:
+            _llm_cache.close()
+            _llm_cache = None
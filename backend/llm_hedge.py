@@ -0,0 +1,252 @@
+"""
+Hedged LLM requests across providers.
+
+A request is sent to the primary provider. If no valid result has arrived
+after the hedge delay, the same request is also sent to the secondary provider
+and the first valid result wins (the other call is cancelled). A primary call
+failing before the delay fires the secondary right away.
+
+The hedge delay is a high quantile (p95 by default) of the primary provider's
+recent latencies, taken from per-provider latency histograms, so only the slow
+tail of the requests is duplicated.
+"""
+import os
+import time
+import bisect
+import asyncio
+from typing import Optional, List, Dict, Any, Callable, Awaitable, TypeVar
+
+T = TypeVar("T")
+
+
+class LatencyHistogram:
+    """Log-bucketed latency histogram tracking recent latencies"""
+
+    def __init__(self, min_ms: float = 10.0, max_ms: float = 120000.0, growth: float = 1.2,
+                 max_samples: int = 500):
+        """
+        Args:
+            min_ms: Upper bound of the first bucket
+            max_ms: Upper bound of the last bucket (slower calls fall in an overflow bucket)
+            growth: Ratio between consecutive bucket bounds
+            max_samples: Counts are halved past this number of samples, so old latencies fade out
+        """
+        self.bounds: List[float] = []
+        bound = min_ms
+        while bound < max_ms:
+            self.bounds.append(round(bound, 1))
+            bound *= growth
+        self.bounds.append(max_ms)
+        self.counts = [0.0] * (len(self.bounds) + 1)
+        self.total = 0.0
+        self.samples = 0
+        self.max_samples = max_samples
+
+    def record(self, latency_ms: float) -> None:
+        """Add a latency."""
+        self.counts[bisect.bisect_left(self.bounds, latency_ms)] += 1
+        self.total += 1
+        self.samples += 1
+        if self.total > self.max_samples:
+            self.counts = [count / 2 for count in self.counts]
+            self.total /= 2
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding a quantile (None without samples)."""
+        if not self.total:
+            return None
+        target = q * self.total
+        cumulative = 0.0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return self.bounds[min(index, len(self.bounds) - 1)]
+        return self.bounds[-1]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Quantiles and non-empty buckets ([upper bound in ms, weight])."""
+        return {
+            "samples": self.samples,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "buckets": [
+                [self.bounds[index] if index < len(self.bounds) else None, round(count, 2)]
+                for index, count in enumerate(self.counts) if count
+            ],
+        }
+
+
+# Latency histogram per provider and model
+_latency_histograms: Dict[str, LatencyHistogram] = {}
+
+
+def get_latency_histogram(key: str) -> LatencyHistogram:
+    """Get the latency histogram of a provider and model, creating it on first use"""
+    histogram = _latency_histograms.get(key)
+    if histogram is None:
+        histogram = _latency_histograms[key] = LatencyHistogram()
+    return histogram
+
+
+def get_latency_stats() -> Dict[str, Any]:
+    """Get the latency histograms of all providers"""
+    return {key: histogram.to_dict() for key, histogram in _latency_histograms.items()}
+
+
+async def timed_call(key: str, call: Callable[[], Awaitable[T]]) -> T:
+    """
+    Run an LLM call, recording its latency in the provider's histogram.
+
+    Failed calls are not recorded (fast errors would hide the slow tail). Cancelled
+    calls record their elapsed time as a lower bound of their latency, so a provider
+    that keeps losing races still shows its slow tail.
+    """
+    start = time.perf_counter()
+    try:
+        result = await call()
+    except asyncio.CancelledError:
+        get_latency_histogram(key).record((time.perf_counter() - start) * 1000)
+        raise
+    get_latency_histogram(key).record((time.perf_counter() - start) * 1000)
+    return result
+
+
+class HedgePolicy:
+    """Races a slow primary LLM call against a secondary provider"""
+
+    def __init__(self, secondary_provider: str = "", secondary_model: str = "", quantile: float = 0.95,
+                 initial_delay_ms: float = 2000.0, min_delay_ms: float = 200.0, max_delay_ms: float = 10000.0,
+                 min_samples: int = 20):
+        """
+        Args:
+            secondary_provider: Provider of the hedge call ("" for the other supported provider)
+            secondary_model: Model of the hedge call ("" for the provider default)
+            quantile: Latency quantile of the primary provider used as hedge delay
+            initial_delay_ms: Hedge delay until the primary provider has min_samples latencies
+            min_delay_ms: Lower bound of the hedge delay
+            max_delay_ms: Upper bound of the hedge delay
+            min_samples: Latencies needed before the histogram drives the delay
+        """
+        self.secondary_provider = secondary_provider.lower()
+        self.secondary_model = secondary_model
+        self.quantile = quantile
+        self.initial_delay_ms = initial_delay_ms
+        self.min_delay_ms = min_delay_ms
+        self.max_delay_ms = max_delay_ms
+        self.min_samples = min_samples
+        self.stats = {
+            "requests": 0,
+            "primary_only": 0,  # Primary answered before the hedge delay
+            "hedged": 0,  # Secondary fired after the hedge delay
+            "failovers": 0,  # Secondary fired because the primary failed first
+            "primary_wins": 0,
+            "secondary_wins": 0,
+            "cancelled": 0,  # Losing calls cancelled
+            "failed": 0,  # Both calls failed
+        }
+
+    def partner_provider(self, provider: str) -> str:
+        """Provider of the hedge call for a primary provider."""
+        if self.secondary_provider:
+            return self.secondary_provider
+        return "anthropic" if provider == "openai" else "openai"
+
+    def delay_ms(self, primary_key: str) -> float:
+        """Hedge delay of a primary provider, from its latency histogram."""
+        histogram = get_latency_histogram(primary_key)
+        if histogram.samples < self.min_samples:
+            return self.initial_delay_ms
+        return min(max(histogram.quantile(self.quantile), self.min_delay_ms), self.max_delay_ms)
+
+    async def race(self, primary_key: str, primary_call: Callable[[], Awaitable[T]],
+                   secondary_key: str, secondary_call: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run the primary call, hedged with the secondary call once the delay has passed.
+        The calls record their own latency (see timed_call); the race only reads the histograms.
+
+        Args:
+            primary_key: Provider and model of the primary call (latency histogram key)
+            primary_call: Coroutine function returning a valid result or raising
+            secondary_key: Provider and model of the secondary call
+            secondary_call: Coroutine function returning a valid result or raising
+
+        Returns:
+            The first valid result
+
+        Raises:
+            The last error if both calls fail
+        """
+        self.stats["requests"] += 1
+        roles = {asyncio.create_task(primary_call()): "primary"}
+        primary = next(iter(roles))
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.delay_ms(primary_key) / 1000)
+            if done and primary.exception() is None:
+                self.stats["primary_only"] += 1
+                self.stats["primary_wins"] += 1
+                return primary.result()
+
+            error = None
+            if done:
+                error = primary.exception()
+                print(f"LLM Hedge: Primary {primary_key} failed, failing over to {secondary_key}: {error}")
+                self.stats["failovers"] += 1
+            else:
+                print(f"LLM Hedge: Primary {primary_key} is slow, hedging with {secondary_key}")
+                self.stats["hedged"] += 1
+            roles[asyncio.create_task(secondary_call())] = "secondary"
+
+            pending = {task for task in roles if not task.done()}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self.stats[f"{roles[task]}_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+                    print(f"LLM Hedge: {roles[task].capitalize()} call failed: {error}")
+
+            self.stats["failed"] += 1
+            raise error
+        finally:
+            # Cancel the losing call (or both if the request itself was cancelled)
+            for task in roles:
+                if not task.done():
+                    task.cancel()
+                    self.stats["cancelled"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hedge configuration and win/cancel statistics."""
+        return {
+            **self.stats,
+            "secondary_provider": self.secondary_provider or "auto",
+            "secondary_model": self.secondary_model or "default",
+            "quantile": self.quantile,
+            "delays_ms": {key: self.delay_ms(key) for key in _latency_histograms},
+        }
+
+
+# Global hedge policy
+_hedge_policy: Optional[HedgePolicy] = None
+
+
+def get_hedge_policy() -> Optional[HedgePolicy]:
+    """Get or create the global hedge policy (None unless enabled with LLM_HEDGE_ENABLED=true)"""
+    global _hedge_policy
+
+    if os.getenv("LLM_HEDGE_ENABLED", "false").lower() not in ("1", "true", "yes"):
+        return None
+
+    if _hedge_policy is None:
+        _hedge_policy = HedgePolicy(
+            secondary_provider=os.getenv("LLM_HEDGE_PROVIDER", ""),
+            secondary_model=os.getenv("LLM_HEDGE_MODEL", ""),
+            quantile=float(os.getenv("LLM_HEDGE_QUANTILE", "0.95")),
+            initial_delay_ms=float(os.getenv("LLM_HEDGE_INITIAL_DELAY_MS", "2000")),
+            min_delay_ms=float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "200")),
+            max_delay_ms=float(os.getenv("LLM_HEDGE_MAX_DELAY_MS", "10000")),
+            min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")),
+        )
+
+    return _hedge_policy
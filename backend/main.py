@@ -1,31 +1,61 @@
 from fastapi import FastAPI, Depends, HTTPException, status, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, Response
 from pydantic import BaseModel
 from typing import Optional, List, Set, Dict
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import func, tuple_
 import uvicorn
+import base64
 import json
 import os
-import base64
 from pathlib import Path
 from datetime import datetime
 import asyncio
+import time
+import anyio
 
-from database import engine, create_db_and_tables, get_session
+from database import (
+    engine, create_db_and_tables, get_session, get_async_session, close_async_engine, THREADPOOL_WORKERS
+)
 from models import (
     User, UserCreate, UserUpdate, UserResponse,
     Caregiver, CaregiverCreate, CaregiverUpdate, CaregiverResponse,
     CommunicationSession, CommunicationSessionCreate, CommunicationSessionUpdate, CommunicationSessionResponse,
+    CommunicationSessionPage,
     SessionStep, SessionStepCreate, SessionStepResponse, ChoiceData,
     EyeTrackingSetup, CommunicationSettings
 )
 from calibration import (
     CalibrationRequest,
     CalibrationResponse,
+    PackedCalibrationRequest,
     process_calibration_data,
+    process_packed_calibration_data,
 )
-from llm import get_llm_service
-from tts_service import get_tts_service
+from llm import get_llm_service, warm_up_llm_service, get_llm_pool_stats
+from llm_cache import get_llm_cache, close_llm_cache
+from keyboard_predictor import get_keyboard_predictor, retrain_keyboard_predictor
+from user_language_model import get_user_model_store, close_user_model_store
+from tts_service import (
+    TTSService,
+    TTSAudio,
+    get_tts_service,
+    get_async_tts_service,
+    get_tts_latency_stats,
+    get_tts_cache_stats,
+    get_tts_disk_cache,
+)
+from tts_cache import close_disk_caches
+from tts_prefetch import get_tts_prefetcher
+from choice_prefetch import get_choice_prefetcher, request_key
+from single_flight import get_keyboard_flights, SupersededError
+from gaze_pipeline import get_gaze_pipeline, GazeSubscriber, Viewport, load_user_calibration
+from dwell_detector import DwellDetector, DwellTarget
+from gaze_recorder import get_gaze_recorder, close_gaze_recorder, replay as replay_gaze_recording
+from step_writer import get_step_writer, close_step_writer
+from audio_player import get_audio_player
 try:
     from stt_service import SpeechToTextService
 except ImportError:
@@ -129,6 +159,17 @@ def on_speech_error(error: str):
 @app.on_event("startup")
 def on_startup():
     create_db_and_tables()
+    # Build the LLM client and structured-output runnables before the first request
+    config = load_config()
+    warm_up_llm_service(provider=config.provider, model=config.model, temperature=config.temperature)
+    # Train the local keyboard predictor in the background
+    get_keyboard_predictor(config.tts_language or "fr", engine)
+
+
+@app.on_event("startup")
+async def configure_threadpool():
+    """Size the threadpool of the sync handlers (the database connection pool is sized from it)."""
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_WORKERS
 
 
 @app.on_event("shutdown")
@@ -138,6 +179,30 @@ def on_shutdown():
     if speech_to_text_service:
         speech_to_text_service.stop()
         speech_to_text_service = None
+    prefetcher = get_tts_prefetcher(get_async_tts_service())
+    if prefetcher is not None:
+        prefetcher.cancel_all()
+    choice_prefetcher = get_choice_prefetcher()
+    if choice_prefetcher is not None:
+        choice_prefetcher.cancel_all()
+    get_keyboard_flights().cancel_all()
+    # Write the queued session steps before the process exits
+    close_step_writer()
+    gaze_pipeline = get_gaze_pipeline()
+    if gaze_pipeline is not None:
+        gaze_pipeline.stop()
+    get_async_tts_service().shutdown()
+    get_audio_player().shutdown()
+    close_disk_caches()
+    close_llm_cache()
+    close_user_model_store()
+    close_gaze_recorder()
+
+
+@app.on_event("shutdown")
+async def close_database_connections():
+    """Close the connections of the async database engine."""
+    await close_async_engine()
 
 
 class EyeTrackingStatus(BaseModel):
@@ -224,6 +289,7 @@ class ChoiceSelectionRequest(BaseModel):
     current_text: Optional[str] = None
     session_id: Optional[int] = None
     step_number: Optional[int] = None
+    user_id: Optional[int] = None  # Defaults to the user of the session
 
 
 class ChoicesRequest(BaseModel):
@@ -236,139 +302,465 @@ class ChoicesRequest(BaseModel):
     step_number: Optional[int] = None
 
 
-@app.post("/api/communication/choices", response_model=ChoicesResponse, tags=["communication"])
-async def get_choices(request: ChoicesRequest, session: Session = Depends(get_session)):
+def fallback_choices() -> List[Choice]:
+    """Default choices offered when the LLM fails."""
+    return [
+        Choice(id="1", text="Yes", icon="✓", probability=0.5),
+        Choice(id="2", text="No", icon="✗", probability=0.5),
+        Choice(id="3", text="More", icon="+", probability=0.3),
+        Choice(id="4", text="Done", icon="✓", probability=0.2)
+    ]
+
+
+async def get_choice_context(request: ChoicesRequest, session: AsyncSession) -> tuple:
     """
-    Get available choices for the communication grid.
-    Returns 2-8 choices based on context using LLM.
+    Get the user notes and caregiver description for a choices request.
+    
+    The session is closed afterwards: callers then await the LLM, which must not hold a connection.
     """
+    user_notes = None
+    caregiver_description = None
+    
     try:
-        # Load config
-        config = load_config()
-        
-        # Get user and caregiver info if provided
-        user_notes = None
-        caregiver_description = None
-        
         if request.user_id:
-            user = session.get(User, request.user_id)
+            user = await session.get(User, request.user_id)
             if user:
                 user_notes = user.notes
         
         if request.caregiver_id:
-            caregiver = session.get(Caregiver, request.caregiver_id)
+            caregiver = await session.get(Caregiver, request.caregiver_id)
             if caregiver:
                 caregiver_description = caregiver.description
+    finally:
+        await session.close()
+    
+    return user_notes, caregiver_description
+
+
+def save_choices_step(request: ChoicesRequest, choices_data: List[dict]) -> None:
+    """Queue the offered choices as a session step (if the request belongs to a session)."""
+    if not request.session_id or request.step_number is None:
+        return
+    try:
+        # Determine message role based on conversation history
+        message_role = None
+        message_content = None
+        if request.conversation_history:
+            last_message = request.conversation_history[-1]
+            message_role = last_message.get("role", "").lower()
+            message_content = last_message.get("content", "")
+            # Map 'user' to 'caregiver' and 'assistant' to 'user' for clarity
+            if message_role == "user":
+                message_role = "caregiver"
+            elif message_role == "assistant":
+                message_role = "user"
         
-        # Get LLM service
-        llm_service = get_llm_service(
-            provider=config.provider,
-            model=config.model,
-            temperature=config.temperature
+        # Written (with the session updated_at) by the write-behind queue, off the response path
+        get_step_writer(engine).add_step(
+            session_id=request.session_id,
+            step_number=request.step_number,
+            message_role=message_role,
+            message_content=message_content,
+            choices_json=choices_data,
+            selected_choice_text=None  # Not selected yet
         )
-        
-        # Generate choices using LLM
-        llm_choices = await llm_service.generate_choices(
-            system_prompt=config.communicate_prompt,
-            conversation_history=request.conversation_history or [],
-            user_notes=user_notes,
-            caregiver_description=caregiver_description,
-            current_text=request.current_text
-        )
-        
-        # Convert to Choice format with IDs
+    except Exception as e:
+        print(f"Error saving session step: {e}")
+        # Continue even if saving fails
+
+
+def offer_choices(request: ChoicesRequest, config: "ConfigModel", llm_choices: Optional[List[dict]],
+                  user_notes: Optional[str], caregiver_description: Optional[str]) -> List[Choice]:
+    """
+    Build the choices offered for a request, schedule their speculative work and save them as a session step.
+    
+    The fallback choices (llm_choices is None, the LLM failed) are saved too, so selecting one is recorded.
+    Shared by /api/communication/choices and /api/communication/choices/stream.
+    """
+    if llm_choices is None:
+        choices = fallback_choices()
+    else:
         choices = [
-            Choice(
-                id=str(i + 1),
-                text=choice["text"],
-                probability=choice["probability"]
-            )
+            Choice(id=str(i + 1), text=choice["text"], probability=choice["probability"])
             for i, choice in enumerate(llm_choices)
         ]
+    choices_data = [{"text": c.text, "probability": c.probability} for c in choices]
+    
+    # Speculatively synthesize the most probable choices while the user dwells on them
+    schedule_choice_prefetch(request.session_id, choices_data, config)
+    # Speculatively generate the next choices for the most probable selections
+    if llm_choices is not None:
+        schedule_followup_choices(request, config, llm_choices, user_notes, caregiver_description)
+    
+    # Save step to session if session_id is provided
+    save_choices_step(request, choices_data)
+    return choices
+
+
+@app.post("/api/communication/choices", response_model=ChoicesResponse, tags=["communication"])
+async def get_choices(request: ChoicesRequest, session: AsyncSession = Depends(get_async_session)):
+    """
+    Get available choices for the communication grid.
+    Returns 2-8 choices based on context using LLM.
+    """
+    try:
+        # Load config
+        config = load_config()
         
-        # Save step to session if session_id is provided
-        if request.session_id and request.step_number is not None:
-            try:
-                # Determine message role based on conversation history
-                message_role = None
-                message_content = None
-                if request.conversation_history:
-                    last_message = request.conversation_history[-1]
-                    message_role = last_message.get("role", "").lower()
-                    message_content = last_message.get("content", "")
-                    # Map 'user' to 'caregiver' and 'assistant' to 'user' for clarity
-                    if message_role == "user":
-                        message_role = "caregiver"
-                    elif message_role == "assistant":
-                        message_role = "user"
-                
-                # Prepare choices data
-                choices_data = [{"text": c.text, "probability": c.probability} for c in choices]
-                
-                step = SessionStep(
-                    session_id=request.session_id,
-                    step_number=request.step_number,
-                    message_role=message_role,
-                    message_content=message_content,
-                    choices_json=choices_data,
-                    selected_choice_text=None  # Not selected yet
+        # Get user and caregiver info if provided
+        user_notes, caregiver_description = await get_choice_context(request, session)
+        
+        try:
+            # Serve the follow-up choices generated while the user was selecting, if they match
+            llm_choices = await take_prefetched_choices(request, config)
+            
+            if llm_choices is None:
+                # Get LLM service
+                llm_service = get_llm_service(
+                    provider=config.provider,
+                    model=config.model,
+                    temperature=config.temperature
                 )
                 
-                session.add(step)
-                
-                # Update session updated_at
-                comm_session = session.get(CommunicationSession, request.session_id)
-                if comm_session:
-                    comm_session.updated_at = datetime.utcnow()
-                    session.add(comm_session)
-                
-                session.commit()
-            except Exception as e:
-                print(f"Error saving session step: {e}")
-                # Continue even if saving fails
+                # Generate choices using LLM
+                llm_choices = await llm_service.generate_choices(
+                    system_prompt=config.communicate_prompt,
+                    conversation_history=request.conversation_history or [],
+                    user_notes=user_notes,
+                    caregiver_description=caregiver_description,
+                    current_text=request.current_text,
+                    use_fallback=False
+                )
+        except Exception as e:
+            print(f"Error generating choices: {e}")
+            llm_choices = None  # Fallback choices, saved like the streamed ones
         
+        choices = offer_choices(request, config, llm_choices, user_notes, caregiver_description)
         return ChoicesResponse(choices=choices)
     
     except Exception as e:
         print(f"Error generating choices: {e}")
         # Fallback to default choices
-        choices = [
-            Choice(id="1", text="Yes", icon="✓", probability=0.5),
-            Choice(id="2", text="No", icon="✗", probability=0.5),
-            Choice(id="3", text="More", icon="+", probability=0.3),
-            Choice(id="4", text="Done", icon="✓", probability=0.2)
-        ]
-        return ChoicesResponse(choices=choices)
+        return ChoicesResponse(choices=fallback_choices())
+
+
+def format_sse(event: str, data: dict) -> str:
+    """Format a server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/api/communication/choices/stream", tags=["communication"])
+async def stream_choices(request: ChoicesRequest, session: AsyncSession = Depends(get_async_session)):
+    """
+    Stream choices for the communication grid as server-sent events.
+    
+    Emits a "choice" event as soon as the LLM has written each choice, then a
+    "choices" event with the final set sorted by probability (same format as
+    /api/communication/choices). The session step is saved once the stream completes.
+    """
+    config = load_config()
+    user_notes, caregiver_description = await get_choice_context(request, session)
+    
+    async def events():
+        # Follow-up choices generated while the user was selecting are sent at once
+        final_choices = await take_prefetched_choices(request, config)
+        try:
+            if final_choices is not None:
+                for index, choice in enumerate(final_choices):
+                    choice = Choice(id=str(index + 1), **choice)
+                    yield format_sse("choice", {"index": index, "choice": choice.model_dump()})
+            else:
+                llm_service = get_llm_service(
+                    provider=config.provider,
+                    model=config.model,
+                    temperature=config.temperature
+                )
+                llm_events = llm_service.stream_choices(
+                    system_prompt=config.communicate_prompt,
+                    conversation_history=request.conversation_history or [],
+                    user_notes=user_notes,
+                    caregiver_description=caregiver_description,
+                    current_text=request.current_text
+                )
+                async for event in llm_events:
+                    if event["type"] == "choice":
+                        choice = Choice(id=str(event["index"] + 1), **event["choice"])
+                        yield format_sse("choice", {"index": event["index"], "choice": choice.model_dump()})
+                    else:
+                        final_choices = event["choices"]
+        except Exception as e:
+            print(f"Error streaming choices: {e}")
+            final_choices = None
+        
+        # Persist before the final event: the client may disconnect as soon as it has the choices
+        choices = offer_choices(request, config, final_choices, user_notes, caregiver_description)
+        
+        yield format_sse("choices", ChoicesResponse(choices=choices).model_dump())
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def choice_set_key(request: ChoicesRequest):
+    """Conversation a choices request belongs to (for speculative follow-up choices)."""
+    return request.session_id if request.session_id else ("user", request.user_id, request.caregiver_id)
+
+
+def choice_config_key(config: "ConfigModel") -> str:
+    """LLM configuration and prompt the communication choices depend on."""
+    return f"{config.provider}:{config.model}:{config.temperature}:{hash(config.communicate_prompt)}"
+
+
+async def take_prefetched_choices(request: ChoicesRequest, config: "ConfigModel") -> Optional[List[dict]]:
+    """
+    Get the speculative follow-up choices matching a request (awaiting them if still generating).
+    Speculative choices for the other candidates are cancelled.
+    
+    Returns:
+        Choices with text and probability, or None if no speculative result matches
+    """
+    prefetcher = get_choice_prefetcher()
+    if prefetcher is None:
+        return None
+    task = prefetcher.take(
+        choice_set_key(request), choice_config_key(config), request.conversation_history or [],
+        request.current_text, request.user_id, request.caregiver_id
+    )
+    if task is None:
+        return None
+    try:
+        # Shielded: if this request is cancelled, the result still lands in the LLM cache
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        if task.cancelled():
+            return None
+        raise
+    except Exception:
+        return None
+
+
+def schedule_followup_choices(request: ChoicesRequest, config: "ConfigModel", choices: List[dict],
+                              user_notes: Optional[str], caregiver_description: Optional[str]) -> None:
+    """
+    Start generating the next choices for the most probable selections, replacing the previous ones.
+    A selection appends the choice to the history (as the user's turn) and to the current text.
+    """
+    prefetcher = get_choice_prefetcher()
+    if prefetcher is None:
+        return
+    
+    async def generate(conversation_history: List[Dict[str, str]], current_text: str) -> List[dict]:
+        llm_service = get_llm_service(
+            provider=config.provider,
+            model=config.model,
+            temperature=config.temperature
+        )
+        return await llm_service.generate_choices(
+            system_prompt=config.communicate_prompt,
+            conversation_history=conversation_history,
+            user_notes=user_notes,
+            caregiver_description=caregiver_description,
+            current_text=current_text,
+            use_fallback=False
+        )
+    
+    try:
+        prefetcher.schedule(
+            choice_set_key(request), choice_config_key(config), request.conversation_history or [],
+            request.current_text, request.user_id, request.caregiver_id, choices, generate
+        )
+    except Exception as e:
+        print(f"Error scheduling follow-up choices: {e}")
+
+
+def schedule_choice_prefetch(set_key: Optional[int], choices: List[dict], config: "ConfigModel") -> None:
+    """
+    Start pre-synthesis of offered choices into the TTS cache, replacing the previous set.
+    Uses the same TTS parameters as select_choice so the selection hits the cache.
+    """
+    prefetcher = get_tts_prefetcher(get_async_tts_service())
+    if prefetcher is None:
+        return
+    try:
+        tts_service = get_tts_service(provider=resolve_tts_provider(config))
+        prefetcher.schedule(
+            set_key,
+            tts_service,
+            choices,
+            language=config.tts_language or "en",
+            voice_name=config.tts_voice_name if config.tts_voice_name else None,
+            pitch=config.tts_pitch,
+            speaking_rate=config.tts_speaking_rate
+        )
+    except Exception as e:
+        print(f"Error scheduling TTS pre-synthesis: {e}")
+
+
+def resolve_tts_provider(config: "ConfigModel") -> str:
+    """
+    Select the TTS provider from the available credentials.
+    
+    Google Cloud TTS (lowest latency) if a service account is available
+    (GOOGLE_APPLICATION_CREDENTIALS or backend/google.json), then ElevenLabs,
+    then OpenAI when it is the configured LLM provider, and pyttsx3 (offline) otherwise.
+    """
+    google_creds = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+    if not google_creds:
+        backend_dir = Path(__file__).parent
+        google_json_path = backend_dir / "google.json"
+        if google_json_path.exists():
+            google_creds = str(google_json_path)
+    
+    if google_creds:
+        return "google"
+    if os.getenv("ELEVEN_LABS_API_KEY") and os.getenv("ELEVEN_LABS_VOICE_ID"):
+        return "elevenlabs"
+    if config.provider == "openai" and os.getenv("OPENAI_API_KEY"):
+        return "openai"
+    return "pyttsx3"
+
+
+# Start playback with the first streamed audio chunk (openai, elevenlabs) instead of the full file
+TTS_STREAMING = os.getenv("TTS_STREAMING", "true").lower() in ("1", "true", "yes")
+
+
+async def speak_text(tts_service: TTSService, text: str, language: str, voice_name: Optional[str] = None,
+                     pitch: Optional[float] = None, speaking_rate: Optional[float] = None) -> Optional[TTSAudio]:
+    """
+    Synthesize text and play it in the backend.
+    
+    With a streaming provider, audio chunks are written to the player as they
+    arrive; cached audio (or audio from a synthesis already in flight) is queued
+    as a whole file. The speech-to-text service is paused during playback.
+    
+    Returns:
+        The synthesized audio (for the base64 response), or None if generation fails
+    """
+    requested_at = time.perf_counter()
+    player = get_audio_player()
+    stream = None
+    on_chunk = None
+    
+    if TTS_STREAMING and tts_service.supports_streaming() and player.supports_streaming():
+        def on_chunk(chunk: bytes) -> bool:
+            # Called from the synthesis worker thread
+            nonlocal stream
+            if stream is None:
+                stream = player.open_stream(
+                    stt_service=speech_to_text_service, provider=tts_service.provider, requested_at=requested_at
+                )
+            return stream.write(chunk)
+    
+    try:
+        audio = await get_async_tts_service().synthesize(
+            tts_service, text, language, voice_name, pitch, speaking_rate, on_chunk=on_chunk
+        )
+    except asyncio.CancelledError:
+        if stream is not None:
+            stream.abort()
+        raise
+    finally:
+        if stream is not None:
+            stream.close()
+    
+    if audio and stream is None:
+        player.play(
+            audio.audio_data, audio.audio_format, stt_service=speech_to_text_service,
+            provider=tts_service.provider, requested_at=requested_at
+        )
+    return audio
+
+
+@app.get("/api/llm/stats", tags=["llm"])
+async def get_llm_stats():
+    """
+    Get LLM service pool, response cache and speculative prefetch statistics.
+    One service (client and structured-output runnables) is kept per (provider, model, temperature).
+    """
+    cache = get_llm_cache()
+    prefetcher = get_choice_prefetcher()
+    return {
+        "pool": get_llm_pool_stats(),
+        "cache": cache.get_stats() if cache is not None else None,
+        "prefetch": prefetcher.get_stats() if prefetcher is not None else None,
+    }
+
+
+@app.delete("/api/llm/cache", status_code=status.HTTP_204_NO_CONTENT, tags=["llm"])
+async def clear_llm_cache():
+    """Clear the LLM response cache."""
+    cache = get_llm_cache()
+    if cache is not None:
+        await asyncio.to_thread(cache.clear)
+
+
+# Keyboard prediction mode:
+# "local": local predictor only, "auto": LLM only when the local predictor has too few words,
+# "blend": local and LLM words interleaved, "llm": LLM only
+KEYBOARD_PREDICTION_MODE = os.getenv("KEYBOARD_PREDICTION_MODE", "auto").lower()
+KEYBOARD_PREDICTION_COUNT = 5
+
+
+async def predict_words_with_llm(request: ChoicesRequest, config: "ConfigModel", user_notes: Optional[str],
+                                 caregiver_description: Optional[str], is_multiple_letters: bool) -> List[str]:
+    """Predict keyboard words with the LLM (raises if the LLM fails)."""
+    # Use LLM to generate predictive words (same pooled service as the communication grid)
+    llm_service = get_llm_service(
+        provider=config.provider,
+        model=config.model,
+        temperature=config.temperature
+    )
+    
+    system_prompt = (
+        config.keyboard_multiple_letters_prompt if is_multiple_letters 
+        else config.keyboard_prompt
+    ) or "You are a helpful assistant that suggests words for text input."
+    
+    # Generate choices (words) using LLM
+    choices = await llm_service.generate_choices(
+        system_prompt=system_prompt,
+        conversation_history=request.conversation_history or [],
+        user_notes=user_notes,
+        caregiver_description=caregiver_description,
+        current_text=request.current_text or "",
+        use_fallback=False
+    )
+    
+    # choices is a list of dicts with "text" and "probability" keys
+    return [choice["text"] for choice in choices if choice.get("text")]
+
+
+def merge_predicted_words(local_words: List[str], llm_words: List[str], interleave: bool) -> List[str]:
+    """Merge local and LLM words without duplicates (local first, or alternating)."""
+    if interleave:
+        ordered = [word for pair in zip(local_words, llm_words) for word in pair]
+        shorter = min(len(local_words), len(llm_words))
+        ordered += local_words[shorter:] + llm_words[shorter:]
+    else:
+        ordered = local_words + llm_words
+    
+    words = []
+    seen = set()
+    for word in ordered:
+        if word.lower() not in seen:
+            seen.add(word.lower())
+            words.append(word)
+    return words[:KEYBOARD_PREDICTION_COUNT]
 
 
 @app.post("/api/keyboard/predictions", tags=["keyboard"])
-async def get_keyboard_predictions(request: ChoicesRequest, session: Session = Depends(get_session)):
+async def get_keyboard_predictions(request: ChoicesRequest, session: AsyncSession = Depends(get_async_session)):
     """
     Get predictive words for the keyboard based on current text.
-    Returns up to 5 words suggested by LLM.
+    Returns up to 5 words from the local predictor (trained on the communication
+    history and the tts_language lexicon), completed or blended with LLM
+    suggestions depending on KEYBOARD_PREDICTION_MODE.
     """
     try:
         config = load_config()
-        
-        # Get user and caregiver info if provided
-        user_notes = None
-        caregiver_description = None
-        
-        if request.user_id:
-            user = session.get(User, request.user_id)
-            if user:
-                user_notes = user.notes
-        
-        if request.caregiver_id:
-            caregiver = session.get(Caregiver, request.caregiver_id)
-            if caregiver:
-                caregiver_description = caregiver.description
-        
-        # Use LLM to generate predictive words
-        llm_service = get_llm_service()
-        
-        # Create a simple prompt for word prediction
-        conversation_history = request.conversation_history or []
         current_text = request.current_text or ""
         
         # Determine which prompt to use based on current text
@@ -377,25 +769,56 @@ async def get_keyboard_predictions(request: ChoicesRequest, session: Session = D
         text_words = current_text.split() if current_text else []
         is_multiple_letters = len(text_words) > 1 and all(len(word) == 1 for word in text_words)
         
-        system_prompt = (
-            config.keyboard_multiple_letters_prompt if is_multiple_letters 
-            else config.keyboard_prompt
-        ) or "You are a helpful assistant that suggests words for text input."
+        # Local predictions take microseconds and work offline (None while the model is training)
+        local_words = []
+        if KEYBOARD_PREDICTION_MODE != "llm":
+            predictor = get_keyboard_predictor(config.tts_language or "fr", engine)
+            if predictor is not None:
+                if request.user_id:
+                    # Personalized with the words the user selected before. Runs in a worker thread
+                    # holding the store lock: the first use of a user loads its snapshot from the
+                    # database, and selections update the model concurrently
+                    local_words = await asyncio.to_thread(
+                        get_user_model_store(engine).read, request.user_id,
+                        lambda user_model: predictor.predict(
+                            current_text, KEYBOARD_PREDICTION_COUNT, multiple_letters=is_multiple_letters,
+                            user_model=user_model
+                        )
+                    )
+                else:
+                    local_words = predictor.predict(
+                        current_text, KEYBOARD_PREDICTION_COUNT, multiple_letters=is_multiple_letters
+                    )
         
-        # Generate choices (words) using LLM
-        choices = await llm_service.generate_choices(
-            system_prompt=system_prompt,
-            conversation_history=conversation_history,
-            user_notes=user_notes,
-            caregiver_description=caregiver_description,
-            current_text=current_text
-        )
+        if KEYBOARD_PREDICTION_MODE == "local" or (
+            KEYBOARD_PREDICTION_MODE == "auto" and len(local_words) >= KEYBOARD_PREDICTION_COUNT
+        ):
+            return {"words": local_words, "source": "local"}
         
-        # Extract words from choices (limit to 5)
-        # choices is a list of dicts with "text" and "probability" keys
-        words = [choice["text"] for choice in choices[:5] if choice.get("text")]
+        # Single flight per user/session: an identical in-flight request shares the LLM call,
+        # a newer current_text cancels the outstanding one
+        user_notes, caregiver_description = await get_choice_context(request, session)
+        flow_key = ("keyboard", request.user_id, request.caregiver_id, request.session_id)
+        flight_key = request_key(
+            f"{config.provider}:{config.model}:{config.temperature}:{is_multiple_letters}", request.conversation_history or [],
+            current_text, request.user_id, request.caregiver_id
+        )
+        try:
+            llm_words = await get_keyboard_flights().run(
+                flow_key, flight_key,
+                lambda: predict_words_with_llm(
+                    request, config, user_notes, caregiver_description, is_multiple_letters
+                )
+            )
+        except SupersededError:
+            # A newer request of the same user replaced this one; the frontend discards this answer
+            return {"words": local_words, "source": "local", "superseded": True}
+        except Exception as e:
+            print(f"Error generating keyboard predictions with LLM: {e}")
+            return {"words": local_words, "source": "local"}
         
-        return {"words": words}
+        words = merge_predicted_words(local_words, llm_words, interleave=KEYBOARD_PREDICTION_MODE == "blend")
+        return {"words": words, "source": "blend" if local_words else "llm"}
     
     except Exception as e:
         print(f"Error generating keyboard predictions: {e}")
@@ -403,6 +826,44 @@ async def get_keyboard_predictions(request: ChoicesRequest, session: Session = D
         return {"words": []}
 
 
+class KeyboardCommitRequest(BaseModel):
+    """Word(s) committed on the keyboard page"""
+    text: str
+    user_id: Optional[int] = None
+    context: Optional[str] = None  # Text before the committed word(s)
+
+
+@app.post("/api/keyboard/commit", tags=["keyboard"])
+async def commit_keyboard_text(request: KeyboardCommitRequest):
+    """Learn from word(s) committed on the keyboard to personalize the user's predictions."""
+    await asyncio.to_thread(
+        get_user_model_store(engine).observe, request.user_id, request.text, context=request.context
+    )
+    return {"success": True}
+
+
+@app.get("/api/keyboard/predictor", tags=["keyboard"])
+async def get_keyboard_predictor_stats():
+    """Get the local keyboard predictor size and latency statistics, the loaded per-user models
+    and the completed vs cancelled LLM prediction calls."""
+    predictor = get_keyboard_predictor(load_config().tts_language or "fr", engine)
+    return {
+        "mode": KEYBOARD_PREDICTION_MODE,
+        "predictor": predictor.get_stats() if predictor is not None else None,
+        "users": get_user_model_store(engine).get_stats(),
+        "llm_calls": get_keyboard_flights().get_stats(),
+    }
+
+
+@app.post("/api/keyboard/predictor/retrain", tags=["keyboard"])
+async def retrain_keyboard_predictor_endpoint():
+    """Retrain the local keyboard predictor from the communication history."""
+    predictor = await asyncio.to_thread(
+        retrain_keyboard_predictor, load_config().tts_language or "fr", engine
+    )
+    return {"mode": KEYBOARD_PREDICTION_MODE, "predictor": predictor.get_stats()}
+
+
 @app.post("/api/keyboard/tts", tags=["keyboard"])
 async def keyboard_tts(request: dict, session: Session = Depends(get_session)):
     """
@@ -414,29 +875,16 @@ async def keyboard_tts(request: dict, session: Session = Depends(get_session)):
             return {"audio_base64": None}
         
         # Determine TTS provider
-        tts_provider = "pyttsx3"
-        # Check for Google Cloud service account credentials
-        google_creds = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
-        if not google_creds:
-            backend_dir = Path(__file__).parent
-            google_json_path = backend_dir / "google.json"
-            if google_json_path.exists():
-                google_creds = str(google_json_path)
-        
-        if google_creds:
-            tts_provider = "google"
-        elif os.getenv("ELEVEN_LABS_API_KEY") and os.getenv("ELEVEN_LABS_VOICE_ID"):
-            tts_provider = "elevenlabs"
-        elif load_config().provider == "openai" and os.getenv("OPENAI_API_KEY"):
-            tts_provider = "openai"
+        tts_provider = resolve_tts_provider(load_config())
         
         tts_service = get_tts_service(provider=tts_provider)
         
         # Get TTS config from settings
         tts_config = load_config()
         
-        # Generate audio data with config values
-        audio_data = tts_service.generate_speech(
+        # Generate and play audio (base64 comes precomputed from the TTS cache)
+        audio = await speak_text(
+            tts_service,
             text=text,
             language=tts_config.tts_language or "fr",
             voice_name=tts_config.tts_voice_name if tts_config.tts_voice_name else None,
@@ -444,24 +892,9 @@ async def keyboard_tts(request: dict, session: Session = Depends(get_session)):
             speaking_rate=tts_config.tts_speaking_rate if tts_config.tts_speaking_rate is not None else None
         )
         
-        if audio_data:
-            # Determine audio format based on provider
-            if tts_provider == "google" or tts_provider == "elevenlabs":
-                audio_format = "mp3"
-            elif tts_provider == "openai":
-                audio_format = "wav"
-            else:  # pyttsx3
-                audio_format = "wav"
-            
-            # Convert to base64 for frontend (if needed)
-            import base64
-            audio_base64 = base64.b64encode(audio_data).decode('utf-8')
-            
-            # Play audio asynchronously in backend
-            print(f"Playing keyboard TTS audio in backend (format: {audio_format})")
-            tts_service.play_audio_async(audio_data, audio_format, stt_service=speech_to_text_service)
-            
-            return {"audio_base64": audio_base64}
+        if audio:
+            print(f"Playing keyboard TTS audio in backend ({tts_provider})")
+            return {"audio_base64": audio.audio_base64}
         
         return {"audio_base64": None}
     
@@ -470,8 +903,54 @@ async def keyboard_tts(request: dict, session: Session = Depends(get_session)):
         return {"audio_base64": None}
 
 
+@app.get("/api/tts/stats", tags=["tts"])
+async def get_tts_stats():
+    """
+    Get TTS provider latency, cache, pre-synthesis and playback (time to first audio) statistics.
+    Cold calls are the first request on a newly created provider client, warm calls reuse it.
+    """
+    prefetcher = get_tts_prefetcher(get_async_tts_service())
+    return {
+        "latency": get_tts_latency_stats(),
+        "cache": get_tts_cache_stats(),
+        "prefetch": prefetcher.get_stats() if prefetcher is not None else None,
+        "playback": get_audio_player().get_stats(),
+    }
+
+
+class TTSCacheTrimRequest(BaseModel):
+    """Request to trim the TTS disk cache"""
+    max_bytes: Optional[int] = None  # Defaults to the configured budget
+    max_age_days: Optional[float] = None  # Defaults to the configured maximum age
+
+
+@app.get("/api/tts/cache", tags=["tts"])
+async def get_tts_cache(top: int = 20):
+    """Inspect the TTS disk cache (size, limits, evictions and most used entries)"""
+    return await asyncio.to_thread(get_tts_disk_cache().get_stats, top)
+
+
+@app.post("/api/tts/cache/trim", tags=["tts"])
+async def trim_tts_cache(request: TTSCacheTrimRequest):
+    """Evict TTS disk cache entries until within the given size and age limits"""
+    # 0 is allowed: max_bytes=0 empties the cache, max_age_days=0 evicts every entry not accessed now
+    if request.max_bytes is not None and request.max_bytes < 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="max_bytes must be zero or a positive number"
+        )
+    if request.max_age_days is not None and request.max_age_days < 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="max_age_days must be zero or a positive number"
+        )
+    max_age_seconds = request.max_age_days * 24 * 3600 if request.max_age_days is not None else None
+    result = await asyncio.to_thread(get_tts_disk_cache().trim, request.max_bytes, max_age_seconds)
+    return {"success": True, **result}
+
+
 @app.post("/api/communication/select", tags=["communication"])
-async def select_choice(request: ChoiceSelectionRequest, db_session: Session = Depends(get_session)):
+async def select_choice(request: ChoiceSelectionRequest, db_session: AsyncSession = Depends(get_async_session)):
     """
     Handle selection of a choice.
     This triggers text-to-speech generation for the selected choice.
@@ -480,42 +959,24 @@ async def select_choice(request: ChoiceSelectionRequest, db_session: Session = D
         # Load config to get TTS provider preference
         config = load_config()
         
-        # Default to pyttsx3 for offline TTS, but could be configurable
-        tts_provider = "pyttsx3"
-        
-        # If Google Cloud service account is available, use Google Cloud TTS (lowest latency)
-        # Check for GOOGLE_APPLICATION_CREDENTIALS or google.json file
-        google_creds = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
-        if not google_creds:
-            backend_dir = Path(__file__).parent
-            google_json_path = backend_dir / "google.json"
-            if google_json_path.exists():
-                google_creds = str(google_json_path)
-        
-        if google_creds:
-            tts_provider = "google"
-        # Fallback to ElevenLabs if Google is not available
-        elif os.getenv("ELEVEN_LABS_API_KEY") and os.getenv("ELEVEN_LABS_VOICE_ID"):
-            tts_provider = "elevenlabs"
-        # Fallback to OpenAI if neither Google nor ElevenLabs is available
-        elif config.provider == "openai" and os.getenv("OPENAI_API_KEY"):
-            tts_provider = "openai"
+        # Determine TTS provider
+        tts_provider = resolve_tts_provider(config)
         
         # Get TTS service
         tts_service = get_tts_service(provider=tts_provider)
         
         # Generate speech for the selected choice text
         audio_base64 = None
-        audio_data = None
-        audio_format = "mp3"  # Default format (Google Cloud TTS returns MP3)
         
         if request.choice_text:
             # Get TTS config from settings
             tts_config = load_config()
             print(f"Generating TTS for text: '{request.choice_text}' using provider: {tts_provider}")
             
-            # Generate audio data with config values
-            audio_data = tts_service.generate_speech(
+            # Generate and play audio (base64 comes precomputed from the TTS cache)
+            # The STT service is paused during playback
+            audio = await speak_text(
+                tts_service,
                 text=request.choice_text,
                 language=tts_config.tts_language or "en",
                 voice_name=tts_config.tts_voice_name if tts_config.tts_voice_name else None,
@@ -523,48 +984,36 @@ async def select_choice(request: ChoiceSelectionRequest, db_session: Session = D
                 speaking_rate=tts_config.tts_speaking_rate if tts_config.tts_speaking_rate is not None else None
             )
             
-            if audio_data:
-                # Determine audio format based on provider
-                if tts_provider == "google" or tts_provider == "elevenlabs":
-                    audio_format = "mp3"
-                elif tts_provider == "openai":
-                    audio_format = "wav"
-                else:  # pyttsx3
-                    audio_format = "wav"
-                
-                # Convert to base64 for frontend (if needed)
-                audio_base64 = base64.b64encode(audio_data).decode('utf-8')
-                
-                # Play audio asynchronously in backend
-                # Pass STT service to pause it during playback
-                print(f"Playing audio in backend (format: {audio_format})")
-                tts_service.play_audio_async(audio_data, audio_format, stt_service=speech_to_text_service)
-                
-                print(f"TTS generated and playback started, audio length: {len(audio_data)} bytes")
+            if audio:
+                audio_base64 = audio.audio_base64
+                print(f"TTS generated and playback started, audio length: {audio.size} bytes")
             else:
                 print("WARNING: TTS generation returned None")
         
+        # The choice set is no longer offered; drop pre-synthesis of the other choices
+        prefetcher = get_tts_prefetcher(get_async_tts_service())
+        if prefetcher is not None:
+            prefetcher.cancel(request.session_id)
+        
+        # Learn from the selection to personalize the user's keyboard predictions
+        if request.choice_text:
+            try:
+                user_id = request.user_id
+                if user_id is None and request.session_id:
+                    comm_session = await db_session.get(CommunicationSession, request.session_id)
+                    user_id = comm_session.user_id if comm_session else None
+                # Loading the user's model on first use queries the database: run it off the event loop
+                await asyncio.to_thread(
+                    get_user_model_store(engine).observe, user_id, request.choice_text, context=request.current_text
+                )
+            except Exception as e:
+                print(f"Error learning from selected choice: {e}")
+        
         # Update session step with selected choice if session_id is provided
+        # (queued behind the insert of the step, written with the session updated_at)
         if request.session_id and request.step_number is not None and request.choice_text:
             try:
-                from sqlmodel import select as sql_select
-                step_statement = sql_select(SessionStep).where(
-                    SessionStep.session_id == request.session_id,
-                    SessionStep.step_number == request.step_number
-                )
-                step = db_session.exec(step_statement).first()
-                if step:
-                    step.selected_choice_text = request.choice_text
-                    step.timestamp = datetime.utcnow()
-                    db_session.add(step)
-                    
-                    # Update session updated_at
-                    comm_session = db_session.get(CommunicationSession, request.session_id)
-                    if comm_session:
-                        comm_session.updated_at = datetime.utcnow()
-                        db_session.add(comm_session)
-                    
-                    db_session.commit()
+                get_step_writer(engine).select_choice(request.session_id, request.step_number, request.choice_text)
             except Exception as e:
                 print(f"Error updating session step with selected choice: {e}")
         
@@ -583,51 +1032,22 @@ async def select_choice(request: ChoiceSelectionRequest, db_session: Session = D
         try:
             if request.choice_text:
                 config = load_config()
-                tts_provider = "pyttsx3"
-                # Check for Google Cloud service account credentials
-                google_creds = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
-                if not google_creds:
-                    backend_dir = Path(__file__).parent
-                    google_json_path = backend_dir / "google.json"
-                    if google_json_path.exists():
-                        google_creds = str(google_json_path)
-                
-                if google_creds:
-                    tts_provider = "google"
-                elif os.getenv("ELEVEN_LABS_API_KEY") and os.getenv("ELEVEN_LABS_VOICE_ID"):
-                    tts_provider = "elevenlabs"
-                elif config.provider == "openai" and os.getenv("OPENAI_API_KEY"):
-                    tts_provider = "openai"
+                tts_provider = resolve_tts_provider(config)
                 tts_service = get_tts_service(provider=tts_provider)
                 
                 # Get TTS config from settings
                 tts_config = load_config()
                 
-                # Generate audio data with config values
-                audio_data = tts_service.generate_speech(
+                # Generate and play audio with config values
+                audio = await speak_text(
+                    tts_service,
                     text=request.choice_text,
                     language=tts_config.tts_language or "en",
                     voice_name=tts_config.tts_voice_name if tts_config.tts_voice_name else None,
                     pitch=tts_config.tts_pitch if tts_config.tts_pitch is not None else None,
                     speaking_rate=tts_config.tts_speaking_rate if tts_config.tts_speaking_rate is not None else None
                 )
-                
-                if audio_data:
-                    # Determine audio format
-                    if tts_provider == "google" or tts_provider == "elevenlabs":
-                        audio_format = "mp3"
-                    elif tts_provider == "openai":
-                        audio_format = "wav"
-                    else:
-                        audio_format = "wav"
-                    
-                    # Convert to base64
-                    audio_base64 = base64.b64encode(audio_data).decode('utf-8')
-                    
-                    # Play audio asynchronously in backend
-                    tts_service.play_audio_async(audio_data, audio_format, stt_service=speech_to_text_service)
-                else:
-                    audio_base64 = None
+                audio_base64 = audio.audio_base64 if audio else None
         except Exception as tts_error:
             print(f"Error generating TTS in exception handler: {tts_error}")
         
@@ -652,6 +1072,12 @@ async def process_calibration(request: CalibrationRequest, session: Session = De
     return process_calibration_data(request, session)
 
 
+@app.post("/api/calibration/process-packed", response_model=CalibrationResponse, tags=["calibration"])
+async def process_packed_calibration(request: PackedCalibrationRequest, session: Session = Depends(get_session)):
+    """Process calibration data sent as packed binary sample arrays (faster for large uploads)"""
+    return process_packed_calibration_data(request, session)
+
+
 # Helper functions for JSON serialization/deserialization
 def serialize_eye_tracking_setup(setup: Optional[EyeTrackingSetup]) -> Optional[dict]:
     """Serialize EyeTrackingSetup to dict for JSON storage"""
@@ -940,31 +1366,58 @@ async def create_session(session_data: CommunicationSessionCreate, db_session: S
     return session_to_response(session, db_session)
 
 
-@app.get("/api/communication/sessions", response_model=List[CommunicationSessionResponse], tags=["communication"])
+@app.get("/api/communication/sessions", response_model=CommunicationSessionPage, tags=["communication"])
 async def list_sessions(
-    skip: int = 0,
+    cursor: Optional[str] = None,
     limit: int = 100,
     user_id: Optional[int] = None,
     caregiver_id: Optional[int] = None,
+    summary: bool = False,
     db_session: Session = Depends(get_session)
 ):
-    """List all communication sessions with optional filtering"""
+    """
+    List communication sessions, most recent first, with optional filtering
+    
+    Pages are keyset-paginated on (started_at, id): pass the next_cursor of a page to get the
+    following one (null on the last page). The steps of a page are loaded with one batched query.
+    With summary=true, sessions carry step_count and last_activity_at instead of their steps.
+    """
+    limit = max(1, min(limit, 1000))
     statement = select(CommunicationSession)
     
     if user_id is not None:
         statement = statement.where(CommunicationSession.user_id == user_id)
     if caregiver_id is not None:
         statement = statement.where(CommunicationSession.caregiver_id == caregiver_id)
+    if cursor:
+        started_at, last_id = decode_session_cursor(cursor)
+        statement = statement.where(
+            tuple_(CommunicationSession.started_at, CommunicationSession.id) < tuple_(started_at, last_id)
+        )
     
-    statement = statement.order_by(CommunicationSession.started_at.desc()).offset(skip).limit(limit)
+    # One more row than the page tells whether there is a next page
+    statement = statement.order_by(
+        CommunicationSession.started_at.desc(), CommunicationSession.id.desc()
+    ).limit(limit + 1)
     sessions = db_session.exec(statement).all()
+    next_cursor = encode_session_cursor(sessions[limit - 1]) if len(sessions) > limit else None
+    sessions = sessions[:limit]
+    session_ids = [session.id for session in sessions]
+    
+    if summary:
+        summaries = load_session_summaries(db_session, session_ids)
+        responses = [session_to_summary(session, summaries.get(session.id)) for session in sessions]
+    else:
+        steps_by_session = load_session_steps(db_session, session_ids)
+        responses = [session_to_response(session, db_session, steps_by_session[session.id]) for session in sessions]
     
-    return [session_to_response(session, db_session) for session in sessions]
+    return CommunicationSessionPage(sessions=responses, next_cursor=next_cursor)
 
 
 @app.get("/api/communication/sessions/{session_id}", response_model=CommunicationSessionResponse, tags=["communication"])
 async def get_communication_session(session_id: int, db_session: Session = Depends(get_session)):
     """Get a specific communication session by ID with all steps"""
+    await wait_for_queued_steps(session_id)
     session = db_session.get(CommunicationSession, session_id)
     if not session:
         raise HTTPException(
@@ -981,6 +1434,7 @@ async def update_session(
     db_session: Session = Depends(get_session)
 ):
     """Update an existing communication session (e.g., set ended_at)"""
+    await wait_for_queued_steps(session_id)
     session = db_session.get(CommunicationSession, session_id)
     if not session:
         raise HTTPException(
@@ -1003,6 +1457,7 @@ async def update_session(
 @app.delete("/api/communication/sessions/{session_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["communication"])
 async def delete_session(session_id: int, db_session: Session = Depends(get_session)):
     """Delete a communication session and all its steps"""
+    await wait_for_queued_steps(session_id)
     session = db_session.get(CommunicationSession, session_id)
     if not session:
         raise HTTPException(
@@ -1025,11 +1480,11 @@ async def delete_session(session_id: int, db_session: Session = Depends(get_sess
 async def create_session_step(
     session_id: int,
     step_data: SessionStepCreate,
-    db_session: Session = Depends(get_session)
+    db_session: AsyncSession = Depends(get_async_session)
 ):
     """Create a new step in a communication session"""
     # Verify session exists
-    session = db_session.get(CommunicationSession, session_id)
+    session = await db_session.get(CommunicationSession, session_id)
     if not session:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -1041,7 +1496,12 @@ async def create_session_step(
     if step_data.choices:
         choices_json = [{"text": c.get("text", ""), "probability": c.get("probability", 0.0)} for c in step_data.choices]
     
-    step = SessionStep(
+    await db_session.close()
+    
+    # Written by the write-behind queue in one transaction with the session updated_at (batched with
+    # other queued steps), awaited for the step id without waiting for the batch window
+    step_writer = get_step_writer(engine)
+    written = step_writer.add_step(
         session_id=session_id,
         step_number=step_data.step_number,
         message_role=step_data.message_role,
@@ -1049,20 +1509,32 @@ async def create_session_step(
         choices_json=choices_json,
         selected_choice_text=step_data.selected_choice_text
     )
-    
-    db_session.add(step)
-    db_session.commit()
-    db_session.refresh(step)
-    
-    # Update session updated_at
-    session.updated_at = datetime.utcnow()
-    db_session.add(session)
-    db_session.commit()
+    step_writer.barrier(session_id)
+    step = await asyncio.wrap_future(written)
     
     return step_to_response(step)
 
 
+@app.get("/api/database/stats", tags=["database"])
+async def get_database_stats():
+    """Get connection pool and write-behind step queue statistics"""
+    return {
+        "pool": engine.pool.status(),
+        "step_writer": get_step_writer(engine).get_stats(),
+    }
+
+
 # Helper functions for session responses
+async def wait_for_queued_steps(session_id: int) -> None:
+    """Wait until the queued step writes of a session are committed (read-your-writes)"""
+    barrier = get_step_writer(engine).barrier(session_id)
+    if barrier is not None:
+        try:
+            await asyncio.wrap_future(barrier)
+        except Exception:
+            pass  # A failed write was reported by the writer; the session is read as stored
+
+
 def step_to_response(step: SessionStep) -> SessionStepResponse:
     """Convert SessionStep model to SessionStepResponse"""
     choices = None
@@ -1081,11 +1553,17 @@ def step_to_response(step: SessionStep) -> SessionStepResponse:
     )
 
 
-def session_to_response(session: CommunicationSession, db_session: Session) -> CommunicationSessionResponse:
-    """Convert CommunicationSession model to CommunicationSessionResponse with steps"""
-    # Get all steps for this session
-    steps_statement = select(SessionStep).where(SessionStep.session_id == session.id).order_by(SessionStep.step_number)
-    steps = db_session.exec(steps_statement).all()
+def session_to_response(session: CommunicationSession, db_session: Session,
+                        steps: Optional[List[SessionStep]] = None) -> CommunicationSessionResponse:
+    """Convert CommunicationSession model to CommunicationSessionResponse with steps
+    
+    Args:
+        session: Session row
+        db_session: Database session (used to load the steps when not given)
+        steps: Steps of the session, ordered by step number (e.g. from load_session_steps)
+    """
+    if steps is None:
+        steps = load_session_steps(db_session, [session.id]).get(session.id, [])
     
     return CommunicationSessionResponse(
         id=session.id,
@@ -1099,6 +1577,83 @@ def session_to_response(session: CommunicationSession, db_session: Session) -> C
     )
 
 
+def encode_session_cursor(session: CommunicationSession) -> str:
+    """Opaque cursor of the last session of a page (its started_at and id)"""
+    key = f"{session.started_at.isoformat()}|{session.id}"
+    return base64.urlsafe_b64encode(key.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_session_cursor(cursor: str) -> tuple:
+    """Decode a session listing cursor into (started_at, id)"""
+    try:
+        key = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        started_at, session_id = key.rsplit("|", 1)
+        return datetime.fromisoformat(started_at), int(session_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid session cursor"
+        )
+
+
+# Bound parameters per IN (...) query (SQLite builds before 3.32 allow 999 variables)
+SESSION_BATCH_SIZE = 500
+
+
+def load_session_steps(db_session: Session, session_ids: List[int]) -> Dict[int, List[SessionStep]]:
+    """
+    Load the steps of several sessions with one IN (...) query per batch of ids.
+    
+    Returns:
+        Steps ordered by step number, grouped by session id
+    """
+    steps_by_session: Dict[int, List[SessionStep]] = {session_id: [] for session_id in session_ids}
+    for i in range(0, len(session_ids), SESSION_BATCH_SIZE):
+        statement = (
+            select(SessionStep)
+            .where(SessionStep.session_id.in_(session_ids[i:i + SESSION_BATCH_SIZE]))
+            .order_by(SessionStep.session_id, SessionStep.step_number)
+        )
+        for step in db_session.exec(statement):
+            steps_by_session[step.session_id].append(step)
+    return steps_by_session
+
+
+def load_session_summaries(db_session: Session, session_ids: List[int]) -> Dict[int, tuple]:
+    """
+    Step count and last step timestamp of several sessions with one aggregate query per batch of ids.
+    
+    Returns:
+        (step_count, last_step_at) by session id (sessions without steps are missing)
+    """
+    summaries: Dict[int, tuple] = {}
+    for i in range(0, len(session_ids), SESSION_BATCH_SIZE):
+        statement = (
+            select(SessionStep.session_id, func.count(SessionStep.id), func.max(SessionStep.timestamp))
+            .where(SessionStep.session_id.in_(session_ids[i:i + SESSION_BATCH_SIZE]))
+            .group_by(SessionStep.session_id)
+        )
+        for session_id, step_count, last_step_at in db_session.exec(statement):
+            summaries[session_id] = (step_count, last_step_at)
+    return summaries
+
+
+def session_to_summary(session: CommunicationSession, summary: Optional[tuple]) -> CommunicationSessionResponse:
+    """Convert CommunicationSession model to CommunicationSessionResponse with step count instead of steps"""
+    step_count, last_step_at = summary or (0, None)
+    return CommunicationSessionResponse(
+        id=session.id,
+        user_id=session.user_id,
+        caregiver_id=session.caregiver_id,
+        started_at=session.started_at,
+        ended_at=session.ended_at,
+        created_at=session.created_at,
+        updated_at=session.updated_at,
+        step_count=step_count,
+        last_activity_at=max(filter(None, (last_step_at, session.updated_at)), default=None)
+    )
+
+
 # Configuration file path
 CONFIG_FILE = Path(__file__).parent / "config.json"
 
@@ -1262,6 +1817,200 @@ async def websocket_speech_to_text(websocket: WebSocket):
         print(f"WebSocket client disconnected. Total connections: {len(speech_websocket_connections)}")
 
 
+# Processed gaze WebSocket endpoint
+GAZE_FILTER = os.getenv("GAZE_FILTER", "one_euro")
+
+
+@app.websocket("/ws/gaze")
+async def websocket_gaze(websocket: WebSocket):
+    """
+    WebSocket endpoint streaming processed gaze frames.
+    
+    The client sends {"type": "config", "user_id", "skip_calibration", "filter", "filter_params",
+    "viewport", "format"} (again whenever its window changes) and receives frames in window
+    coordinates, already calibrated and smoothed, plus {"type": "status", "tracker_connected"} updates.
+    With "format": "binary" the frames are binary header and batch messages (see gaze_protocol);
+    otherwise (JSON-compat) they are {"type": "gaze", "frames": [[timestamp_ms, x, y], ...]}.
+    
+    The client can register its selectable targets with {"type": "layout", "targets": [{"id", "x", "y",
+    "width", "height"}], "dwell_time" (seconds, default eye_tracking.dwell_time), "method" ("ivt" or "idt"),
+    "params"} and then receives {"type": "dwell_progress", "target_id", "progress"} and
+    {"type": "dwell_select", "target_id"} events (an empty target list stops dwell detection).
+    """
+    pipeline = get_gaze_pipeline()
+    await websocket.accept()
+    if pipeline is None:
+        await websocket.send_json({"type": "error", "message": "Gaze pipeline is disabled"})
+        await websocket.close()
+        return
+    
+    subscriber = GazeSubscriber(websocket.send_json, websocket.send_bytes, filter_name=GAZE_FILTER)
+    pipeline.subscribe(subscriber)
+    sender = asyncio.create_task(subscriber.run())
+    print(f"Gaze client connected. Total clients: {len(pipeline.subscribers)}")
+    
+    async def send_status():
+        """Report the tracker connection state whenever it changes"""
+        connected = None
+        while True:
+            if pipeline.tracker_connected != connected:
+                connected = pipeline.tracker_connected
+                await websocket.send_json({"type": "status", "tracker_connected": connected})
+            await asyncio.sleep(0.5)
+    
+    status_task = asyncio.create_task(send_status())
+    try:
+        while True:
+            message = await websocket.receive_json()
+            if message.get("type") == "layout":
+                try:
+                    targets = [DwellTarget(**target) for target in message.get("targets") or []]
+                    dwell_time = message.get("dwell_time")
+                    if dwell_time is None:
+                        dwell_time = load_config().eye_tracking.dwell_time
+                    subscriber.set_layout(DwellDetector(
+                        targets, dwell_time=dwell_time, method=message.get("method") or "ivt",
+                        **(message.get("params") or {})
+                    ) if targets else None)
+                except Exception as e:
+                    await websocket.send_json({"type": "error", "message": f"Invalid dwell layout: {e}"})
+                continue
+            if message.get("type") != "config":
+                continue
+            try:
+                calibration = None
+                if not message.get("skip_calibration"):
+                    calibration = await asyncio.to_thread(load_user_calibration, engine, message.get("user_id"))
+                subscriber.configure(
+                    viewport=Viewport(**message["viewport"]) if message.get("viewport") else None,
+                    calibration=calibration,
+                    filter_name=message.get("filter"),
+                    filter_params=message.get("filter_params"),
+                    binary=message["format"] == "binary" if message.get("format") else None,
+                )
+            except Exception as e:
+                await websocket.send_json({"type": "error", "message": f"Invalid gaze config: {e}"})
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"Gaze WebSocket error: {e}")
+    finally:
+        pipeline.unsubscribe(subscriber)
+        sender.cancel()
+        status_task.cancel()
+        print(f"Gaze client disconnected. Total clients: {len(pipeline.subscribers)}")
+
+
+@app.get("/api/gaze/stats", tags=["gaze"])
+async def get_gaze_stats():
+    """Get gaze pipeline tracker connection and per-client statistics."""
+    pipeline = get_gaze_pipeline()
+    return pipeline.get_stats() if pipeline is not None else {"enabled": False}
+
+
+class GazeRecordingRequest(BaseModel):
+    """Communication session whose gaze stream is recorded"""
+    session_id: int
+
+
+@app.post("/api/gaze/recordings/start", tags=["gaze"])
+async def start_gaze_recording(request: GazeRecordingRequest, session: Session = Depends(get_session)):
+    """Record the raw tracker gaze stream for a communication session (ends the current recording)."""
+    pipeline = get_gaze_pipeline()
+    if pipeline is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Gaze pipeline is disabled"
+        )
+    if session.get(CommunicationSession, request.session_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Communication session with id {request.session_id} not found"
+        )
+    recorder = get_gaze_recorder(engine)
+    recorder.start(request.session_id)
+    pipeline.add_listener(recorder)
+    return {"success": True, "recorder": recorder.get_stats()}
+
+
+@app.post("/api/gaze/recordings/stop", tags=["gaze"])
+async def stop_gaze_recording():
+    """Stop recording the gaze stream."""
+    recorder = get_gaze_recorder(engine)
+    session_id = recorder.stop()
+    pipeline = get_gaze_pipeline()
+    if pipeline is not None:
+        pipeline.remove_listener(recorder)
+    return {"success": True, "session_id": session_id}
+
+
+@app.get("/api/gaze/recordings/stats", tags=["gaze"])
+async def get_gaze_recorder_stats():
+    """Get gaze recorder segment and index statistics."""
+    return get_gaze_recorder(engine).get_stats()
+
+
+@app.get("/api/gaze/recordings/{session_id}", tags=["gaze"])
+async def get_gaze_recording(session_id: int):
+    """Get a summary of the gaze samples recorded during a session."""
+    records = await asyncio.to_thread(get_gaze_recorder(engine).read_session, session_id)
+    if len(records) == 0:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No gaze recording for session {session_id}"
+        )
+    return {
+        "session_id": session_id,
+        "frames": len(records),
+        "start_time": float(records["t"][0]),
+        "end_time": float(records["t"][-1]),
+        "duration_ms": float(records["t"][-1] - records["t"][0]),
+    }
+
+
+@app.get("/api/gaze/recordings/{session_id}/export", tags=["gaze"])
+async def export_gaze_recording(session_id: int):
+    """Download the gaze samples recorded during a session as a NumPy .npy structured array."""
+    return Response(
+        content=await asyncio.to_thread(get_gaze_recorder(engine).export_session, session_id),
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="gaze_session_{session_id}.npy"'}
+    )
+
+
+@app.websocket("/ws/gaze/replay/{session_id}")
+async def websocket_gaze_replay(websocket: WebSocket, session_id: int, speed: float = 1.0,
+                                format: str = "tracker", loop: bool = False):
+    """
+    Replay the gaze samples recorded during a session.
+    
+    speed: 1.0 for real time, higher to accelerate, 0 for as fast as possible.
+    format: "tracker" (tracker JSON messages: set GAZE_TRACKER_URL to this endpoint to load-test
+    the gaze pipeline), "json" (JSON-compat batches) or "binary" (binary gaze protocol).
+    loop: restart from the beginning at the end of the recording.
+    """
+    await websocket.accept()
+    if format not in ("tracker", "json", "binary"):
+        await websocket.close(code=1003, reason="format must be one of: tracker, json, binary")
+        return
+    records = await asyncio.to_thread(get_gaze_recorder(engine).read_session, session_id)
+    if len(records) == 0:
+        await websocket.close(code=1003, reason=f"No gaze recording for session {session_id}")
+        return
+    
+    print(f"Gaze Replay: Session {session_id}, {len(records)} frames at speed {speed}")
+    try:
+        while True:
+            await replay_gaze_recording(records, websocket.send_text, websocket.send_bytes, speed, format)
+            if not loop:
+                break
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"Gaze Replay WebSocket error: {e}")
+
+
 # Speech-to-text API endpoints
 @app.post("/api/speech-to-text/start", tags=["speech-to-text"])
 async def start_speech_to_text():
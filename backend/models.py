@@ -1,5 +1,5 @@
 from sqlmodel import SQLModel, Field, Column
-from sqlalchemy import JSON as SQLJSON, DateTime, func
+from sqlalchemy import JSON as SQLJSON, DateTime, LargeBinary, Index, func
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 from pydantic import BaseModel, Field as PydanticField
@@ -149,6 +149,12 @@ class CaregiverResponse(BaseModel):
 class CommunicationSession(SQLModel, table=True):
     """Communication session model for storing conversation sessions"""
     __tablename__ = "communication_sessions"
+    # Listings are ordered by (started_at, id): id is the rowid, implicitly the last column of each index
+    __table_args__ = (
+        Index("ix_communication_sessions_started_at", "started_at"),
+        Index("ix_communication_sessions_user_started_at", "user_id", "started_at"),
+        Index("ix_communication_sessions_caregiver_started_at", "caregiver_id", "started_at"),
+    )
     
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: Optional[int] = Field(default=None, foreign_key="users.id")
@@ -172,6 +178,9 @@ class CommunicationSession(SQLModel, table=True):
 class SessionStep(SQLModel, table=True):
     """Session step model for storing conversation steps with choices"""
     __tablename__ = "session_steps"
+    __table_args__ = (
+        Index("ix_session_steps_session_step", "session_id", "step_number"),
+    )
     
     id: Optional[int] = Field(default=None, primary_key=True)
     session_id: int = Field(foreign_key="communication_sessions.id")
@@ -190,6 +199,39 @@ class SessionStep(SQLModel, table=True):
     )
 
 
+# SQLModel UserLanguageModel model - compact snapshot of a user's personal word statistics
+class UserLanguageModel(SQLModel, table=True):
+    """Snapshot of the per-user keyboard prediction model (learned from selections)"""
+    __tablename__ = "user_language_models"
+    
+    user_id: int = Field(primary_key=True, foreign_key="users.id")
+    data: bytes = Field(sa_column=Column(LargeBinary, nullable=False), description="zlib-compressed JSON counts")
+    words: int = Field(default=0, description="Number of words in the snapshot")
+    bigrams: int = Field(default=0, description="Number of word pairs in the snapshot")
+    updated_at: Optional[datetime] = Field(
+        default_factory=datetime.utcnow,
+        sa_column=Column(DateTime(timezone=False))
+    )
+
+
+# SQLModel GazeRecordingSpan model - index of the gaze frames recorded during a session
+class GazeRecordingSpan(SQLModel, table=True):
+    """Range of recorded gaze frames of a session in one recording segment file"""
+    __tablename__ = "gaze_recording_spans"
+    
+    id: Optional[int] = Field(default=None, primary_key=True)
+    session_id: Optional[int] = Field(default=None, foreign_key="communication_sessions.id", index=True)
+    segment: int = Field(description="Sequence number of the segment file")
+    start_index: int = Field(description="First record of the span in the segment")
+    end_index: int = Field(description="Record following the last record of the span")
+    start_time: float = Field(description="Timestamp (ms) of the first record")
+    end_time: float = Field(description="Timestamp (ms) of the last record")
+    created_at: Optional[datetime] = Field(
+        default_factory=datetime.utcnow,
+        sa_column=Column(DateTime(timezone=False), server_default=func.now())
+    )
+
+
 # Pydantic models for CommunicationSession API requests/responses
 class CommunicationSessionCreate(BaseModel):
     """Model for creating a new communication session"""
@@ -243,7 +285,15 @@ class CommunicationSessionResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
     steps: Optional[List[SessionStepResponse]] = None
+    step_count: Optional[int] = None  # Summary listings only
+    last_activity_at: Optional[datetime] = None  # Summary listings only: last step or session update
     
     class Config:
         from_attributes = True
 
+
+class CommunicationSessionPage(BaseModel):
+    """Model for a page of the communication session listing"""
+    sessions: List[CommunicationSessionResponse]
+    next_cursor: Optional[str] = None  # Cursor of the next page (None on the last page)
+
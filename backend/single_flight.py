@@ -0,0 +1,121 @@
+"""
+Single-flight execution of LLM calls per conversation.
+
+While typing with gaze, a keyboard prediction request is sent for each new
+current text. Within one flow (a user or session), identical in-flight
+requests share a single LLM call, and a new request supersedes the previous
+one: its outstanding call is cancelled instead of completing late and spending
+provider tokens for a result nobody will display. Waiters of a superseded call
+get SupersededError.
+"""
+import time
+import weakref
+import asyncio
+from typing import Optional, Dict, Any, Hashable, Callable, Awaitable, Tuple
+
+
+class SupersededError(Exception):
+    """The call was cancelled because a newer request of the same flow replaced it"""
+
+
+class SingleFlight:
+    """Coalesces identical calls and cancels superseded ones, per flow"""
+
+    def __init__(self):
+        # flow key -> (request key, task, start time)
+        self._flows: Dict[Hashable, Tuple[Hashable, asyncio.Task, float]] = {}
+        # Calls cancelled by a newer request (tells them apart from a cancelled waiter)
+        self._superseded: "weakref.WeakSet[asyncio.Task]" = weakref.WeakSet()
+        self.stats = {
+            "started": 0,
+            "completed": 0,
+            "failed": 0,
+            "coalesced": 0,
+            "cancelled": 0,
+            "cancelled_ms": 0.0,  # Time superseded calls ran before being cancelled (wasted provider time)
+            "completed_ms": 0.0,
+        }
+
+    async def run(self, flow_key: Hashable, request_key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run a call as the current request of a flow.
+
+        Args:
+            flow_key: Identifies the flow (e.g. user and session)
+            request_key: Identifies the request inputs (identical keys share one call)
+            call: Coroutine function performing the call
+
+        Returns:
+            The result of the call
+
+        Raises:
+            SupersededError: If a newer request of the flow cancelled the call
+        """
+        current = self._flows.get(flow_key)
+        if current is not None and current[0] == request_key and not current[1].done():
+            self.stats["coalesced"] += 1
+            task = current[1]
+        else:
+            self._supersede(flow_key)
+            task = asyncio.create_task(call())
+            started_at = time.perf_counter()
+            self._flows[flow_key] = (request_key, task, started_at)
+            task.add_done_callback(lambda t: self._finished(flow_key, t, started_at))
+            self.stats["started"] += 1
+
+        try:
+            # Shielded: a disconnecting waiter must not cancel a call other waiters share
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if task.cancelled() and task in self._superseded:
+                raise SupersededError() from None
+            raise
+
+    def _supersede(self, flow_key: Hashable) -> None:
+        """Cancel the outstanding call of a flow."""
+        current = self._flows.pop(flow_key, None)
+        if current is not None and not current[1].done():
+            self._superseded.add(current[1])
+            current[1].cancel()
+
+    def _finished(self, flow_key: Hashable, task: asyncio.Task, started_at: float) -> None:
+        """Record the outcome of a call and forget it if it is still the flow's current call."""
+        elapsed_ms = (time.perf_counter() - started_at) * 1000
+        if task.cancelled():
+            self.stats["cancelled"] += 1
+            self.stats["cancelled_ms"] += elapsed_ms
+        elif task.exception() is not None:
+            self.stats["failed"] += 1
+        else:
+            self.stats["completed"] += 1
+            self.stats["completed_ms"] += elapsed_ms
+
+        current = self._flows.get(flow_key)
+        if current is not None and current[1] is task:
+            del self._flows[flow_key]
+
+    def cancel_all(self) -> None:
+        """Cancel every outstanding call."""
+        for flow_key in list(self._flows):
+            self._supersede(flow_key)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get completed vs cancelled call statistics."""
+        finished = self.stats["completed"] + self.stats["cancelled"] + self.stats["failed"]
+        return {
+            **self.stats,
+            "cancel_rate": self.stats["cancelled"] / finished if finished else 0.0,
+            "in_flight": sum(1 for _, task, _ in self._flows.values() if not task.done()),
+        }
+
+
+# Global single-flight layer of the keyboard predictions
+_keyboard_flights: Optional[SingleFlight] = None
+
+
+def get_keyboard_flights() -> SingleFlight:
+    """Get or create the single-flight layer of the LLM keyboard predictions"""
+    global _keyboard_flights
+    if _keyboard_flights is None:
+        _keyboard_flights = SingleFlight()
+    return _keyboard_flights
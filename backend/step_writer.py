@@ -0,0 +1,270 @@
+"""
+Write-behind persistence of communication session steps.
+
+The choice endpoints record every offered choice set (a new SessionStep) and
+every selection (an update of the step) on their latency-critical path. They
+enqueue these writes instead of committing inline: a background thread applies
+the queued operations in order, in one transaction per batch, together with a
+single updated_at touch per session of the batch.
+
+Every operation returns a concurrent Future resolved once its batch is
+committed (with the SessionStep row), so a caller that needs the write done
+(e.g. to return the new step id) can await it. barrier(session_id) gives the
+Future of the last pending operation of a session, for read-your-writes.
+Pending operations are flushed when the writer is closed on shutdown; operations
+queued after that are written synchronously.
+"""
+import os
+import time
+import threading
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Optional, List, Dict, Any
+
+from sqlmodel import Session, select
+
+from models import CommunicationSession, SessionStep
+
+
+class StepOperation:
+    """A queued step insert or selection update"""
+    __slots__ = ("kind", "session_id", "step_number", "values", "future")
+
+    def __init__(self, kind: str, session_id: int, step_number: int, values: Dict[str, Any]):
+        self.kind = kind  # "insert" or "select"
+        self.session_id = session_id
+        self.step_number = step_number
+        self.values = values
+        self.future: Future = Future()
+
+
+class StepWriter:
+    """Queue of session step writes flushed in batched transactions by a background thread"""
+
+    def __init__(self, engine, batch_window_ms: float = 20.0, max_batch: int = 256):
+        """
+        Args:
+            engine: SQLAlchemy engine of the application database
+            batch_window_ms: Time the first queued operation waits for others to share its transaction
+            max_batch: Maximum number of operations per transaction
+        """
+        self.engine = engine
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch = max_batch
+        self._pending: List[StepOperation] = []
+        self._writing: List[StepOperation] = []  # Batch being written
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()  # Operations are pending
+        self._urgent = threading.Event()  # Flush without waiting for the batch window
+        self.stats = {"enqueued": 0, "inserts": 0, "selections": 0, "transactions": 0, "written": 0,
+                      "failed": 0, "max_batch": 0, "flush_ms": 0.0}
+
+        self._closed = False  # Set on close: operations are then written by the caller
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._flush_loop, name="step-writer", daemon=True)
+        self._thread.start()
+
+    def _enqueue(self, operation: StepOperation) -> Future:
+        with self._lock:
+            self._pending.append(operation)
+            self.stats["enqueued"] += 1
+            if len(self._pending) >= self.max_batch:
+                self._urgent.set()
+            closed = self._closed
+        if closed:
+            # No writer thread anymore (shutdown): write in order with what is still pending
+            self.flush()
+        else:
+            self._wake.set()
+        return operation.future
+
+    def add_step(self, session_id: int, step_number: int, message_role: Optional[str] = None,
+                 message_content: Optional[str] = None, choices_json: Optional[List[Dict[str, Any]]] = None,
+                 selected_choice_text: Optional[str] = None) -> Future:
+        """
+        Queue the insert of a session step.
+
+        Returns:
+            Future of the inserted SessionStep
+        """
+        return self._enqueue(StepOperation("insert", session_id, step_number, {
+            "message_role": message_role,
+            "message_content": message_content,
+            "choices_json": choices_json,
+            "selected_choice_text": selected_choice_text,
+            "timestamp": datetime.utcnow(),
+        }))
+
+    def select_choice(self, session_id: int, step_number: int, choice_text: str) -> Future:
+        """
+        Queue the selection of a choice of a session step (applied after the queued insert of the step).
+
+        Returns:
+            Future of the updated SessionStep (None if the step does not exist)
+        """
+        return self._enqueue(StepOperation("select", session_id, step_number, {
+            "selected_choice_text": choice_text,
+            "timestamp": datetime.utcnow(),
+        }))
+
+    def barrier(self, session_id: int) -> Optional[Future]:
+        """
+        Future resolved once the operations queued so far for a session are written (None if none),
+        flushing them without waiting for the batch window.
+        """
+        with self._lock:
+            last = next((op for op in reversed(self._pending) if op.session_id == session_id), None)
+            if last is None:
+                return next((op.future for op in reversed(self._writing) if op.session_id == session_id), None)
+        self._urgent.set()
+        self._wake.set()
+        return last.future
+
+    @staticmethod
+    def _apply(session: Session, operation: StepOperation,
+               inserted: Dict[tuple, SessionStep]) -> Optional[SessionStep]:
+        key = (operation.session_id, operation.step_number)
+        if operation.kind == "insert":
+            step = SessionStep(session_id=operation.session_id, step_number=operation.step_number,
+                               **operation.values)
+            session.add(step)
+            inserted.setdefault(key, step)
+            return step
+        # A step inserted earlier in the batch is updated in memory, others are looked up
+        step = inserted.get(key)
+        if step is None:
+            statement = select(SessionStep).where(
+                SessionStep.session_id == operation.session_id,
+                SessionStep.step_number == operation.step_number
+            )
+            step = session.exec(statement).first()
+        if step is not None:
+            step.selected_choice_text = operation.values["selected_choice_text"]
+            step.timestamp = operation.values["timestamp"]
+            session.add(step)
+        return step
+
+    def _write(self, batch: List[StepOperation]) -> None:
+        """Apply operations in one transaction and touch the updated_at of their sessions."""
+        with Session(self.engine, expire_on_commit=False) as session:
+            inserted: Dict[tuple, SessionStep] = {}
+            results = [self._apply(session, operation, inserted) for operation in batch]
+            touched: Dict[int, datetime] = {}
+            for operation, step in zip(batch, results):
+                if step is None:
+                    continue  # Selection of a missing step: the session is unchanged
+                touched[operation.session_id] = max(
+                    operation.values["timestamp"], touched.get(operation.session_id, operation.values["timestamp"])
+                )
+            for session_id, updated_at in touched.items():
+                comm_session = session.get(CommunicationSession, session_id)
+                if comm_session:
+                    comm_session.updated_at = updated_at
+                    session.add(comm_session)
+            session.commit()
+        for operation, step in zip(batch, results):
+            operation.future.set_result(step)
+        self.stats["transactions"] += 1
+        self.stats["written"] += len(batch)
+        self.stats["inserts"] += sum(1 for operation in batch if operation.kind == "insert")
+        self.stats["selections"] += sum(1 for operation in batch if operation.kind == "select")
+
+    def flush(self) -> int:
+        """
+        Write all pending operations.
+
+        Returns:
+            Number of operations written or failed
+        """
+        count = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = self._pending[:self.max_batch]
+                    del self._pending[:len(batch)]
+                    self._writing = batch
+                    if not self._pending:
+                        self._urgent.clear()
+                if not batch:
+                    return count
+                count += len(batch)
+                self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
+                start = time.perf_counter()
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    print(f"Error writing {len(batch)} session steps, retrying one by one: {e}")
+                    # Isolate the failing operations so the others are still written
+                    for operation in batch:
+                        try:
+                            self._write([operation])
+                        except Exception as operation_error:
+                            self.stats["failed"] += 1
+                            print(f"Error writing step {operation.step_number} of session "
+                                  f"{operation.session_id}: {operation_error}")
+                            operation.future.set_exception(operation_error)
+                with self._lock:
+                    self._writing = []
+                self.stats["flush_ms"] += (time.perf_counter() - start) * 1000
+
+    def _flush_loop(self) -> None:
+        """Flush queued operations, batching those queued within the batch window."""
+        while not self._stopped.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            self._urgent.wait(self.batch_window)
+            self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get writer statistics."""
+        with self._lock:
+            pending = len(self._pending)
+        transactions = self.stats["transactions"]
+        return {
+            **self.stats,
+            "flush_ms": round(self.stats["flush_ms"], 1),
+            "pending": pending,
+            "operations_per_transaction": round(self.stats["written"] / transactions, 2) if transactions else None,
+            "batch_window_ms": self.batch_window * 1000,
+        }
+
+    def close(self) -> None:
+        """Stop the writer thread and write pending operations (later operations are written synchronously)."""
+        with self._lock:
+            self._closed = True
+        self._stopped.set()
+        self._urgent.set()
+        self._wake.set()
+        self._thread.join(timeout=5)
+        self.flush()
+
+
+# Global step writer
+_step_writer: Optional[StepWriter] = None
+_step_writer_lock = threading.Lock()
+
+
+def get_step_writer(engine) -> StepWriter:
+    """Get or create the global step writer"""
+    global _step_writer
+    with _step_writer_lock:
+        if _step_writer is None:
+            _step_writer = StepWriter(
+                engine,
+                batch_window_ms=float(os.getenv("STEP_WRITER_BATCH_WINDOW_MS", "20")),
+                max_batch=int(os.getenv("STEP_WRITER_MAX_BATCH", "256")),
+            )
+        return _step_writer
+
+
+def close_step_writer() -> None:
+    """
+    Write pending session steps and stop the writer thread.
+
+    The closed writer stays the global writer, so steps saved during shutdown are
+    still written (synchronously) instead of being queued to a writer never flushed.
+    """
+    with _step_writer_lock:
+        if _step_writer is not None:
+            _step_writer.close()
@@ -0,0 +1,63 @@
+"""
+Tests of the calibration geometric median.
+
+Usage (from the backend directory):
+    python -m pytest tests
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from calibration import calculate_geometric_median, calculate_geometric_medians, pack_samples
+
+
+def objective(points: np.ndarray, center: np.ndarray) -> float:
+    """Sum of the distances from the samples to a center"""
+    return float(np.hypot(*(points - center).T).sum())
+
+
+def brute_force_median(points: np.ndarray) -> np.ndarray:
+    """Geometric median by coarse-to-fine grid search around the coordinate-wise median"""
+    best = np.median(points, axis=0)
+    for radius, step in ((5.0, 0.1), (0.2, 0.005)):
+        offsets = np.arange(-radius, radius + step / 2, step)
+        grid = np.stack(np.meshgrid(best[0] + offsets, best[1] + offsets), axis=-1).reshape(-1, 2)
+        costs = np.array([objective(points, candidate) for candidate in grid])
+        best = grid[np.argmin(costs)]
+    return best
+
+
+def skewed_integer_cloud(seed: int) -> np.ndarray:
+    """Integer pixel samples (many duplicates) of a fixation with a skewed tail"""
+    rng = np.random.default_rng(seed)
+    points = np.concatenate([rng.normal(500, 6, (900, 2)), 500 + rng.exponential(30, (300, 2))])
+    return np.round(points)
+
+
+def test_geometric_median_of_integer_samples_matches_brute_force():
+    clouds = [skewed_integer_cloud(seed) for seed in range(3)]
+    coords, mask = pack_samples([[{"x": x, "y": y} for x, y in cloud] for cloud in clouds])
+    medians = calculate_geometric_medians(coords, mask, tol=1e-6)
+    for cloud, median in zip(clouds, medians):
+        reference = brute_force_median(cloud)
+        # Not stuck on the coordinate-wise median (a sample) it starts from
+        assert objective(cloud, median) < objective(cloud, np.median(cloud, axis=0))
+        assert objective(cloud, median) <= objective(cloud, reference) + 1e-3
+        assert np.hypot(*(median - reference)) < 0.05
+
+
+def test_geometric_median_stays_on_a_majority_sample():
+    # The repeated sample is the exact geometric median (its multiplicity outweighs the others)
+    samples = [{"x": 10, "y": 10}] * 5 + [{"x": 0, "y": 0}, {"x": 20, "y": 0}, {"x": 0, "y": 20}]
+    assert calculate_geometric_median(samples) == (10.0, 10.0)
+
+
+def test_geometric_medians_of_padded_points():
+    coords, mask = pack_samples([[{"x": 1, "y": 1}], [], [{"x": 0, "y": 0}, {"x": 4, "y": 0}]])
+    medians = calculate_geometric_medians(coords, mask)
+    assert medians[0].tolist() == [1.0, 1.0]
+    assert np.isnan(medians[1]).all()
+    assert medians[2][1] == 0.0 and 0.0 <= medians[2][0] <= 4.0
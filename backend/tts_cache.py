@@ -0,0 +1,343 @@
+"""
+Bounded filesystem cache for TTS audio.
+
+Audio files are stored under <cache_dir>/<xx>/<sha256>.<format> (mp3 or wav,
+streamed syntheses are WAV). A SQLite index
+(<cache_dir>/index.db) records the size, last access time and hit count of
+every file. A background thread evicts files older than the maximum age and,
+when the cache exceeds its size budget, the least recently used (LRU) or
+least frequently used (LFU) files.
+"""
+import os
+import time
+import sqlite3
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+
+
+EVICTION_POLICIES = ("lru", "lfu")
+
+# Audio formats of the cached files (the file extension)
+AUDIO_FORMATS = ("mp3", "wav")
+
+
+class DiskAudioCache:
+    """Size- and age-bounded filesystem cache with a SQLite index"""
+
+    def __init__(self, cache_dir: Path, max_bytes: int = 500 * 1024 * 1024,
+                 max_age_seconds: Optional[float] = 90 * 24 * 3600,
+                 policy: str = "lru", trim_interval_seconds: float = 300.0):
+        """
+        Initialize the disk cache and start its background maintenance thread.
+
+        Args:
+            cache_dir: Directory holding the audio files and the index
+            max_bytes: Maximum total size of cached files
+            max_age_seconds: Files not accessed for longer than this are evicted (None to disable)
+            policy: Eviction order when over budget: "lru" (last access) or "lfu" (hit count)
+            trim_interval_seconds: Interval between periodic trims
+        """
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f"Unsupported eviction policy: {policy}. Supported: {', '.join(EVICTION_POLICIES)}")
+
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.policy = policy
+        self.trim_interval_seconds = trim_interval_seconds
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.cache_dir / "index.db"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "cache_key TEXT PRIMARY KEY, "
+            "size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, "
+            "last_access REAL NOT NULL, "
+            "hit_count INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_entries_last_access ON entries (last_access)")
+        self._conn.commit()
+
+        self._trim_requested = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._maintenance_loop, name="tts-disk-cache", daemon=True)
+        self._thread.start()
+
+    def _get_path(self, cache_key: str, audio_format: str = "mp3") -> Path:
+        """Get the file path for a cache key and audio format."""
+        # Use first 2 characters of hash for subdirectory to avoid too many files in one directory
+        return self.cache_dir / cache_key[:2] / f"{cache_key}.{audio_format}"
+
+    def get(self, cache_key: str) -> Optional[Tuple[bytes, str]]:
+        """
+        Load audio from the cache and record the access.
+
+        Args:
+            cache_key: Cache key (sha256 hex digest)
+
+        Returns:
+            (audio data, audio format), or None if not cached
+        """
+        for audio_format in AUDIO_FORMATS:
+            try:
+                with open(self._get_path(cache_key, audio_format), 'rb') as f:
+                    audio_data = f.read()
+                break
+            except FileNotFoundError:
+                continue
+        else:
+            return None
+
+        with self._lock:
+            updated = self._conn.execute(
+                "UPDATE entries SET last_access = ?, hit_count = hit_count + 1 WHERE cache_key = ?",
+                (time.time(), cache_key)
+            ).rowcount
+            if not updated:
+                # File written before the index existed
+                now = time.time()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries (cache_key, size, created_at, last_access, hit_count) "
+                    "VALUES (?, ?, ?, ?, 1)",
+                    (cache_key, len(audio_data), now, now)
+                )
+            self._conn.commit()
+        return audio_data, audio_format
+
+    def contains(self, cache_key: str) -> bool:
+        """Whether audio is cached for a key (without recording an access)."""
+        return any(self._get_path(cache_key, audio_format).exists() for audio_format in AUDIO_FORMATS)
+
+    def put(self, cache_key: str, audio_data: bytes, audio_format: str = "mp3") -> None:
+        """
+        Store audio in the cache.
+
+        The file is written to a temporary file and atomically renamed, so
+        readers never see a partial file.
+
+        Args:
+            cache_key: Cache key (sha256 hex digest)
+            audio_data: Audio data
+            audio_format: Format of the audio data (one of AUDIO_FORMATS)
+        """
+        if audio_format not in AUDIO_FORMATS:
+            raise ValueError(f"Unsupported audio format: {audio_format}. Supported: {', '.join(AUDIO_FORMATS)}")
+        path = self._get_path(cache_key, audio_format)
+        path.parent.mkdir(exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(audio_data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        # The same synthesis cached before in another format (streamed vs not)
+        for other_format in AUDIO_FORMATS:
+            if other_format != audio_format:
+                self._get_path(cache_key, other_format).unlink(missing_ok=True)
+
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (cache_key, size, created_at, last_access, hit_count) "
+                "VALUES (?, ?, ?, ?, 0)",
+                (cache_key, len(audio_data), now, now)
+            )
+            self._conn.commit()
+            total_bytes = self._total_bytes()
+
+        if total_bytes > self.max_bytes:
+            self._trim_requested.set()
+
+    def _total_bytes(self) -> int:
+        """Total size of indexed files (caller holds the lock)."""
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def _remove(self, cache_keys: List[str]) -> int:
+        """Delete files and their index rows (caller holds the lock). Returns the number of bytes freed."""
+        freed = 0
+        for cache_key in cache_keys:
+            for audio_format in AUDIO_FORMATS:
+                path = self._get_path(cache_key, audio_format)
+                try:
+                    freed += path.stat().st_size
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+            self._conn.execute("DELETE FROM entries WHERE cache_key = ?", (cache_key,))
+        self._conn.commit()
+        return freed
+
+    def trim(self, max_bytes: Optional[int] = None, max_age_seconds: Optional[float] = None) -> Dict[str, int]:
+        """
+        Evict expired files, then evict files in policy order until within the size budget.
+
+        Args:
+            max_bytes: Size budget (defaults to the configured maximum)
+            max_age_seconds: Maximum age since last access (defaults to the configured maximum)
+
+        Returns:
+            {"removed": number of files removed, "freed_bytes": bytes freed}
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        max_age_seconds = self.max_age_seconds if max_age_seconds is None else max_age_seconds
+        order = "last_access ASC" if self.policy == "lru" else "hit_count ASC, last_access ASC"
+        removed = 0
+        freed = 0
+
+        with self._lock:
+            if max_age_seconds is not None:
+                expired = [row[0] for row in self._conn.execute(
+                    "SELECT cache_key FROM entries WHERE last_access < ?", (time.time() - max_age_seconds,)
+                )]
+                freed += self._remove(expired)
+                removed += len(expired)
+
+            excess = self._total_bytes() - max_bytes
+            if excess > 0:
+                victims = []
+                for cache_key, size in self._conn.execute(f"SELECT cache_key, size FROM entries ORDER BY {order}"):
+                    victims.append(cache_key)
+                    excess -= size
+                    if excess <= 0:
+                        break
+                freed += self._remove(victims)
+                removed += len(victims)
+
+            self.evictions += removed
+
+        if removed:
+            print(f"TTS Cache: Evicted {removed} files ({freed} bytes)")
+        return {"removed": removed, "freed_bytes": freed}
+
+    def scan(self) -> Dict[str, int]:
+        """
+        Reconcile the index with the files on disk.
+
+        Files missing from the index are added (using their modification time as
+        last access), index rows without a file are dropped, and leftover
+        temporary files are deleted.
+
+        Returns:
+            {"added": files added to the index, "dropped": stale index rows removed}
+        """
+        on_disk = {}
+        for subdir in self.cache_dir.iterdir():
+            if not subdir.is_dir():
+                continue
+            for path in subdir.iterdir():
+                if path.suffix == ".tmp":
+                    path.unlink(missing_ok=True)
+                elif path.suffix[1:] in AUDIO_FORMATS:
+                    stat = path.stat()
+                    on_disk[path.stem] = (stat.st_size, stat.st_mtime)
+
+        with self._lock:
+            indexed = {row[0] for row in self._conn.execute("SELECT cache_key FROM entries")}
+            missing = [key for key in on_disk if key not in indexed]
+            stale = [key for key in indexed if key not in on_disk]
+            self._conn.executemany(
+                "INSERT INTO entries (cache_key, size, created_at, last_access, hit_count) VALUES (?, ?, ?, ?, 0)",
+                [(key, on_disk[key][0], on_disk[key][1], on_disk[key][1]) for key in missing]
+            )
+            self._conn.executemany("DELETE FROM entries WHERE cache_key = ?", [(key,) for key in stale])
+            self._conn.commit()
+
+        if missing or stale:
+            print(f"TTS Cache: Indexed {len(missing)} files, dropped {len(stale)} stale entries")
+        return {"added": len(missing), "dropped": len(stale)}
+
+    def _maintenance_loop(self) -> None:
+        """Scan the cache at startup, then trim it periodically or when over budget."""
+        try:
+            self.scan()
+            self.trim()
+        except Exception as e:
+            print(f"TTS Cache: Error during startup scan: {e}")
+
+        while not self._stopped.is_set():
+            self._trim_requested.wait(self.trim_interval_seconds)
+            self._trim_requested.clear()
+            if self._stopped.is_set():
+                break
+            try:
+                self.trim()
+            except Exception as e:
+                print(f"TTS Cache: Error trimming cache: {e}")
+
+    def get_stats(self, top: int = 10) -> Dict[str, Any]:
+        """
+        Get cache statistics.
+
+        Args:
+            top: Number of most frequently used entries to include
+
+        Returns:
+            Dictionary with entry count, size, limits, evictions and the top entries
+        """
+        with self._lock:
+            entries, total_bytes, oldest_access = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), MIN(last_access) FROM entries"
+            ).fetchone()
+            top_entries = [
+                {"cache_key": key, "size": size, "hit_count": hits, "last_access": last_access}
+                for key, size, hits, last_access in self._conn.execute(
+                    "SELECT cache_key, size, hit_count, last_access FROM entries "
+                    "ORDER BY hit_count DESC LIMIT ?", (top,)
+                )
+            ]
+        return {
+            "entries": entries,
+            "bytes": total_bytes,
+            "max_bytes": self.max_bytes,
+            "max_age_seconds": self.max_age_seconds,
+            "policy": self.policy,
+            "oldest_access": oldest_access,
+            "evictions": self.evictions,
+            "top_entries": top_entries,
+        }
+
+    def close(self) -> None:
+        """Stop the maintenance thread and close the index."""
+        self._stopped.set()
+        self._trim_requested.set()
+        self._thread.join(timeout=5)
+        with self._lock:
+            self._conn.close()
+
+
+# Disk caches shared by all TTS service instances, per directory
+_disk_caches: Dict[Path, DiskAudioCache] = {}
+_disk_caches_lock = threading.Lock()
+
+
+def get_disk_cache(cache_dir: Path) -> DiskAudioCache:
+    """Get or create the disk cache for a directory (configured from environment variables)"""
+    cache_dir = Path(cache_dir).resolve()
+    with _disk_caches_lock:
+        if cache_dir not in _disk_caches:
+            max_age_days = float(os.getenv("TTS_DISK_CACHE_MAX_AGE_DAYS", "90"))
+            _disk_caches[cache_dir] = DiskAudioCache(
+                cache_dir,
+                max_bytes=int(float(os.getenv("TTS_DISK_CACHE_MB", "500")) * 1024 * 1024),
+                max_age_seconds=max_age_days * 24 * 3600 if max_age_days > 0 else None,
+                policy=os.getenv("TTS_DISK_CACHE_POLICY", "lru").lower(),
+            )
+        return _disk_caches[cache_dir]
+
+
+def close_disk_caches() -> None:
+    """Close all disk caches"""
+    with _disk_caches_lock:
+        for cache in _disk_caches.values():
+            cache.close()
+        _disk_caches.clear()
@@ -0,0 +1,196 @@
+"""
+Predictive TTS pre-synthesis of offered choices.
+
+While the user dwells on the communication grid, the most probable choices
+are synthesized into the TTS caches so that selecting one plays immediately.
+Pre-synthesis runs at low concurrency, within a per-set and hourly character
+budget (only charged for provider calls, not for audio loaded from the disk
+cache), and is cancelled as soon as a new choice set replaces the old one.
+"""
+import os
+import time
+import asyncio
+from collections import deque
+from typing import Optional, List, Dict, Any, Hashable
+
+from tts_service import TTSService, AsyncTTSService
+
+
+class TTSPrefetcher:
+    """Speculatively synthesizes the most probable choices of a choice set"""
+
+    def __init__(self, async_tts: AsyncTTSService, max_choices: int = 3, min_probability: float = 0.1,
+                 max_concurrency: int = 1, max_characters_per_set: int = 300,
+                 max_characters_per_hour: int = 20000):
+        """
+        Initialize the prefetcher.
+
+        Args:
+            async_tts: Async TTS facade used for synthesis
+            max_choices: Maximum number of choices synthesized per choice set
+            min_probability: Choices less probable than this are never synthesized
+            max_concurrency: Maximum number of pre-syntheses running at the same time
+            max_characters_per_set: Character budget per choice set
+            max_characters_per_hour: Rolling hourly character budget (provider cost cap)
+        """
+        self.async_tts = async_tts
+        self.max_choices = max_choices
+        self.min_probability = min_probability
+        self.max_characters_per_set = max_characters_per_set
+        self.max_characters_per_hour = max_characters_per_hour
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        self._spent: deque = deque()  # (timestamp, characters) of syntheses in the last hour
+        self.stats = {
+            "sets": 0,
+            "synthesized": 0,
+            "already_cached": 0,
+            "skipped_budget": 0,
+            "cancelled": 0,
+            "failed": 0,
+        }
+
+    def _characters_spent_last_hour(self) -> int:
+        """Characters synthesized within the last hour."""
+        cutoff = time.monotonic() - 3600
+        while self._spent and self._spent[0][0] < cutoff:
+            self._spent.popleft()
+        return sum(characters for _, characters in self._spent)
+
+    def select_choices(self, choices: List[Dict[str, Any]]) -> List[str]:
+        """
+        Select the choice texts to synthesize, most probable first.
+
+        Args:
+            choices: Choices with "text" and "probability"
+
+        Returns:
+            Texts within the probability threshold and the per-set budget
+        """
+        ranked = sorted(
+            (c for c in choices if c.get("text") and (c.get("probability") or 0.0) >= self.min_probability),
+            key=lambda c: c.get("probability") or 0.0,
+            reverse=True
+        )
+        selected = []
+        characters = 0
+        for choice in ranked[:self.max_choices]:
+            characters += len(choice["text"])
+            if characters > self.max_characters_per_set:
+                self.stats["skipped_budget"] += 1
+                break
+            selected.append(choice["text"])
+        return selected
+
+    def schedule(self, set_key: Hashable, tts_service: TTSService, choices: List[Dict[str, Any]],
+                 language: str, voice_name: Optional[str] = None, pitch: Optional[float] = None,
+                 speaking_rate: Optional[float] = None) -> None:
+        """
+        Start pre-synthesis of a new choice set, cancelling the previous set with the same key.
+
+        Args:
+            set_key: Identifies the choice grid being replaced (e.g. the session id)
+            tts_service: TTSService used to synthesize the audio
+            choices: Choices with "text" and "probability"
+            language: Language code
+            voice_name: Voice name (optional)
+            pitch: Pitch adjustment (optional)
+            speaking_rate: Speaking rate (optional)
+        """
+        self.cancel(set_key)
+        texts = self.select_choices(choices)
+        if not texts:
+            return
+
+        self.stats["sets"] += 1
+        task = asyncio.create_task(
+            self._run(texts, tts_service, language, voice_name, pitch, speaking_rate)
+        )
+        self._tasks[set_key] = task
+        task.add_done_callback(lambda _: self._forget(set_key, task))
+
+    async def _run(self, texts: List[str], tts_service: TTSService, language: str,
+                   voice_name: Optional[str], pitch: Optional[float], speaking_rate: Optional[float]) -> None:
+        """Synthesize the selected texts in probability order."""
+        try:
+            for text in texts:
+                cache_key = tts_service._get_cache_key(text, language, voice_name, pitch, speaking_rate)
+                if tts_service.get_cached(cache_key):
+                    self.stats["already_cached"] += 1
+                    continue
+                if await asyncio.to_thread(tts_service.is_disk_cached, cache_key):
+                    # Loaded into the memory cache without a provider call: not charged
+                    self.stats["already_cached"] += 1
+                    async with self._semaphore:
+                        await self.async_tts.synthesize(tts_service, text, language, voice_name, pitch, speaking_rate)
+                    continue
+
+                if self._characters_spent_last_hour() + len(text) > self.max_characters_per_hour:
+                    self.stats["skipped_budget"] += 1
+                    print("TTS Prefetch: Hourly character budget reached")
+                    return
+
+                async with self._semaphore:
+                    self._spent.append((time.monotonic(), len(text)))
+                    audio = await self.async_tts.synthesize(
+                        tts_service, text, language, voice_name, pitch, speaking_rate
+                    )
+                if audio:
+                    self.stats["synthesized"] += 1
+                    print(f"TTS Prefetch: Pre-synthesized '{text}'")
+                else:
+                    self.stats["failed"] += 1
+        except asyncio.CancelledError:
+            self.stats["cancelled"] += 1
+            raise
+        except Exception as e:
+            self.stats["failed"] += 1
+            print(f"TTS Prefetch: Error pre-synthesizing choices: {e}")
+
+    def _forget(self, set_key: Hashable, task: asyncio.Task) -> None:
+        """Remove a finished task."""
+        if self._tasks.get(set_key) is task:
+            del self._tasks[set_key]
+
+    def cancel(self, set_key: Hashable) -> None:
+        """Cancel the pre-synthesis of a choice set."""
+        task = self._tasks.pop(set_key, None)
+        if task is not None and not task.done():
+            task.cancel()
+
+    def cancel_all(self) -> None:
+        """Cancel every pending pre-synthesis."""
+        for set_key in list(self._tasks):
+            self.cancel(set_key)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get prefetch statistics."""
+        return {
+            **self.stats,
+            "pending_sets": len(self._tasks),
+            "characters_last_hour": self._characters_spent_last_hour(),
+            "max_characters_per_hour": self.max_characters_per_hour,
+        }
+
+
+# Global prefetcher instance
+_tts_prefetcher: Optional[TTSPrefetcher] = None
+
+
+def get_tts_prefetcher(async_tts: AsyncTTSService) -> Optional[TTSPrefetcher]:
+    """Get or create the global prefetcher (None if disabled with TTS_PREFETCH_ENABLED=false)"""
+    global _tts_prefetcher
+
+    if os.getenv("TTS_PREFETCH_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return None
+
+    if _tts_prefetcher is None:
+        _tts_prefetcher = TTSPrefetcher(
+            async_tts,
+            max_choices=int(os.getenv("TTS_PREFETCH_MAX_CHOICES", "3")),
+            min_probability=float(os.getenv("TTS_PREFETCH_MIN_PROBABILITY", "0.1")),
+            max_concurrency=int(os.getenv("TTS_PREFETCH_MAX_CONCURRENCY", "1")),
+            max_characters_per_hour=int(os.getenv("TTS_PREFETCH_CHARS_PER_HOUR", "20000")),
+        )
+
+    return _tts_prefetcher
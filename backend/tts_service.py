@@ -5,40 +5,157 @@ Supports multiple TTS providers.
 import os
 import io
 import base64
+import asyncio
 import threading
 import tempfile
 import hashlib
+import time
+import wave
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Dict, Any, Callable, Tuple, Iterator
 from dotenv import load_dotenv
 
+from tts_cache import DiskAudioCache, get_disk_cache
+from audio_player import (get_audio_player, detect_audio_format, STREAM_SAMPLE_RATE, STREAM_SAMPLE_WIDTH,
+                          STREAM_CHANNELS)
+
 load_dotenv()
 
+# Filesystem cache directory for TTS audio
+TTS_CACHE_DIR = Path(__file__).parent / "tts_cache"
+
+# Providers that can stream raw PCM while synthesizing
+STREAMING_PROVIDERS = ("openai", "elevenlabs")
+
+
+class TTSAudio:
+    """Synthesized audio with its precomputed base64 encoding"""
+    
+    __slots__ = ("audio_data", "audio_base64", "audio_format")
+    
+    def __init__(self, audio_data: bytes, audio_base64: Optional[str] = None, audio_format: Optional[str] = None):
+        self.audio_data = audio_data
+        # "mp3" or "wav" (providers differ, streamed syntheses are WAV): detected from the header
+        self.audio_format = audio_format or detect_audio_format(audio_data)
+        self.audio_base64 = audio_base64 if audio_base64 is not None else base64.b64encode(audio_data).decode('utf-8')
+    
+    @property
+    def size(self) -> int:
+        """Memory footprint in bytes (raw audio plus base64 string)"""
+        return len(self.audio_data) + len(self.audio_base64)
+
+
+class MemoryAudioCache:
+    """Byte-budgeted in-process LRU cache of synthesized audio"""
+    
+    def __init__(self, max_bytes: int):
+        """
+        Initialize the memory cache.
+        
+        Args:
+            max_bytes: Maximum total size of cached entries (raw audio plus base64)
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries: "OrderedDict[str, TTSAudio]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, cache_key: str) -> Optional[TTSAudio]:
+        """Get an entry and mark it as most recently used."""
+        with self._lock:
+            audio = self._entries.get(cache_key)
+            if audio is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(cache_key)
+            self.hits += 1
+            return audio
+    
+    def put(self, cache_key: str, audio: TTSAudio) -> None:
+        """Add an entry, evicting least recently used entries to stay within the budget."""
+        if audio.size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(cache_key, None)
+            if previous is not None:
+                self.current_bytes -= previous.size
+            self._entries[cache_key] = audio
+            self.current_bytes += audio.size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted.size
+                self.evictions += 1
+    
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
 
 class TTSService:
     """Service for text-to-speech conversion"""
     
-    def __init__(self, provider: str = "pyttsx3", cache_enabled: bool = True):
+    def __init__(self, provider: str = "pyttsx3", cache_enabled: bool = True,
+                 memory_cache_bytes: Optional[int] = None):
         """
         Initialize TTS service.
         
         Args:
             provider: "pyttsx3" (offline), "openai" (requires API key), "elevenlabs" (requires API key), or "google" (requires API key)
             cache_enabled: Whether to enable filesystem caching for TTS audio
+            memory_cache_bytes: Memory budget of the in-process audio cache in front of the
+                filesystem cache (defaults to TTS_MEMORY_CACHE_MB, 32 MB; 0 disables it)
         """
         print(f"--> Initializing TTS service with provider: {provider}")
         self.provider = provider.lower()
         self._engine = None
+        # pyttsx3 engines are not thread-safe; serialize access when called from worker threads
+        self._engine_lock = threading.Lock()
         self.cache_enabled = cache_enabled
         
-        # Set up cache directory
+        # Long-lived provider clients, rebuilt only when their configuration changes
+        self._clients: Dict[str, Any] = {}
+        self._client_configs: Dict[str, Tuple] = {}
+        self._warm_providers = set()
+        self._clients_lock = threading.Lock()
+        
+        # Provider latency statistics, split by cold (first call on a new client) and warm calls
+        self._latency_stats: Dict[str, Dict[str, Dict[str, float]]] = {}
+        self._stats_lock = threading.Lock()
+        
+        # Set up cache directory (bounded, indexed disk cache shared across instances)
+        self.disk_cache: Optional[DiskAudioCache] = None
         if self.cache_enabled:
-            backend_dir = Path(__file__).parent
-            self.cache_dir = backend_dir / "tts_cache"
-            self.cache_dir.mkdir(exist_ok=True)
+            self.cache_dir = TTS_CACHE_DIR
+            self.disk_cache = get_disk_cache(self.cache_dir)
             print(f"TTS Cache directory: {self.cache_dir}")
         else:
             self.cache_dir = None
+        
+        # In-memory LRU tier for frequently spoken phrases
+        if memory_cache_bytes is None:
+            memory_cache_bytes = int(float(os.getenv("TTS_MEMORY_CACHE_MB", "32")) * 1024 * 1024)
+        self.memory_cache = MemoryAudioCache(memory_cache_bytes) if memory_cache_bytes > 0 else None
+        self.disk_hits = 0
+        self.disk_misses = 0
     
     def _init_pyttsx3(self):
         """Initialize pyttsx3 engine"""
@@ -51,6 +168,78 @@ class TTSService:
         except ImportError:
             raise ValueError("pyttsx3 is not installed. Install it with: pip install pyttsx3")
     
+    def _get_client(self, name: str, config: Tuple, factory: Callable[[], Any]) -> Any:
+        """
+        Get the long-lived client for a provider, creating it on first use.
+        
+        The client is rebuilt only when `config` (credentials, settings) differs
+        from the one it was created with.
+        
+        Args:
+            name: Provider name
+            config: Hashable tuple describing the client configuration
+            factory: Callable creating a new client
+        
+        Returns:
+            Provider client
+        """
+        with self._clients_lock:
+            if name not in self._clients or self._client_configs.get(name) != config:
+                old_client = self._clients.pop(name, None)
+                if old_client is not None and hasattr(old_client, 'close'):
+                    try:
+                        old_client.close()
+                    except Exception as e:
+                        print(f"TTS: Error closing {name} client: {e}")
+                print(f"TTS: Creating {name} client")
+                self._clients[name] = factory()
+                self._client_configs[name] = config
+                self._warm_providers.discard(name)
+            return self._clients[name]
+    
+    def _is_warm(self) -> bool:
+        """Whether the current provider already served a request with its current client or engine."""
+        if self.provider == "pyttsx3":
+            return self._engine is not None
+        return self.provider in self._warm_providers
+    
+    def _record_latency(self, cold: bool, elapsed: float) -> None:
+        """Record the latency of a provider call."""
+        phase = "cold" if cold else "warm"
+        with self._stats_lock:
+            stats = self._latency_stats.setdefault(self.provider, {}).setdefault(
+                phase, {"count": 0, "total_ms": 0.0, "min_ms": float("inf"), "max_ms": 0.0, "last_ms": 0.0}
+            )
+            elapsed_ms = elapsed * 1000
+            stats["count"] += 1
+            stats["total_ms"] += elapsed_ms
+            stats["min_ms"] = min(stats["min_ms"], elapsed_ms)
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+            stats["last_ms"] = elapsed_ms
+        print(f"TTS: {self.provider} synthesis took {elapsed * 1000:.0f} ms ({phase})")
+    
+    def get_latency_stats(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """
+        Get provider latency statistics.
+        
+        Returns:
+            {provider: {"cold"|"warm": {count, avg_ms, min_ms, max_ms, last_ms}}}
+        """
+        with self._stats_lock:
+            return {
+                provider: {
+                    phase: {
+                        "count": stats["count"],
+                        "avg_ms": stats["total_ms"] / stats["count"],
+                        "min_ms": stats["min_ms"],
+                        "max_ms": stats["max_ms"],
+                        "last_ms": stats["last_ms"],
+                    }
+                    for phase, stats in phases.items()
+                }
+                for provider, phases in self._latency_stats.items()
+            }
+    
     def _get_cache_key(self, text: str, language: str, voice_name: Optional[str], 
                        pitch: Optional[float], speaking_rate: Optional[float]) -> str:
         """
@@ -72,41 +261,57 @@ class TTSService:
         hash_obj = hashlib.sha256(key_data.encode('utf-8'))
         return hash_obj.hexdigest()
     
-    def _get_cache_path(self, cache_key: str) -> Path:
-        """Get the cache file path for a given cache key."""
-        if not self.cache_dir:
-            return None
-        # Use first 2 characters of hash for subdirectory to avoid too many files in one directory
-        subdir = self.cache_dir / cache_key[:2]
-        subdir.mkdir(exist_ok=True)
-        return subdir / f"{cache_key}.mp3"
-    
-    def _load_from_cache(self, cache_path: Path) -> Optional[bytes]:
-        """Load audio data from cache file."""
+    def _load_from_cache(self, cache_key: str) -> Optional[TTSAudio]:
+        """Load audio from the disk cache."""
         try:
-            if cache_path and cache_path.exists():
-                with open(cache_path, 'rb') as f:
-                    audio_data = f.read()
-                print(f"TTS Cache: Loaded from cache ({len(audio_data)} bytes)")
-                return audio_data
+            if self.disk_cache:
+                cached = self.disk_cache.get(cache_key)
+                if cached:
+                    audio_data, audio_format = cached
+                    print(f"TTS Cache: Loaded from cache ({len(audio_data)} bytes, {audio_format})")
+                    # The header wins over the file extension (files cached before formats were recorded)
+                    return TTSAudio(audio_data, audio_format=detect_audio_format(audio_data, default=audio_format))
         except Exception as e:
             print(f"TTS Cache: Error loading from cache: {e}")
         return None
     
-    def _save_to_cache(self, cache_path: Path, audio_data: bytes) -> None:
-        """Save audio data to cache file."""
+    def _save_to_cache(self, cache_key: str, audio: TTSAudio) -> None:
+        """Save audio to the disk cache (stored with its format)."""
         try:
-            if cache_path and self.cache_enabled:
-                with open(cache_path, 'wb') as f:
-                    f.write(audio_data)
-                print(f"TTS Cache: Saved to cache ({len(audio_data)} bytes)")
+            if self.disk_cache:
+                self.disk_cache.put(cache_key, audio.audio_data, audio.audio_format)
+                print(f"TTS Cache: Saved to cache ({len(audio.audio_data)} bytes, {audio.audio_format})")
         except Exception as e:
             print(f"TTS Cache: Error saving to cache: {e}")
     
-    def generate_speech(self, text: str, language: str = "fr", voice_name: Optional[str] = None, 
-                       pitch: Optional[float] = None, speaking_rate: Optional[float] = None) -> Optional[bytes]:
+    def get_cached(self, cache_key: str) -> Optional[TTSAudio]:
         """
-        Generate speech audio from text.
+        Look up audio in the memory cache only (never touches the disk or the provider).
+        
+        Args:
+            cache_key: Cache key (see _get_cache_key)
+        
+        Returns:
+            TTSAudio if present in memory, None otherwise
+        """
+        if self.memory_cache is None:
+            return None
+        return self.memory_cache.get(cache_key)
+    
+    def is_disk_cached(self, cache_key: str) -> bool:
+        """Whether audio is in the filesystem cache (synthesizing it needs no provider call)."""
+        return self.cache_enabled and self.disk_cache is not None and self.disk_cache.contains(cache_key)
+    
+    def supports_streaming(self) -> bool:
+        """Whether the provider can stream audio chunks while synthesizing."""
+        return self.provider in STREAMING_PROVIDERS
+    
+    def synthesize(self, text: str, language: str = "fr", voice_name: Optional[str] = None,
+                   pitch: Optional[float] = None, speaking_rate: Optional[float] = None,
+                   on_chunk: Optional[Callable[[bytes], Any]] = None,
+                   skip_cache_lookup: bool = False) -> Optional[TTSAudio]:
+        """
+        Generate speech audio and its base64 encoding, using the memory and filesystem caches.
         
         Args:
             text: Text to convert to speech
@@ -114,24 +319,42 @@ class TTSService:
             voice_name: Voice name (optional, for Google TTS)
             pitch: Pitch adjustment (optional, for Google TTS)
             speaking_rate: Speaking rate (optional, for Google TTS)
+            on_chunk: Optional callback receiving raw PCM chunks (16-bit mono, STREAM_SAMPLE_RATE)
+                as they are synthesized. Only called on a cache miss with a streaming provider;
+                the audio is then returned and cached as WAV.
+            skip_cache_lookup: Skip the memory cache lookup (the caller already missed it),
+                so the miss is only counted once
         
         Returns:
-            Audio data as bytes (MP3/WAV format), or None if generation fails
+            TTSAudio with the audio bytes (MP3/WAV format) and base64 string, or None if generation fails
         """
         if not text or not text.strip():
             return None
         
-        # Check cache first
+        cache_key = self._get_cache_key(text, language, voice_name, pitch, speaking_rate)
+        
+        # Check memory cache first
+        cached = None if skip_cache_lookup else self.get_cached(cache_key)
+        if cached:
+            return cached
+        
+        # Then the filesystem cache
         if self.cache_enabled:
-            cache_key = self._get_cache_key(text, language, voice_name, pitch, speaking_rate)
-            cache_path = self._get_cache_path(cache_key)
-            cached_audio = self._load_from_cache(cache_path)
-            if cached_audio:
-                return cached_audio
+            audio = self._load_from_cache(cache_key)
+            if audio:
+                self.disk_hits += 1
+                if self.memory_cache is not None:
+                    self.memory_cache.put(cache_key, audio)
+                return audio
+            self.disk_misses += 1
         
         # Generate audio if not in cache
         audio_data = None
-        if self.provider == "pyttsx3":
+        cold = not self._is_warm()
+        start_time = time.perf_counter()
+        if on_chunk is not None and self.supports_streaming():
+            audio_data = self._generate_streaming(text, language, on_chunk)
+        elif self.provider == "pyttsx3":
             audio_data = self._generate_with_pyttsx3(text)
         elif self.provider == "openai":
             audio_data = self._generate_with_openai(text, language)
@@ -142,45 +365,171 @@ class TTSService:
         else:
             raise ValueError(f"Unsupported TTS provider: {self.provider}")
         
-        # Save to cache if generation was successful
-        if audio_data and self.cache_enabled:
-            cache_key = self._get_cache_key(text, language, voice_name, pitch, speaking_rate)
-            cache_path = self._get_cache_path(cache_key)
-            self._save_to_cache(cache_path, audio_data)
+        if not audio_data:
+            return None
+        
+        self._record_latency(cold, time.perf_counter() - start_time)
+        self._warm_providers.add(self.provider)
+        
+        # Save to caches
+        audio = TTSAudio(audio_data)
+        if self.cache_enabled:
+            self._save_to_cache(cache_key, audio)
+        if self.memory_cache is not None:
+            self.memory_cache.put(cache_key, audio)
+        
+        return audio
+    
+    def generate_speech(self, text: str, language: str = "fr", voice_name: Optional[str] = None, 
+                       pitch: Optional[float] = None, speaking_rate: Optional[float] = None) -> Optional[bytes]:
+        """
+        Generate speech audio from text.
+        
+        Args:
+            text: Text to convert to speech
+            language: Language code (e.g., "en", "fr")
+            voice_name: Voice name (optional, for Google TTS)
+            pitch: Pitch adjustment (optional, for Google TTS)
+            speaking_rate: Speaking rate (optional, for Google TTS)
+        
+        Returns:
+            Audio data as bytes (MP3/WAV format), or None if generation fails
+        """
+        audio = self.synthesize(text, language, voice_name, pitch, speaking_rate)
+        return audio.audio_data if audio else None
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """
+        Get memory and filesystem cache statistics.
         
-        return audio_data
+        Returns:
+            {"memory": {entries, bytes, max_bytes, hits, misses, evictions} or None,
+             "disk": {hits, misses, entries, bytes, max_bytes, evictions, ...}}
+        """
+        disk_stats = {"hits": self.disk_hits, "misses": self.disk_misses}
+        if self.disk_cache is not None:
+            disk_stats.update(self.disk_cache.get_stats(top=0))
+            del disk_stats["top_entries"]
+        return {
+            "memory": self.memory_cache.get_stats() if self.memory_cache is not None else None,
+            "disk": disk_stats,
+        }
     
     def _generate_with_pyttsx3(self, text: str) -> Optional[bytes]:
         """Generate speech using pyttsx3 (offline)"""
         try:
-            if self._engine is None:
-                self._init_pyttsx3()
-            
-            # Save to in-memory buffer
-            import tempfile
-            import wave
-            
-            with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as tmp_file:
-                tmp_path = tmp_file.name
-            
-            try:
-                self._engine.save_to_file(text, tmp_path)
-                self._engine.runAndWait()
+            with self._engine_lock:
+                if self._engine is None:
+                    self._init_pyttsx3()
                 
-                # Read the generated audio file
-                with open(tmp_path, 'rb') as f:
-                    audio_data = f.read()
+                # Save to in-memory buffer
+                import tempfile
+                import wave
                 
-                return audio_data
-            finally:
-                # Clean up temp file
-                if os.path.exists(tmp_path):
-                    os.unlink(tmp_path)
+                with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as tmp_file:
+                    tmp_path = tmp_file.name
+                
+                try:
+                    self._engine.save_to_file(text, tmp_path)
+                    self._engine.runAndWait()
+                    
+                    # Read the generated audio file
+                    with open(tmp_path, 'rb') as f:
+                        audio_data = f.read()
+                    
+                    return audio_data
+                finally:
+                    # Clean up temp file
+                    if os.path.exists(tmp_path):
+                        os.unlink(tmp_path)
         
         except Exception as e:
             print(f"Error generating speech with pyttsx3: {e}")
             return None
     
+    def _generate_streaming(self, text: str, language: str, on_chunk: Callable[[bytes], Any]) -> Optional[bytes]:
+        """
+        Stream raw PCM from the provider to `on_chunk` and return the complete audio as WAV.
+        
+        Streaming stops early if `on_chunk` returns False (playback aborted), but the
+        audio is still fully received so it can be cached.
+        """
+        if self.provider == "openai":
+            chunks = self._stream_with_openai(text, language)
+        elif self.provider == "elevenlabs":
+            chunks = self._stream_with_elevenlabs(text, language)
+        else:
+            raise ValueError(f"TTS provider does not support streaming: {self.provider}")
+        
+        pcm = bytearray()
+        forward = True
+        try:
+            for chunk in chunks:
+                pcm.extend(chunk)
+                if forward and on_chunk(chunk) is False:
+                    forward = False
+        except Exception as e:
+            print(f"Error streaming speech with {self.provider}: {e}")
+            return None
+        
+        if not pcm:
+            return None
+        
+        # Wrap the PCM into a WAV file for the caches and the frontend
+        wav_buffer = io.BytesIO()
+        with wave.open(wav_buffer, 'wb') as wav_file:
+            wav_file.setnchannels(STREAM_CHANNELS)
+            wav_file.setsampwidth(STREAM_SAMPLE_WIDTH)
+            wav_file.setframerate(STREAM_SAMPLE_RATE)
+            wav_file.writeframes(bytes(pcm[:len(pcm) - len(pcm) % STREAM_SAMPLE_WIDTH]))
+        return wav_buffer.getvalue()
+    
+    def _stream_with_openai(self, text: str, language: str = "en") -> Iterator[bytes]:
+        """Stream raw PCM (24 kHz, 16-bit mono) from the OpenAI TTS API"""
+        from openai import OpenAI
+        
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("OPENAI_API_KEY environment variable is required")
+        
+        client = self._get_client("openai", (api_key,), lambda: OpenAI(api_key=api_key))
+        
+        with client.audio.speech.with_streaming_response.create(
+            model="tts-1",
+            voice="nova",
+            input=text,
+            response_format="pcm"
+        ) as response:
+            for chunk in response.iter_bytes(chunk_size=4096):
+                yield chunk
+    
+    def _stream_with_elevenlabs(self, text: str, language: str = "en") -> Iterator[bytes]:
+        """Stream raw PCM (24 kHz, 16-bit mono) from the ElevenLabs streaming API"""
+        api_key = os.getenv("ELEVEN_LABS_API_KEY")
+        voice_id = os.getenv("ELEVEN_LABS_VOICE_ID")
+        if not api_key:
+            raise ValueError("ELEVEN_LABS_API_KEY environment variable is required")
+        if not voice_id:
+            raise ValueError("ELEVEN_LABS_VOICE_ID environment variable is required")
+        
+        session = self._get_client("elevenlabs", (api_key,), lambda: self._create_elevenlabs_session(api_key))
+        url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}/stream"
+        data = {
+            "text": text,
+            "model_id": "eleven_multilingual_v2",  # Use multilingual model
+            "voice_settings": {
+                "stability": 0.5,
+                "similarity_boost": 0.75
+            }
+        }
+        
+        with session.post(url, params={"output_format": f"pcm_{STREAM_SAMPLE_RATE}"}, json=data,
+                          headers={"Accept": "*/*"}, stream=True, timeout=30) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=4096):
+                if chunk:
+                    yield chunk
+    
     def _generate_with_openai(self, text: str, language: str = "en") -> Optional[bytes]:
         """Generate speech using OpenAI TTS API"""
         try:
@@ -190,7 +539,7 @@ class TTSService:
             if not api_key:
                 raise ValueError("OPENAI_API_KEY environment variable is required")
             
-            client = OpenAI(api_key=api_key)
+            client = self._get_client("openai", (api_key,), lambda: OpenAI(api_key=api_key))
             
             # Map language to voice (OpenAI supports: alloy, echo, fable, onyx, nova, shimmer)
             # Use different voices for different languages if needed
@@ -207,8 +556,6 @@ class TTSService:
             audio_data = response.content
             return audio_data
         
-        except ImportError:
-            raise ValueError("openai package is not installed. Install it with: pip install openai")
         except ImportError:
             raise ValueError("openai package is not installed. Install it with: pip install openai")
         except Exception as e:
@@ -234,11 +581,7 @@ class TTSService:
             print(f"ElevenLabs TTS: Calling URL: {url}")
             print(f"ElevenLabs TTS: Text to convert: '{text}'")
             
-            headers = {
-                "Accept": "audio/mpeg",
-                "Content-Type": "application/json",
-                "xi-api-key": api_key
-            }
+            session = self._get_client("elevenlabs", (api_key,), lambda: self._create_elevenlabs_session(api_key))
             
             data = {
                 "text": text,
@@ -249,7 +592,7 @@ class TTSService:
                 }
             }
             
-            response = requests.post(url, json=data, headers=headers, timeout=30)
+            response = session.post(url, json=data, timeout=30)
             print(f"ElevenLabs TTS: Response status code: {response.status_code}")
             
             response.raise_for_status()
@@ -273,6 +616,21 @@ class TTSService:
             traceback.print_exc()
             return None
     
+    def _create_elevenlabs_session(self, api_key: str):
+        """Create a pooled HTTP session for the ElevenLabs API"""
+        import requests
+        from requests.adapters import HTTPAdapter
+        
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+        session.mount("https://", adapter)
+        session.headers.update({
+            "Accept": "audio/mpeg",
+            "Content-Type": "application/json",
+            "xi-api-key": api_key
+        })
+        return session
+    
     def _generate_with_google(self, text: str, language: str = "fr", voice_name: Optional[str] = None,
                              pitch: Optional[float] = None, speaking_rate: Optional[float] = None) -> Optional[bytes]:
         """Generate speech using Google Cloud Text-to-Speech API with service account"""
@@ -299,8 +657,15 @@ class TTSService:
             print(f"Google TTS: Text to convert: '{text}'")
             print(f"Google TTS: Language: {language}")
             
-            # Initialize the client (will automatically use GOOGLE_APPLICATION_CREDENTIALS)
-            client = texttospeech.TextToSpeechClient()
+            # Reuse the client and its gRPC channel (uses GOOGLE_APPLICATION_CREDENTIALS);
+            # rebuild it if the credentials file changes
+            credentials_file = Path(credentials_path)
+            credentials_mtime = credentials_file.stat().st_mtime if credentials_file.exists() else None
+            client = self._get_client(
+                "google",
+                (str(credentials_file), credentials_mtime),
+                texttospeech.TextToSpeechClient
+            )
             
             # Map language code to Google Cloud voice
             language_code_map = {
@@ -388,135 +753,155 @@ class TTSService:
         Returns:
             Base64-encoded audio data, or None if generation fails
         """
-        audio_data = self.generate_speech(text, language)
-        if audio_data:
-            return base64.b64encode(audio_data).decode('utf-8')
-        return None
+        audio = self.synthesize(text, language)
+        return audio.audio_base64 if audio else None
     
     def play_audio_async(self, audio_data: bytes, audio_format: str = "mp3", stt_service=None):
         """
-        Play audio asynchronously in a separate thread.
+        Play audio asynchronously on the shared playback worker.
         
         Args:
             audio_data: Audio data as bytes
             audio_format: Audio format ("mp3", "wav", etc.)
             stt_service: Optional SpeechToTextService instance to pause during playback
         """
-        def _play_audio():
-            # Pause STT audio frame transmission if it's active to prevent feedback loop
-            stt_was_active = False
-            if stt_service and hasattr(stt_service, 'is_active') and stt_service.is_active:
-                stt_was_active = True
-                print("Pausing STT audio frame transmission during TTS playback")
-                try:
-                    # Use the new pause method instead of stopping the service
-                    if hasattr(stt_service, 'pause_for_tts'):
-                        stt_service.pause_for_tts()
-                    else:
-                        # Fallback to old method if new method doesn't exist
-                        stt_service.stop()
-                except Exception as e:
-                    print(f"Error pausing STT: {e}")
-            try:
-                # Try pygame first (best for async playback)
-                try:
-                    import pygame
-                    pygame.mixer.init()
-                    
-                    # Save to temporary file
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{audio_format}') as tmp_file:
-                        tmp_path = tmp_file.name
-                        tmp_file.write(audio_data)
-                    
-                    try:
-                        pygame.mixer.music.load(tmp_path)
-                        pygame.mixer.music.play()
-                        
-                        # Wait for playback to finish
-                        while pygame.mixer.music.get_busy():
-                            pygame.time.wait(100)
-                        
-                        pygame.mixer.music.stop()
-                        pygame.mixer.quit()
-                    finally:
-                        # Clean up temp file
-                        if os.path.exists(tmp_path):
-                            os.unlink(tmp_path)
-                    
-                    print(f"Audio played successfully using pygame (format: {audio_format})")
-                    return
-                except ImportError:
-                    pass
-                
-                # Fallback to pydub with simpleaudio
-                try:
-                    from pydub import AudioSegment
-                    from pydub.playback import play
-                    
-                    # Load audio based on format
-                    if audio_format == "mp3":
-                        audio = AudioSegment.from_mp3(io.BytesIO(audio_data))
-                    elif audio_format == "wav":
-                        audio = AudioSegment.from_wav(io.BytesIO(audio_data))
-                    else:
-                        # Try to auto-detect
-                        audio = AudioSegment.from_file(io.BytesIO(audio_data), format=audio_format)
-                    
-                    play(audio)
-                    print(f"Audio played successfully using pydub (format: {audio_format})")
-                    return
-                except ImportError:
-                    pass
-                
-                # Fallback to playsound (blocking but simple)
-                try:
-                    import playsound
-                    
-                    # Save to temporary file
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{audio_format}') as tmp_file:
-                        tmp_path = tmp_file.name
-                        tmp_file.write(audio_data)
-                    
-                    try:
-                        playsound.playsound(tmp_path, block=True)
-                    finally:
-                        # Clean up temp file
-                        if os.path.exists(tmp_path):
-                            os.unlink(tmp_path)
-                    
-                    print(f"Audio played successfully using playsound (format: {audio_format})")
-                    return
-                except ImportError:
-                    pass
-                
-                print("WARNING: No audio playback library available. Install pygame, pydub, or playsound.")
-                
-            except Exception as e:
-                print(f"Error playing audio: {e}")
-                import traceback
-                traceback.print_exc()
-            finally:
-                # Resume STT audio frame transmission after audio finishes playing
-                if stt_was_active and stt_service:
-                    print("Resuming STT audio frame transmission after TTS playback")
-                    try:
-                        # Use the new resume method instead of restarting the service
-                        if hasattr(stt_service, 'resume_after_tts'):
-                            stt_service.resume_after_tts()
-                        else:
-                            # Fallback to old method if new method doesn't exist
-                            stt_service.start(language="fr", model="nova-2")
-                    except Exception as e:
-                        print(f"Error resuming STT: {e}")
+        get_audio_player().play(audio_data, audio_format, stt_service=stt_service, provider=self.provider)
+        print(f"Queued audio playback (format: {audio_format})")
+
+
+class _InFlightSynthesis:
+    """A synthesis running in the worker pool, shared by every request for the same cache key"""
+    
+    def __init__(self, concurrent_future):
+        self.concurrent_future = concurrent_future
+        self.future = asyncio.wrap_future(concurrent_future)
+        self.waiters = 0
+
+
+class AsyncTTSService:
+    """
+    Async facade around TTSService.
+    
+    Runs the blocking provider calls in a bounded thread pool so they never
+    block the event loop. Concurrent requests for the same cache key share a
+    single synthesis, and a synthesis is cancelled once every request waiting
+    on it has been cancelled (if it has not started running yet).
+    """
+    
+    def __init__(self, max_workers: int = 2):
+        """
+        Initialize the async TTS facade.
         
-        # Start playback in a separate thread
-        thread = threading.Thread(target=_play_audio, daemon=True)
-        thread.start()
-        print(f"Started audio playback in background thread (format: {audio_format})")
+        Args:
+            max_workers: Maximum number of syntheses running at the same time
+        """
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tts")
+        self._in_flight: Dict[str, _InFlightSynthesis] = {}
+    
+    async def synthesize(self, tts_service: TTSService, text: str, language: str = "fr",
+                         voice_name: Optional[str] = None, pitch: Optional[float] = None,
+                         speaking_rate: Optional[float] = None,
+                         on_chunk: Optional[Callable[[bytes], Any]] = None) -> Optional[TTSAudio]:
+        """
+        Generate speech audio and its base64 encoding without blocking the event loop.
+        
+        Audio already in the memory cache is returned directly, without a worker thread.
+        
+        Args:
+            tts_service: TTSService used to synthesize the audio
+            text: Text to convert to speech
+            language: Language code (e.g., "en", "fr")
+            voice_name: Voice name (optional, for Google TTS)
+            pitch: Pitch adjustment (optional, for Google TTS)
+            speaking_rate: Speaking rate (optional, for Google TTS)
+            on_chunk: Optional PCM chunk callback (see TTSService.synthesize), called from a
+                worker thread. Not called when the result comes from a cache or an
+                in-flight synthesis started by another request.
+        
+        Returns:
+            TTSAudio with the audio bytes and base64 string, or None if generation fails
+        """
+        if not text or not text.strip():
+            return None
+        
+        cache_key = tts_service._get_cache_key(text, language, voice_name, pitch, speaking_rate)
+        cached = tts_service.get_cached(cache_key)
+        if cached:
+            return cached
+        
+        entry = self._in_flight.get(cache_key)
+        if entry is None:
+            concurrent_future = self._executor.submit(
+                tts_service.synthesize, text, language, voice_name, pitch, speaking_rate, on_chunk,
+                skip_cache_lookup=True
+            )
+            entry = _InFlightSynthesis(concurrent_future)
+            self._in_flight[cache_key] = entry
+            entry.future.add_done_callback(lambda _: self._forget(cache_key, entry))
+        else:
+            print(f"TTS: Joining in-flight synthesis for '{text}'")
+        
+        entry.waiters += 1
+        try:
+            return await asyncio.shield(entry.future)
+        except asyncio.CancelledError:
+            # Cancel the synthesis once nobody is waiting for it anymore. A synthesis that
+            # already started keeps running so its result still reaches the caches.
+            if entry.waiters == 1:
+                entry.concurrent_future.cancel()
+            raise
+        finally:
+            entry.waiters -= 1
+    
+    async def generate_speech(self, tts_service: TTSService, text: str, language: str = "fr",
+                              voice_name: Optional[str] = None, pitch: Optional[float] = None,
+                              speaking_rate: Optional[float] = None) -> Optional[bytes]:
+        """
+        Generate speech audio from text without blocking the event loop.
+        
+        Args:
+            tts_service: TTSService used to synthesize the audio
+            text: Text to convert to speech
+            language: Language code (e.g., "en", "fr")
+            voice_name: Voice name (optional, for Google TTS)
+            pitch: Pitch adjustment (optional, for Google TTS)
+            speaking_rate: Speaking rate (optional, for Google TTS)
+        
+        Returns:
+            Audio data as bytes (MP3/WAV format), or None if generation fails
+        """
+        audio = await self.synthesize(tts_service, text, language, voice_name, pitch, speaking_rate)
+        return audio.audio_data if audio else None
+    
+    def _forget(self, cache_key: str, entry: _InFlightSynthesis) -> None:
+        """Remove a finished synthesis from the in-flight table."""
+        if self._in_flight.get(cache_key) is entry:
+            del self._in_flight[cache_key]
+    
+    def cancel(self, cache_key: str) -> bool:
+        """
+        Cancel an in-flight synthesis.
+        
+        Args:
+            cache_key: Cache key of the synthesis (see TTSService._get_cache_key)
+        
+        Returns:
+            True if the synthesis was cancelled, False if it was unknown or already running
+        """
+        entry = self._in_flight.get(cache_key)
+        if entry is None:
+            return False
+        return entry.concurrent_future.cancel()
+    
+    def shutdown(self) -> None:
+        """Cancel pending syntheses and stop the worker pool."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
 
 
 # Global TTS service instance
 _tts_service: Optional[TTSService] = None
+_async_tts_service: Optional[AsyncTTSService] = None
 
 
 def get_tts_service(provider: str = "pyttsx3") -> TTSService:
@@ -528,3 +913,33 @@ def get_tts_service(provider: str = "pyttsx3") -> TTSService:
     
     return _tts_service
 
+
+
+def get_async_tts_service() -> AsyncTTSService:
+    """Get or create the global async TTS facade"""
+    global _async_tts_service
+    
+    if _async_tts_service is None:
+        max_workers = int(os.getenv("TTS_MAX_WORKERS", "2"))
+        _async_tts_service = AsyncTTSService(max_workers=max_workers)
+    
+    return _async_tts_service
+
+
+def get_tts_latency_stats() -> Dict[str, Dict[str, Dict[str, float]]]:
+    """Get cold/warm provider latency statistics of the global TTS service"""
+    if _tts_service is None:
+        return {}
+    return _tts_service.get_latency_stats()
+
+
+def get_tts_cache_stats() -> Dict[str, Any]:
+    """Get memory and filesystem cache statistics of the global TTS service"""
+    if _tts_service is None:
+        return {}
+    return _tts_service.get_cache_stats()
+
+
+def get_tts_disk_cache() -> DiskAudioCache:
+    """Get the shared TTS disk cache"""
+    return get_disk_cache(TTS_CACHE_DIR)
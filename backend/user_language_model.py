@@ -0,0 +1,278 @@
+"""
+Per-user online learning for keyboard predictions.
+
+Every selection (communication grid choice, committed keyboard word) updates
+the user's word and word-pair counts in memory, so the next prediction is
+personalized without retraining the global model. Counts are bounded per user
+(the least frequent entries are pruned) and dirty models are periodically
+written as compact zlib-compressed snapshots to the user_language_models table.
+"""
+import os
+import json
+import zlib
+import bisect
+import threading
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Callable, TypeVar
+
+from sqlmodel import Session
+
+from models import UserLanguageModel
+from keyboard_predictor import tokenize, BACKOFF
+
+T = TypeVar("T")
+
+
+class PersonalLanguageModel:
+    """Bounded word and word-pair counts of one user"""
+
+    def __init__(self, max_words: int = 5000, max_bigrams: int = 20000):
+        """
+        Args:
+            max_words: Maximum number of distinct words kept
+            max_bigrams: Maximum number of distinct word pairs kept
+        """
+        self.max_words = max_words
+        self.max_bigrams = max_bigrams
+        self.unigrams: Counter = Counter()
+        self.bigrams: Counter = Counter()  # (previous word, word) -> count
+        self.successors: Dict[str, Counter] = {}  # previous word -> {word: count}
+        self.total = 0.0
+        self._sorted_words: List[str] = []  # For prefix lookups
+        self.dirty = False
+
+    def observe(self, text: str, context: Optional[str] = None) -> None:
+        """
+        Learn from a selected text.
+
+        Args:
+            text: Selected choice or committed word(s)
+            context: Text preceding the selection (its last word starts the first pair)
+        """
+        words = tokenize(text)
+        if not words:
+            return
+        previous = tokenize(context)[-1:] if context else []
+        for word in words:
+            if word not in self.unigrams:
+                bisect.insort(self._sorted_words, word)
+            self.unigrams[word] += 1
+            self.total += 1
+            if previous:
+                self.bigrams[(previous[0], word)] += 1
+                self.successors.setdefault(previous[0], Counter())[word] += 1
+            previous = [word]
+        self._prune()
+        self.dirty = True
+
+    def _prune(self) -> None:
+        """Drop the least frequent quarter of the entries when over a bound."""
+        if len(self.unigrams) > self.max_words:
+            kept = dict(self.unigrams.most_common(self.max_words * 3 // 4))
+            self.unigrams = Counter(kept)
+            self.total = float(sum(kept.values()))
+            self._sorted_words = sorted(kept)
+        if len(self.bigrams) > self.max_bigrams:
+            self.bigrams = Counter(dict(self.bigrams.most_common(self.max_bigrams * 3 // 4)))
+            self.successors = {}
+            for (previous, word), count in self.bigrams.items():
+                self.successors.setdefault(previous, Counter())[word] = count
+
+    def complete(self, prefix: str, limit: int = 32) -> List[str]:
+        """Most frequent words of the user starting with a prefix."""
+        start = bisect.bisect_left(self._sorted_words, prefix)
+        end = bisect.bisect_left(self._sorted_words, prefix + "\uffff")
+        return sorted(self._sorted_words[start:end], key=self.unigrams.__getitem__, reverse=True)[:limit]
+
+    def next_words(self, context: List[str]) -> Counter:
+        """Words the user selected after the last word of the context."""
+        return self.successors.get(context[-1], Counter()) if context else Counter()
+
+    def score(self, word: str, context: List[str]) -> float:
+        """Backoff score of a word after a context, from the user's selections."""
+        if context:
+            following = self.successors.get(context[-1])
+            if following and following[word]:
+                return following[word] / sum(following.values())
+        return BACKOFF * self.unigrams[word] / self.total if self.total else 0.0
+
+    def to_snapshot(self) -> bytes:
+        """Compact snapshot of the counts."""
+        payload = {
+            "u": list(self.unigrams.items()),
+            "b": [[previous, word, count] for (previous, word), count in self.bigrams.items()],
+        }
+        return zlib.compress(json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+    @classmethod
+    def from_snapshot(cls, data: bytes, max_words: int = 5000, max_bigrams: int = 20000) -> "PersonalLanguageModel":
+        """Restore a model from a snapshot."""
+        payload = json.loads(zlib.decompress(data).decode("utf-8"))
+        model = cls(max_words, max_bigrams)
+        model.unigrams = Counter(dict(payload["u"]))
+        model.total = float(sum(model.unigrams.values()))
+        model._sorted_words = sorted(model.unigrams)
+        for previous, word, count in payload["b"]:
+            model.bigrams[(previous, word)] = count
+            model.successors.setdefault(previous, Counter())[word] = count
+        model._prune()
+        return model
+
+
+class UserModelStore:
+    """In-memory per-user models with periodic snapshots to the database"""
+
+    def __init__(self, engine, max_users: int = 32, snapshot_interval_seconds: float = 60.0,
+                 max_words: int = 5000, max_bigrams: int = 20000):
+        """
+        Args:
+            engine: SQLAlchemy engine of the application database
+            max_users: Maximum number of user models kept in memory (least recently used unloaded first)
+            snapshot_interval_seconds: Interval between snapshots of modified models
+            max_words: Maximum number of distinct words per user
+            max_bigrams: Maximum number of distinct word pairs per user
+        """
+        self.engine = engine
+        self.max_users = max_users
+        self.snapshot_interval_seconds = snapshot_interval_seconds
+        self.max_words = max_words
+        self.max_bigrams = max_bigrams
+        self._models: "OrderedDict[int, PersonalLanguageModel]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.stats = {"observations": 0, "snapshots": 0, "loads": 0, "unloads": 0}
+
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._snapshot_loop, name="user-language-models", daemon=True)
+        self._thread.start()
+
+    def get(self, user_id: int) -> PersonalLanguageModel:
+        """Get the model of a user, loading its snapshot on first use."""
+        with self._lock:
+            model = self._models.get(user_id)
+            if model is not None:
+                self._models.move_to_end(user_id)
+                return model
+
+        model = self._load(user_id)
+        with self._lock:
+            if user_id in self._models:
+                return self._models[user_id]
+            self._models[user_id] = model
+            evicted = []
+            while len(self._models) > self.max_users:
+                evicted.append(self._models.popitem(last=False))
+                self.stats["unloads"] += 1
+        for evicted_user_id, evicted_model in evicted:
+            if evicted_model.dirty:
+                self._save(evicted_user_id, evicted_model)
+        return model
+
+    def observe(self, user_id: Optional[int], text: Optional[str], context: Optional[str] = None) -> None:
+        """Learn from a selection of a user (ignored without user or text)."""
+        if user_id is None or not text:
+            return
+        model = self.get(user_id)
+        with self._lock:
+            model.observe(text, context)
+            self.stats["observations"] += 1
+
+    def read(self, user_id: int, reader: Callable[[PersonalLanguageModel], T]) -> T:
+        """
+        Call reader with the model of a user while holding the store lock.
+
+        observe() updates the counts from worker threads: readers that iterate over
+        them (e.g. predictions) must go through this method.
+        """
+        model = self.get(user_id)
+        with self._lock:
+            return reader(model)
+
+    def _load(self, user_id: int) -> PersonalLanguageModel:
+        """Load the snapshot of a user (empty model if none)."""
+        try:
+            with Session(self.engine) as session:
+                snapshot = session.get(UserLanguageModel, user_id)
+                if snapshot is not None:
+                    self.stats["loads"] += 1
+                    return PersonalLanguageModel.from_snapshot(snapshot.data, self.max_words, self.max_bigrams)
+        except Exception as e:
+            print(f"Error loading language model of user {user_id}: {e}")
+        return PersonalLanguageModel(self.max_words, self.max_bigrams)
+
+    def _save(self, user_id: int, model: PersonalLanguageModel) -> None:
+        """Write the snapshot of a user."""
+        with self._lock:
+            data = model.to_snapshot()
+            words, bigrams = len(model.unigrams), len(model.bigrams)
+            model.dirty = False
+        try:
+            with Session(self.engine) as session:
+                snapshot = session.get(UserLanguageModel, user_id) or UserLanguageModel(user_id=user_id, data=data)
+                snapshot.data = data
+                snapshot.words = words
+                snapshot.bigrams = bigrams
+                snapshot.updated_at = datetime.utcnow()
+                session.add(snapshot)
+                session.commit()
+            self.stats["snapshots"] += 1
+        except Exception as e:
+            model.dirty = True
+            print(f"Error saving language model of user {user_id}: {e}")
+
+    def flush(self) -> None:
+        """Write the snapshots of all modified models."""
+        with self._lock:
+            dirty = [(user_id, model) for user_id, model in self._models.items() if model.dirty]
+        for user_id, model in dirty:
+            self._save(user_id, model)
+
+    def _snapshot_loop(self) -> None:
+        """Periodically snapshot modified models."""
+        while not self._stopped.wait(self.snapshot_interval_seconds):
+            self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get store statistics."""
+        with self._lock:
+            users = [
+                {"user_id": user_id, "words": len(model.unigrams), "bigrams": len(model.bigrams),
+                 "dirty": model.dirty}
+                for user_id, model in self._models.items()
+            ]
+        return {**self.stats, "loaded_users": len(users), "max_users": self.max_users, "users": users}
+
+    def close(self) -> None:
+        """Stop the snapshot thread and write pending snapshots."""
+        self._stopped.set()
+        self._thread.join(timeout=5)
+        self.flush()
+
+
+# Global user model store
+_user_model_store: Optional[UserModelStore] = None
+_user_model_store_lock = threading.Lock()
+
+
+def get_user_model_store(engine) -> UserModelStore:
+    """Get or create the global user model store"""
+    global _user_model_store
+    with _user_model_store_lock:
+        if _user_model_store is None:
+            _user_model_store = UserModelStore(
+                engine,
+                max_users=int(os.getenv("USER_MODEL_MAX_USERS", "32")),
+                snapshot_interval_seconds=float(os.getenv("USER_MODEL_SNAPSHOT_SECONDS", "60")),
+                max_words=int(os.getenv("USER_MODEL_MAX_WORDS", "5000")),
+                max_bigrams=int(os.getenv("USER_MODEL_MAX_BIGRAMS", "20000")),
+            )
+        return _user_model_store
+
+
+def close_user_model_store() -> None:
+    """Write pending snapshots and stop the store"""
+    global _user_model_store
+    with _user_model_store_lock:
+        if _user_model_store is not None:
+            _user_model_store.close()
+            _user_model_store = None
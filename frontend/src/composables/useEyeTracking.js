@@ -1,5 +1,10 @@
-import { ref, computed } from 'vue';
+import { ref, computed, watch } from 'vue';
 import { applyAffineTransformation } from '../utils/calibration';
+import { decodeGazeMessage, FLAG_VALID } from '../utils/gazeProtocol';
+
+const API_BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
+// Backend gaze pipeline: the backend reads the tracker, calibrates and smooths, the browser only draws
+const GAZE_PIPELINE_URL = API_BASE_URL.replace('http://', 'ws://').replace('https://', 'wss://') + '/ws/gaze';
 
 // Shared state instance - all components using this composable will share the same state
 let sharedState = null;
@@ -27,6 +32,8 @@ function createEyeTrackingState(options = {}) {
     calibrationCoefficients: initialCalibrationCoefficients = null,
     isFullscreen: initialIsFullscreen = false,
     skipCalibration: initialSkipCalibration = false,
+    useBackendPipeline: initialUseBackendPipeline = import.meta.env.VITE_GAZE_PIPELINE === 'backend'
+      || localStorage.getItem('gazePipeline') === 'backend',
   } = options;
 
   // Connection state
@@ -59,6 +66,8 @@ function createEyeTrackingState(options = {}) {
   const calibrationCoefficients = ref(initialCalibrationCoefficients);
   const isFullscreen = ref(initialIsFullscreen || false);
   const skipCalibration = ref(initialSkipCalibration);
+  const useBackendPipeline = ref(initialUseBackendPipeline);
+  const gazeFilter = ref(localStorage.getItem('gazeFilter') || 'one_euro');
 
   // FPS calculation
   const frameTimes = ref([]);
@@ -75,6 +84,136 @@ function createEyeTrackingState(options = {}) {
     }
   };
 
+  // Viewport sent to the backend pipeline (same corrections as the browser-side processing below)
+  const backendPipelineConfig = () => {
+    const effectiveScaleFactor = manualScaleFactor.value !== null && manualScaleFactor.value > 0
+      ? manualScaleFactor.value
+      : scaleFactor.value;
+    const effectiveHeaderHeight = manualHeaderHeight.value !== null && manualHeaderHeight.value > 0
+      ? manualHeaderHeight.value
+      : headerHeight.value;
+    const headerCorrection = applyScaling.value && scaleMode.value === 'divide'
+      && (manualHeaderHeight.value === null || manualHeaderHeight.value === 0)
+      ? headerHeight.value * effectiveScaleFactor * effectiveScaleFactor
+      : effectiveHeaderHeight;
+    const userId = localStorage.getItem('selectedUserId');
+
+    return {
+      type: 'config',
+      user_id: userId ? parseInt(userId) : null,
+      skip_calibration: skipCalibration.value || !calibrationCoefficients.value,
+      filter: gazeFilter.value,
+      format: 'binary',
+      viewport: {
+        scale_factor: effectiveScaleFactor,
+        scale_mode: applyScaling.value ? scaleMode.value : 'none',
+        offset_x: windowOffset.value.x + manualOffset.value.x,
+        offset_y: windowOffset.value.y + manualOffset.value.y,
+        header_correction: headerCorrection,
+        header_height: effectiveHeaderHeight,
+        invert_y: invertY.value,
+        fullscreen: isFullscreen.value,
+        width: window.innerWidth,
+        height: window.innerHeight,
+      },
+    };
+  };
+
+  const sendBackendPipelineConfig = () => {
+    if (useBackendPipeline.value && ws.value && ws.value.readyState === WebSocket.OPEN) {
+      ws.value.send(JSON.stringify(backendPipelineConfig()));
+    }
+  };
+
+  watch(
+    [windowOffset, manualOffset, invertY, scaleFactor, manualScaleFactor, applyScaling, scaleMode,
+      headerHeight, manualHeaderHeight, calibrationCoefficients, isFullscreen, skipCalibration, gazeFilter],
+    sendBackendPipelineConfig,
+    { deep: true }
+  );
+
+  // Server-side dwell detection: targets registered with the backend pipeline and event listeners
+  let dwellLayout = null;
+  const dwellListeners = new Set();
+
+  const sendDwellLayout = () => {
+    if (useBackendPipeline.value && dwellLayout && ws.value && ws.value.readyState === WebSocket.OPEN) {
+      ws.value.send(JSON.stringify(dwellLayout));
+    }
+  };
+
+  /**
+   * Register the selectable targets of a view with the backend dwell detector
+   * @param {Array} targets - Rectangles in window coordinates [{id, x, y, width, height}] (empty to stop)
+   * @param {Object} options - {dwellTime (seconds), method ('ivt' or 'idt'), params}
+   */
+  const registerDwellLayout = (targets, options = {}) => {
+    dwellLayout = {
+      type: 'layout',
+      targets,
+      dwell_time: options.dwellTime ?? null,
+      method: options.method || 'ivt',
+      params: options.params || null,
+    };
+    sendDwellLayout();
+  };
+
+  /**
+   * Listen to dwell_progress / dwell_select events of the backend dwell detector
+   * @param {Function} callback - Called with each event
+   * @returns {Function} Unsubscribe function
+   */
+  const onDwellEvent = (callback) => {
+    dwellListeners.add(callback);
+    return () => dwellListeners.delete(callback);
+  };
+
+  // Binary frames from the backend pipeline (header first, then batches)
+  let gazeStreamHeader = null;
+  const handleBackendPipelineBinary = (buffer) => {
+    const message = decodeGazeMessage(buffer, gazeStreamHeader);
+    if (message.type === 'header') {
+      gazeStreamHeader = message;
+      return;
+    }
+    const frames = message.frames
+      .filter((frame) => frame.flags & FLAG_VALID)
+      .map((frame) => [frame.t, frame.x, frame.y]);
+    if (frames.length > 0) {
+      handleBackendPipelineMessage({ type: 'gaze', frames });
+    }
+  };
+
+  // Processed frames from the backend pipeline: only the latest point is drawn
+  const handleBackendPipelineMessage = (data) => {
+    if (data.type === 'dwell_progress' || data.type === 'dwell_select') {
+      dwellListeners.forEach((callback) => callback(data));
+      return;
+    }
+    if (data.type === 'status') {
+      error.value = data.tracker_connected ? null : 'Backend is not connected to the eye tracker.';
+      return;
+    }
+    if (data.type === 'error') {
+      error.value = data.message;
+      return;
+    }
+    if (data.type !== 'gaze' || !data.frames || data.frames.length === 0) {
+      return;
+    }
+
+    const [timestamp, x, y] = data.frames[data.frames.length - 1];
+    if (!isFrozen.value) {
+      trackingData.value = { timestamp, x, y, frames: data.frames.length };
+      gazePoint.value = { x, y };
+      if (onGazeUpdate) {
+        onGazeUpdate({ x, y });
+      }
+    }
+    messageCount.value += data.frames.length;
+    updateFPS();
+  };
+
   const connectWebSocket = () => {
     if (ws.value && ws.value.readyState === WebSocket.OPEN) {
       return;
@@ -82,17 +221,31 @@ function createEyeTrackingState(options = {}) {
 
     try {
       error.value = null;
-      ws.value = new WebSocket(wsUrl.value);
+      ws.value = new WebSocket(useBackendPipeline.value ? GAZE_PIPELINE_URL : wsUrl.value);
+      ws.value.binaryType = 'arraybuffer';
+      gazeStreamHeader = null;
 
       ws.value.onopen = () => {
         isConnected.value = true;
         error.value = null;
+        sendBackendPipelineConfig();
+        sendDwellLayout();
         console.log('WebSocket connected');
       };
 
       ws.value.onmessage = (event) => {
         try {
+          if (event.data instanceof ArrayBuffer) {
+            handleBackendPipelineBinary(event.data);
+            return;
+          }
+
           const data = JSON.parse(event.data);
+
+          if (useBackendPipeline.value) {
+            handleBackendPipelineMessage(data);
+            return;
+          }
           
           // Store the full tracking data (only update if not frozen)
           if (!isFrozen.value) {
@@ -343,6 +496,8 @@ function createEyeTrackingState(options = {}) {
     calibrationCoefficients,
     isFullscreen,
     skipCalibration,
+    useBackendPipeline,
+    gazeFilter,
     
     // Methods
     connectWebSocket,
@@ -351,6 +506,8 @@ function createEyeTrackingState(options = {}) {
     toggleFreeze,
     updateWindowPosition,
     updateHeaderHeight,
+    registerDwellLayout,
+    onDwellEvent,
   };
 }
 
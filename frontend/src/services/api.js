@@ -44,6 +44,56 @@ export const communicationAPI = {
     });
     return response.data;
   },
+  
+  // Stream choices as server-sent events: onChoice(choice, index) is called as each choice
+  // is generated, and the promise resolves with the final response ({ choices }, ranked by probability)
+  streamChoices: async (request, onChoice = null) => {
+    const response = await fetch(`${API_BASE_URL}/api/communication/choices/stream`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+      body: JSON.stringify(request),
+    });
+    if (!response.ok || !response.body) {
+      throw new Error(`Choice stream failed with status ${response.status}`);
+    }
+    
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let result = null;
+    
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      
+      let separator;
+      while ((separator = buffer.indexOf('\n\n')) !== -1) {
+        const message = buffer.slice(0, separator);
+        buffer = buffer.slice(separator + 2);
+        
+        let event = 'message';
+        let data = '';
+        for (const line of message.split('\n')) {
+          if (line.startsWith('event:')) event = line.slice(6).trim();
+          else if (line.startsWith('data:')) data += line.slice(5).trim();
+        }
+        if (!data) continue;
+        
+        const payload = JSON.parse(data);
+        if (event === 'choice') {
+          if (onChoice) onChoice(payload.choice, payload.index);
+        } else if (event === 'choices') {
+          result = payload;
+        }
+      }
+    }
+    
+    if (!result) {
+      throw new Error('Choice stream ended without a final choice set');
+    }
+    return result;
+  },
 };
 
 export const calibrationAPI = {
@@ -56,6 +106,11 @@ export const calibrationAPI = {
     const response = await apiClient.post('/api/calibration/process', calibrationData);
     return response.data;
   },
+  
+  processPacked: async (calibrationData) => {
+    const response = await apiClient.post('/api/calibration/process-packed', calibrationData);
+    return response.data;
+  },
 };
 
 export const usersAPI = {
@@ -129,6 +184,7 @@ export const configAPI = {
 };
 
 export const sessionsAPI = {
+  // Returns a page {sessions, next_cursor}; pass next_cursor as params.cursor for the next page
   list: async (params = {}) => {
     const response = await apiClient.get('/api/communication/sessions', { params });
     return response.data;
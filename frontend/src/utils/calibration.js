@@ -50,3 +50,39 @@ export function parseCalibrationData(user) {
   }
 }
 
+
+// Column order of packed calibration samples (matches the backend default)
+export const PACKED_SAMPLE_COLUMNS = ['x', 'y', 'screenX', 'screenY', 'timestamp'];
+
+/**
+ * Pack calibration samples into a base64-encoded little-endian Float32 array
+ * for the /api/calibration/process-packed endpoint.
+ * Missing values are encoded as NaN.
+ *
+ * @param {Array} samples - Samples [{x, y, screenX, screenY, timestamp}]
+ * @returns {Object} Packed samples {count, data}
+ */
+export function packCalibrationSamples(samples) {
+  const columns = PACKED_SAMPLE_COLUMNS.length;
+  const values = new Float32Array(samples.length * columns);
+
+  samples.forEach((sample, i) => {
+    PACKED_SAMPLE_COLUMNS.forEach((column, j) => {
+      const value = sample[column];
+      values[i * columns + j] = value === null || value === undefined ? NaN : value;
+    });
+  });
+
+  // Float32Array uses platform endianness, which is little-endian on all supported platforms
+  const bytes = new Uint8Array(values.buffer);
+  let binary = '';
+  const chunkSize = 0x8000;
+  for (let i = 0; i < bytes.length; i += chunkSize) {
+    binary += String.fromCharCode.apply(null, bytes.subarray(i, i + chunkSize));
+  }
+
+  return {
+    count: samples.length,
+    data: btoa(binary),
+  };
+}
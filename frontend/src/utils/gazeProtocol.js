@@ -0,0 +1,79 @@
+/**
+ * Decoder for the binary gaze frame protocol of the backend /ws/gaze endpoint
+ * (see backend/gaze_protocol.py). All values are little-endian.
+ */
+
+const HEADER_MAGIC = 'GZH1';
+const BATCH_MAGIC = 'GZB1';
+const HEADER_SIZE = 32;
+const BATCH_HEADER_SIZE = 8;
+const RECORD_SIZE = 16;
+
+export const FLAG_VALID = 0x01;
+export const FLAG_LEFT_VALID = 0x02;
+export const FLAG_RIGHT_VALID = 0x04;
+
+const readMagic = (view) => String.fromCharCode(
+  view.getUint8(0), view.getUint8(1), view.getUint8(2), view.getUint8(3)
+);
+
+/**
+ * Decode a header message
+ * @param {DataView} view - Message bytes
+ * @returns {Object} Stream metadata {windowCoordinates, screenWidth, screenHeight, scaleFactor, baseTime}
+ */
+function decodeHeader(view) {
+  if (view.getUint16(6, true) !== RECORD_SIZE) {
+    throw new Error(`Unsupported gaze record size ${view.getUint16(6, true)}`);
+  }
+  return {
+    type: 'header',
+    version: view.getUint8(4),
+    windowCoordinates: (view.getUint8(5) & 0x01) !== 0,
+    screenWidth: view.getFloat32(8, true),
+    screenHeight: view.getFloat32(12, true),
+    scaleFactor: view.getFloat32(16, true),
+    baseTime: view.getFloat64(20, true),
+  };
+}
+
+/**
+ * Decode a batch message
+ * @param {DataView} view - Message bytes
+ * @param {Object|null} header - Header of the stream (for absolute timestamps)
+ * @returns {Object} {type: 'batch', frames: [{t, x, y, flags, eye, seq}]}
+ */
+function decodeBatch(view, header) {
+  const count = view.getUint16(4, true);
+  const baseTime = header ? header.baseTime : 0;
+  const frames = new Array(count);
+  for (let i = 0, offset = BATCH_HEADER_SIZE; i < count; i++, offset += RECORD_SIZE) {
+    frames[i] = {
+      t: baseTime + view.getUint32(offset, true),
+      x: view.getFloat32(offset + 4, true),
+      y: view.getFloat32(offset + 8, true),
+      flags: view.getUint8(offset + 12),
+      eye: view.getUint8(offset + 13),
+      seq: view.getUint16(offset + 14, true),
+    };
+  }
+  return { type: 'batch', frames };
+}
+
+/**
+ * Decode a binary gaze message
+ * @param {ArrayBuffer} buffer - WebSocket message (binaryType 'arraybuffer')
+ * @param {Object|null} header - Last decoded header of the stream
+ * @returns {Object} Decoded header or batch
+ */
+export function decodeGazeMessage(buffer, header = null) {
+  const view = new DataView(buffer);
+  const magic = readMagic(view);
+  if (magic === HEADER_MAGIC && buffer.byteLength === HEADER_SIZE) {
+    return decodeHeader(view);
+  }
+  if (magic === BATCH_MAGIC) {
+    return decodeBatch(view, header);
+  }
+  throw new Error('Unknown gaze message');
+}